@@ -1,24 +1,47 @@
 import os
 import sys
+import atexit
+import base64
+import click
 import logging
 import time
+import_started_at = time.perf_counter() # Buat ngukur waktu startup worker (lihat startup_report)
+import resource
 import numpy as np
 import uuid
-import joblib
 import random
-import tensorflow as tf
-import pandas as pd
+import json
+import socket
 
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager, create_refresh_token
-from scipy.signal import find_peaks
 from dotenv import load_dotenv
+from inference import BatchInferenceEngine, InterpreterPool, InterpreterFactory, MODEL_VARIANT_SUFFIXES, resolve_model_path
+from inference_service import InferenceClient, InferenceServiceError
+from payload import decode_ecg_request, PayloadError, SampleStreamDecoder
+from signal_quality import assess_signal_quality, QUALITY_REJECT_MESSAGES
+from beat_detection import detect_r_peaks
+from sample_entropy import sample_entropy
+from forest_inference import compile_classifier
+from model_variants import quantize_model, available_variants, compare_variants, format_report, HOLDOUT_EVERY
+from waveform_codec import encode_waveform, decode_waveform
+from waveform_store import SegmentWaveformStore, unreferenced_ranges
+from local_cache import TTLCache, SharedGeneration
+from write_behind import WriteBehindQueue, WriteBehindFull
+from storage import database_config, install_sqlite_pragmas, sqlite_path
+from live_feed import LocalBroker, UnixSocketBroker, StreamSlots
+from stream_ingest import StreamBufferRegistry
+from hrv_buffer import RRBufferRegistry
+import metrics
+from collections import namedtuple, defaultdict
+from sqlalchemy.dialects import sqlite as sqlite_dialect, postgresql as postgresql_dialect
+from sqlalchemy.exc import DBAPIError, IntegrityError, DataError
 
 
 load_dotenv()
@@ -34,19 +57,71 @@ app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=30)
 db_dir = os.path.join(basedir, 'data')
 if not os.path.exists(db_dir):
     os.makedirs(db_dir)
-db_path = os.getenv('DATABASE_PATH', os.path.join(basedir, 'data/ecg_data.db'))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+# Backend DB dipilih lewat env DATABASE_BACKEND (sqlite WAL / postgresql), lihat storage.py
+database_uri, database_engine_options = database_config(basedir)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+with app.app_context():
+    install_sqlite_pragmas(db.engine)
+migrate = Migrate(app, db, render_as_batch=True) # batch mode biar ALTER TABLE di SQLite aman
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 CORS(app)
 
 SAMPLING_RATE = 360
-
-log_dir = os.path.join(basedir, 'logs')
+# Codec blob waveform di ECGReading.ecg_blob ('int16' = int16 ter-skala + zlib, 'float16')
+WAVEFORM_CODEC = os.getenv('WAVEFORM_CODEC', 'int16')
+# Tempat nyimpen waveform reading baru: 'blob' (kolom ecg_blob) atau 'segment'
+# (file append-only per device di WAVEFORM_STORE_DIR, di DB cuma pointer-nya)
+WAVEFORM_STORAGE = os.getenv('WAVEFORM_STORAGE', 'blob')
+WAVEFORM_STORE_DIR = os.getenv('WAVEFORM_STORE_DIR', os.path.join(db_dir, 'waveforms'))
+WAVEFORM_SEGMENT_MAX_MB = int(os.getenv('WAVEFORM_SEGMENT_MAX_MB', 64))
+waveform_store = SegmentWaveformStore(WAVEFORM_STORE_DIR, max_segment_bytes=WAVEFORM_SEGMENT_MAX_MB * 1024 * 1024)
+
+# Cache registry device (device_id_str -> id/owner/active patient) buat jalur ingest.
+# Per worker, tapi invalidasinya nyebar ke semua worker lewat file generasi di CACHE_GENERATION_DIR
+# (server lain, misal bench_ingest.py, harus pake folder sendiri biar gak ngebatalin cache server ini)
+CACHE_GENERATION_DIR = os.getenv('CACHE_GENERATION_DIR', db_dir)
+os.makedirs(CACHE_GENERATION_DIR, exist_ok=True)
+DEVICE_CACHE_TTL_S = float(os.getenv('DEVICE_CACHE_TTL_S', 300))
+DEVICE_CACHE_MAX_ENTRIES = int(os.getenv('DEVICE_CACHE_MAX_ENTRIES', 1024))
+device_cache = TTLCache(DEVICE_CACHE_TTL_S, DEVICE_CACHE_MAX_ENTRIES,
+                        generation=SharedGeneration(os.path.join(CACHE_GENERATION_DIR, 'device_registry.gen')))
+# Cache otorisasi per user: role + set pasien yang boleh dilihat (invalidasi nyebar antar worker juga)
+AUTH_CACHE_TTL_S = float(os.getenv('AUTH_CACHE_TTL_S', 300))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 4096))
+auth_cache = TTLCache(AUTH_CACHE_TTL_S, AUTH_CACHE_MAX_ENTRIES,
+                      generation=SharedGeneration(os.path.join(CACHE_GENERATION_DIR, 'auth_cache.gen')))
+# Mode tulis reading: 'sync' (commit per request) atau 'behind' (antri, ditulis batch
+# sama satu thread writer per worker -> response gak nunggu lock SQLite)
+INGEST_WRITE_MODE = os.getenv('INGEST_WRITE_MODE', 'sync')
+WRITE_BEHIND_MAX_ROWS = int(os.getenv('WRITE_BEHIND_MAX_ROWS', 200))
+WRITE_BEHIND_MAX_WAIT_MS = float(os.getenv('WRITE_BEHIND_MAX_WAIT_MS', 200))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv('WRITE_BEHIND_MAX_QUEUE', 10000))
+# Batch yang gagal di-retry dulu; error gara-gara isi row (constraint / data) di-bisect & cuma row rusaknya
+# yang dibuang, error DB (lock, disk penuh, read-only, putus) row-nya ditulis ke file spill di sini & di-replay pas DB balik
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3))
+WRITE_BEHIND_SPILL_DIR = os.getenv('WRITE_BEHIND_SPILL_DIR', os.path.join(db_dir, 'write_behind_spill'))
+write_queue = None
+# Live feed (SSE) reading baru buat dashboard kerabat. 'unix' = fan-out antar worker
+# lewat socket datagram di LIVE_FEED_SOCKET_DIR, 'local' = cuma dalam satu proses (dev/test)
+LIVE_FEED_BROKER = os.getenv('LIVE_FEED_BROKER', 'unix')
+LIVE_FEED_SOCKET_DIR = os.getenv('LIVE_FEED_SOCKET_DIR', os.path.join(db_dir, 'live'))
+# Tiap stream SSE nahan satu thread gthread selama stream-nya jalan. LIVE_FEED_MAX_STREAMS = batas buat
+# SEMUA worker (slot flock di LIVE_FEED_SOCKET_DIR/slots), LIVE_FEED_MAX_STREAMS_PER_WORKER = sisa thread
+# per worker buat ingest. Ukurannya: workers x threads gunicorn - stream SSE - stream chunked (STREAM_MAX_CONCURRENT)
+# = thread buat request biasa
+LIVE_FEED_MAX_STREAMS = int(os.getenv('LIVE_FEED_MAX_STREAMS', 6))
+LIVE_FEED_MAX_STREAMS_PER_WORKER = int(os.getenv('LIVE_FEED_MAX_STREAMS_PER_WORKER', 2))
+LIVE_FEED_KEEPALIVE_S = 15
+LIVE_FEED_MAX_DURATION_S = int(os.getenv('LIVE_FEED_MAX_DURATION_S', 300)) # Abis itu client reconnect otomatis
+live_stream_slots = StreamSlots(os.path.join(LIVE_FEED_SOCKET_DIR, 'slots'), LIVE_FEED_MAX_STREAMS,
+                                per_process=LIVE_FEED_MAX_STREAMS_PER_WORKER)
+
+log_dir = os.getenv('LOG_DIR', os.path.join(basedir, 'logs'))
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 file_handler = RotatingFileHandler(os.path.join(log_dir, 'app.log'), maxBytes=10240, backupCount=10, encoding='utf-8')
@@ -58,35 +133,170 @@ app.logger.addHandler(file_handler)
 app.logger.setLevel(logging.INFO)
 app.logger.info('Aplikasi ECG startup')
 
-classification_interpreter = None 
+if LIVE_FEED_BROKER == 'unix':
+    live_broker = UnixSocketBroker(LIVE_FEED_SOCKET_DIR, logger=app.logger)
+else:
+    live_broker = LocalBroker(logger=app.logger)
+
+interpreter_pool = None 
 input_details = None
 output_details = None
 MODEL_FILENAME = 'beat_classifier_model_SMOTE.tflite' 
 MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(basedir, f'model/{MODEL_FILENAME}'))
-BEAT_LABELS = ['Normal', 'PVC', 'Other'] 
+# Varian model beat: 'float32' (MODEL_PATH asli), 'float16' / 'int8' (file *_fp16 / *_int8 hasil quantize-model).
+# Bandingin dulu pake compare-models sebelum ganti varian di produksi
+MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'float32')
+# XNNPACK (delegate CPU default TFLite), 0 = kernel builtin biasa
+MODEL_XNNPACK = os.getenv('MODEL_XNNPACK', '1') != '0'
+model_variant = None
+# Runtime interpreter: 'auto' = LiteRT / tflite-runtime kalo ada & modelnya bisa jalan, fallback ke tensorflow
+TFLITE_RUNTIME = os.getenv('TFLITE_RUNTIME', 'auto')
+model_runtime = None
+# 'local' = tiap worker gunicorn muat model sendiri; 'remote' = semua worker pake satu service
+# inferensi (python inference_service.py) lewat socket Unix + shared memory, model cuma ada sekali di RAM
+INFERENCE_MODE = os.getenv('INFERENCE_MODE', 'local')
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', os.path.join(db_dir, 'inference.sock'))
+# Batas nunggu hasil inferensi (batcher lokal / service remote); lewat dari ini request dapet 503 model_unavailable
+INFERENCE_TIMEOUT_S = float(os.getenv('INFERENCE_TIMEOUT_S', 30))
+# Waktu import + load model & RSS proses, diisi load_all_models() (keliatan juga di /api/v1/ready)
+startup_report = {}
+# Jumlah interpreter per worker gunicorn & thread intra-op per interpreter
+# (Interpreter TFLite gak thread-safe, jadi tiap request/thread checkout satu dari pool)
+MODEL_POOL_SIZE = int(os.getenv('MODEL_POOL_SIZE', 1))
+# Dibatesin ke jumlah core: XNNPACK bisa nge-spin kalo thread-nya lebih banyak dari CPU
+MODEL_NUM_THREADS = min(int(os.getenv('MODEL_NUM_THREADS', 0)), os.cpu_count() or 1) or None # 0 = default TFLite
+BEAT_LABELS = ['Normal', 'PVC', 'Other']
+# Rhythm classifier (RF): urutan fitur WAJIB sama kayak training, label kelas 0: AFIB, 1: Brady, 2: Tachy, 3: Normal
+RHYTHM_FEATURE_NAMES = ['mean_rr', 'sdnn', 'rmssd', 'sd1', 'sd2', 'sampen']
+RHYTHM_LABELS = {"0": "AFib Detected", "1": "Bradycardia", "2": "Tachycardia", "3": "Normal Rhythm"}
+
+# Micro-batching inferensi: window yang datang dalam MAX_WAIT_MS digabung jadi 1x invoke()
+# Naikin MAX_WAIT_MS = throughput naik, tapi latency per request juga naik
+inference_engine = None
+INFER_BATCH_MAX_SIZE = int(os.getenv('INFER_BATCH_MAX_SIZE', 16))
+INFER_BATCH_MAX_WAIT_MS = float(os.getenv('INFER_BATCH_MAX_WAIT_MS', 5))
+# Batas jumlah window di endpoint /analyze-ecg/batch
+MAX_WINDOWS_PER_BATCH = int(os.getenv('MAX_WINDOWS_PER_BATCH', 64))
+# Ingest streaming (/analyze-ecg/stream): window 1024 sampel diinferensi tiap HOP sampel baru
+# (256 = overlap 75%, ~0.7 detik di 360 Hz). Ring buffer per device; state-nya disimpen di STREAM_STATE_DIR
+# abis tiap request & dikunci pake flock, jadi POST lanjutan boleh nyampe di worker gunicorn mana aja
+STREAM_HOP_SAMPLES = int(os.getenv('STREAM_HOP_SAMPLES', 256))
+STREAM_READ_BYTES = int(os.getenv('STREAM_READ_BYTES', 4096))
+STREAM_IDLE_TIMEOUT_S = float(os.getenv('STREAM_IDLE_TIMEOUT_S', 120))
+STREAM_STATE_DIR = os.getenv('STREAM_STATE_DIR', os.path.join(db_dir, 'stream_state'))
+# X-Timestamp yang beda lebih dari ini sama lanjutan buffer = rekaman baru (sisa sampel lama dibuang).
+# Default satu periode sampel; naikin kalo jam device-nya cuma resolusi detik
+STREAM_ANCHOR_TOLERANCE_MS = float(os.getenv('STREAM_ANCHOR_TOLERANCE_MS', 1000.0 / SAMPLING_RATE))
+stream_buffers = StreamBufferRegistry(1024, STREAM_HOP_SAMPLES, SAMPLING_RATE, idle_timeout_s=STREAM_IDLE_TIMEOUT_S,
+                                      state_dir=STREAM_STATE_DIR)
+# Satu stream chunked = satu thread gthread selama body-nya masih ngalir. Slot-nya global (flock di
+# STREAM_STATE_DIR/slots) + per worker, sama kayak live feed; lihat hitungan thread di docker-compose.yml.
+# Lewat STREAM_MAX_DURATION_S server berhenti baca (client lanjut pake POST baru), device yang diem
+# lebih dari STREAM_READ_TIMEOUT_S di tengah body diputus (408)
+STREAM_MAX_CONCURRENT = int(os.getenv('STREAM_MAX_CONCURRENT', 3))
+STREAM_MAX_CONCURRENT_PER_WORKER = int(os.getenv('STREAM_MAX_CONCURRENT_PER_WORKER', 1))
+STREAM_MAX_DURATION_S = float(os.getenv('STREAM_MAX_DURATION_S', 60))
+STREAM_READ_TIMEOUT_S = float(os.getenv('STREAM_READ_TIMEOUT_S', 10))
+STREAM_RETRY_AFTER_S = 5
+stream_slots = StreamSlots(os.path.join(STREAM_STATE_DIR, 'slots'), STREAM_MAX_CONCURRENT,
+                           per_process=STREAM_MAX_CONCURRENT_PER_WORKER)
+# Buffer RR per device buat fitur HRV/AFib yang nyambung antar request (horizon 30-120 detik).
+# State-nya di RR_BUFFER_STATE_DIR (file per device + flock), jadi semua worker gunicorn pake buffer yang sama
+RR_BUFFER_HORIZON_S = float(os.getenv('RR_BUFFER_HORIZON_S', 60))
+RR_BUFFER_STATE_DIR = os.getenv('RR_BUFFER_STATE_DIR', os.path.join(db_dir, 'rr_state'))
+rr_buffers = RRBufferRegistry(RR_BUFFER_HORIZON_S, state_dir=RR_BUFFER_STATE_DIR)
+# Batas ukuran body setelah gzip didekompresi (anti gzip bomb)
+MAX_DECOMPRESSED_BYTES = int(os.getenv('MAX_DECOMPRESSED_BYTES', 8 * 1024 * 1024))
+# Pagination /history
+HISTORY_PAGE_SIZE = 20      # Default isi satu halaman
+HISTORY_MAX_PAGE_SIZE = 100 # Batas atas ?limit= di mode cursor
+# Rollup /stats: ukuran bucket, range default kalo 'start' gak dikirim, & batas jumlah bucket per request
+ROLLUP_BUCKETS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+ROLLUP_DEFAULT_RANGE = {'hour': timedelta(hours=24), 'day': timedelta(days=30)}
+ROLLUP_MAX_BUCKETS = 2000
 
 afib_classifier = None
+rhythm_classifier = None # afib_classifier versi compile (FlatForest), ini yang dipake pas request
 AFIB_MODEL_FILENAME = 'afib_classifier.pkl'
 AFIB_MODEL_PATH = os.getenv('AFIB_MODEL_PATH', os.path.join(basedir, f'model/{AFIB_MODEL_FILENAME}'))
 
+def process_rss_mb():
+    """ RSS proses sekarang (MB), dari /proc; fallback ke peak RSS kalo bukan Linux """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def load_remote_models():
+    """ INFERENCE_MODE=remote: worker gak muat model, cuma bikin client ke service inferensi """
+    global inference_engine, rhythm_classifier, model_runtime
+    app.logger.info(f"Mode inferensi remote, service di: {INFERENCE_SOCKET}")
+    inference_engine = InferenceClient(INFERENCE_SOCKET, n_classes=len(BEAT_LABELS), timeout=INFERENCE_TIMEOUT_S, logger=app.logger)
+    rhythm_classifier = inference_engine.rhythm
+    try:
+        info = inference_engine.info()
+        model_runtime = info.get("runtime")
+        if not info.get("rhythmModel"):
+            rhythm_classifier = None
+        app.logger.info(f"✅ Service inferensi nyaut (pid {info.get('pid')}, runtime {model_runtime}, pool {info.get('poolSize')})")
+    except InferenceServiceError as e:
+        # Belum jalan (urutan start container dll): client reconnect sendiri, /api/v1/ready 503 sampe nyaut
+        app.logger.warning(f"⚠️  Service inferensi belum bisa dihubungi: {e}")
+    startup_report.update({
+        "pid": os.getpid(),
+        "importSeconds": round(time.perf_counter() - import_started_at, 3),
+        "rssMb": round(process_rss_mb(), 1),
+        "runtime": model_runtime,
+    })
+    app.logger.info(f"⏱️  Startup: import {startup_report['importSeconds']} s, RSS {startup_report['rssMb']} MB (tanpa model, mode remote)")
+    metrics.set_model_loaded('beat', inference_engine is not None)
+    metrics.set_model_loaded('rhythm', rhythm_classifier is not None)
+
 def load_all_models():
-    """ Load model TFLite ke memori """
-    global classification_interpreter, input_details, output_details, afib_classifier
+    """ Load model TFLite & RF ke memori, warm-up, lalu catat waktu startup + RSS """
+    global interpreter_pool, input_details, output_details, afib_classifier, rhythm_classifier, inference_engine, model_runtime, model_variant
+    load_started_at = time.perf_counter()
+    rss_before_models = process_rss_mb()
+    warmup_seconds = 0.0
     app.logger.info("="*50)
-    app.logger.info(f"Mencoba memuat model TFLite dari: {MODEL_PATH}")
+    if INFERENCE_MODE == 'remote':
+        load_remote_models()
+        app.logger.info("="*50)
+        return
     try:
-        if not os.path.exists(MODEL_PATH):
-            app.logger.error(f"File model TFLite tidak ditemukan di path: {MODEL_PATH}")
-            raise FileNotFoundError(f"File model tidak ditemukan di '{MODEL_PATH}'")
-
-        classification_interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-        classification_interpreter.allocate_tensors()
-        input_details = classification_interpreter.get_input_details()
-        output_details = classification_interpreter.get_output_details()
+        model_path, model_variant = resolve_model_path(MODEL_PATH, MODEL_VARIANT, app.logger)
+        app.logger.info(f"Mencoba memuat model TFLite dari: {model_path}")
+        if not os.path.exists(model_path):
+            app.logger.error(f"File model TFLite tidak ditemukan di path: {model_path}")
+            raise FileNotFoundError(f"File model tidak ditemukan di '{model_path}'")
+
+        interpreter_factory = InterpreterFactory(model_path, num_threads=MODEL_NUM_THREADS, runtime=TFLITE_RUNTIME,
+                                                 use_xnnpack=MODEL_XNNPACK, logger=app.logger)
+        interpreter_pool = InterpreterPool(
+            interpreter_factory,
+            size=MODEL_POOL_SIZE,
+            logger=app.logger
+        )
+        model_runtime = interpreter_factory.runtime
+        input_details = interpreter_pool.input_details
+        output_details = interpreter_pool.output_details
+        inference_engine = BatchInferenceEngine(
+            interpreter_pool,
+            max_batch_size=INFER_BATCH_MAX_SIZE,
+            max_wait_ms=INFER_BATCH_MAX_WAIT_MS,
+            timeout=INFERENCE_TIMEOUT_S,
+            logger=app.logger
+        )
         
-        app.logger.info(f"✅ Model TFLite ('{MODEL_FILENAME}') berhasil dimuat.")
+        # Warm-up sebelum dianggap ready, biar request pertama gak nanggung alokasi/inisialisasi kernel
+        warmup_seconds += interpreter_pool.warm_up()
+
+        app.logger.info(f"✅ Model TFLite ('{os.path.basename(model_path)}') berhasil dimuat (runtime: {model_runtime}, varian: {model_variant}, XNNPACK: {'on' if MODEL_XNNPACK else 'off'}).")
         app.logger.info(f"  -> Input Shape: {input_details[0]['shape']}")
         app.logger.info(f"  -> Output Shape: {output_details[0]['shape']}")
+        app.logger.info(f"  -> Pool: {MODEL_POOL_SIZE} interpreter x {MODEL_NUM_THREADS or 'default'} thread")
+        app.logger.info(f"  -> Batching: max {INFER_BATCH_MAX_SIZE} window / {INFER_BATCH_MAX_WAIT_MS} ms")
         
     except Exception as e:
         app.logger.critical(f"❌ FATAL ERROR: Gagal memuat model TFLite. Error: {e}", exc_info=True)
@@ -99,7 +309,8 @@ def load_all_models():
             app.logger.warning(f"   Fitur deteksi AFib akan dinonaktifkan sementara.")
             afib_classifier = None
         else:
-            # Load pake joblib
+            # Load pake joblib (import di sini aja, cuma kepake sekali pas startup)
+            import joblib
             afib_classifier = joblib.load(AFIB_MODEL_PATH)
             app.logger.info(f"✅ Model AFib ('{AFIB_MODEL_FILENAME}') berhasil dimuat.")
             try:
@@ -114,12 +325,42 @@ def load_all_models():
                 # 3. Cek Kelas Output (classes_)
                 if hasattr(afib_classifier, 'classes_'):
                     app.logger.info(f"   -> Output Classes: {afib_classifier.classes_}")
+
+                # 4. Urutan kolom harus sama kayak training (dulu dijaga pake nama kolom DataFrame)
+                feature_names = getattr(afib_classifier, 'feature_names_in_', None)
+                if feature_names is not None and list(feature_names) != RHYTHM_FEATURE_NAMES:
+                    app.logger.warning(f"   -> ⚠️  Urutan fitur model {list(feature_names)} beda sama {RHYTHM_FEATURE_NAMES}!")
             except Exception as info_error:
                 app.logger.warning(f"   -> Gagal baca detail model: {info_error}")
+
+            # Flatten pohon-pohonnya ke array numpy sekali di sini, request cuma jalanin versi vektornya
+            rhythm_classifier, max_error = compile_classifier(afib_classifier, app.logger)
+            if max_error is not None:
+                app.logger.info(f"   -> Compiled: {rhythm_classifier.node_count} node, depth {rhythm_classifier.max_depth}, selisih vs sklearn {max_error:.2e}")
+            warmup_started_at = time.perf_counter()
+            rhythm_classifier.predict(np.zeros((1, len(RHYTHM_FEATURE_NAMES)), dtype=np.float32))
+            warmup_seconds += time.perf_counter() - warmup_started_at
     except Exception as e:
         app.logger.error(f"❌ ERROR: Gagal memuat model AFib. Error: {e}", exc_info=True)
         afib_classifier = None
-
+        rhythm_classifier = None
+
+    startup_report.update({
+        "pid": os.getpid(),
+        "importSeconds": round(load_started_at - import_started_at, 3),
+        "loadModelsSeconds": round(time.perf_counter() - load_started_at, 3),
+        "warmupMs": round(warmup_seconds * 1000, 1),
+        "rssMb": round(process_rss_mb(), 1),
+        "modelRssMb": round(process_rss_mb() - rss_before_models, 1),
+        "runtime": model_runtime,
+        "modelVariant": model_variant,
+        "xnnpack": MODEL_XNNPACK,
+    })
+    app.logger.info(f"⏱️  Startup: import {startup_report['importSeconds']} s, load model {startup_report['loadModelsSeconds']} s "
+                    f"(warm-up {startup_report['warmupMs']} ms), RSS {startup_report['rssMb']} MB "
+                    f"(model +{startup_report['modelRssMb']} MB), runtime {model_runtime}")
+    metrics.set_model_loaded('beat', inference_engine is not None)
+    metrics.set_model_loaded('rhythm', rhythm_classifier is not None)
     app.logger.info("="*50)
 
 class User(db.Model):
@@ -151,15 +392,27 @@ class Device(db.Model):
     owner = db.relationship('User', foreign_keys=[user_id], back_populates='devices')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     readings = db.relationship('ECGReading', backref='device', lazy=True, cascade="all, delete-orphan")
+    latest_reading = db.relationship('DeviceLatestReading', uselist=False, lazy=True, cascade="all, delete-orphan")
 
 class ECGReading(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False)
     prediction = db.Column(db.String(50), nullable=False)
     heart_rate = db.Column(db.Float, nullable=True)
-    processed_ecg_data = db.Column(db.JSON, nullable=False) 
+    processed_ecg_data = db.Column(db.JSON(none_as_null=True), nullable=True) # Format lama (list float), baris baru pake ecg_blob
+    ecg_blob = db.Column(db.LargeBinary, nullable=True) # Waveform terkompresi (waveform_codec.py)
+    # Pointer ke waveform_store: file segmen, offset byte, jumlah sampel
+    waveform_segment = db.Column(db.String(64), nullable=True)
+    waveform_offset = db.Column(db.BigInteger, nullable=True)
+    waveform_length = db.Column(db.Integer, nullable=True)
+    signal_quality = db.Column(db.Float, nullable=True) # Skor kualitas sinyal 0..1 (signal_quality.py)
     device_id = db.Column(db.String(36), db.ForeignKey('device.id'), nullable=False)
     user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=True)
+    # Index komposit buat history per user/device (filter + urut timestamp sekaligus)
+    __table_args__ = (
+        db.Index('ix_ecg_reading_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_ecg_reading_device_timestamp', 'device_id', 'timestamp'),
+    )
 
 class MonitoringRelationship(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -167,6 +420,44 @@ class MonitoringRelationship(db.Model):
     patient_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False) # ID Pasien
     __table_args__ = (db.UniqueConstraint('monitor_id', 'patient_id', name='_monitor_patient_uc'),)
 
+class DeviceLatestReading(db.Model):
+    """ Ringkasan reading terakhir per device, di-update pas ingest (biar dashboard gak N+1) """
+    device_id = db.Column(db.String(36), db.ForeignKey('device.id'), primary_key=True)
+    reading_id = db.Column(db.Integer, db.ForeignKey('ecg_reading.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    prediction = db.Column(db.String(50), nullable=False)
+    heart_rate = db.Column(db.Float, nullable=True)
+
+# Snapshot kolom Device yang dibutuhin jalur ingest (aman dishare antar request/thread)
+DeviceRecord = namedtuple('DeviceRecord', ['id', 'device_id_str', 'user_id', 'active_patient_id'])
+
+def _load_device_record(device_id_str):
+    row = (db.session.query(Device.id, Device.device_id_str, Device.user_id, Device.active_patient_id)
+           .filter(Device.device_id_str == device_id_str).first())
+    return DeviceRecord(*row) if row else None
+
+def get_device_record(device_id_str):
+    """ Device buat ingest lewat cache; None kalo belum terdaftar (hasil None juga di-cache) """
+    return device_cache.get_or_load(device_id_str, _load_device_record)
+
+def invalidate_device_cache():
+    """ Dipanggil SETELAH commit perubahan Device, biar worker lain gak sempet ngeload data lama """
+    device_cache.invalidate()
+
+class ReadingRollup(db.Model):
+    """ Agregat reading per jam/hari, per user & per device. Di-update inkremental pas ingest """
+    scope = db.Column(db.String(8), primary_key=True)          # 'user' / 'device'
+    scope_id = db.Column(db.String(36), primary_key=True)      # User.id / Device.id
+    bucket = db.Column(db.String(8), primary_key=True)         # 'hour' / 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    reading_count = db.Column(db.Integer, nullable=False, default=0)
+    hr_count = db.Column(db.Integer, nullable=False, default=0) # Reading yang HR-nya kebaca
+    hr_sum = db.Column(db.Float, nullable=False, default=0.0)
+    hr_min = db.Column(db.Float, nullable=True)
+    hr_max = db.Column(db.Float, nullable=True)
+    pvc_count = db.Column(db.Integer, nullable=False, default=0)
+    afib_count = db.Column(db.Integer, nullable=False, default=0)
+
 def preprocess_input(data: list, target_length: int = 1024):
     arr = np.array(data, dtype=np.float32)
     if len(arr) < target_length:
@@ -180,19 +471,27 @@ def preprocess_input(data: list, target_length: int = 1024):
     normalized_arr = (arr - mean) / std
     return normalized_arr.reshape(1, target_length, 1).astype(np.float32)
 
-def calculate_heart_rate(signal_1d_normalized):
+def preprocess_batch(windows: list, target_length: int = 1024):
+    """ Versi batch dari preprocess_input: list of window -> (N, target_length, 1), normalisasi per window """
+    arr = np.zeros((len(windows), target_length), dtype=np.float32)
+    for i, window in enumerate(windows):
+        window = np.asarray(window, dtype=np.float32)[:target_length]
+        arr[i, :len(window)] = window
+    mean = arr.mean(axis=1, keepdims=True)
+    std = arr.std(axis=1, keepdims=True)
+    std[std < 1e-6] = 1.0
+    normalized_arr = (arr - mean) / std
+    return normalized_arr.reshape(len(windows), target_length, 1).astype(np.float32)
+
+def calculate_heart_rate(beats):
+    """ beats: hasil detect_r_peaks() (dipake bareng sama fitur AFib biar HR-nya konsisten) """
     try:
-        peaks, _ = find_peaks(
-            signal_1d_normalized, 
-            height=0.7,
-            prominence=0.4,
-            distance=0.5 * SAMPLING_RATE 
-        )
+        peaks = beats["peaks"]
         if len(peaks) < 2: 
             app.logger.info(f"HR Calc: Puncak tidak cukup ({len(peaks)} peaks).")
             return None
         
-        rr_intervals_samples = np.diff(peaks)
+        rr_intervals_samples = beats["rr_samples"]
         avg_rr_samples = np.mean(rr_intervals_samples)
         
         if avg_rr_samples < 1e-6: # Hindari bagi dgn nol
@@ -211,10 +510,280 @@ def calculate_heart_rate(signal_1d_normalized):
         app.logger.error(f"HR Calc Error: {e}", exc_info=True)
         return None
 
+def waveform_columns(device, signal):
+    """ Simpen waveform sesuai WAVEFORM_STORAGE, return kolom ECGReading yang harus diisi """
+    if WAVEFORM_STORAGE == 'segment':
+        segment, offset, length = waveform_store.append(device.id, signal)
+        return {"waveform_segment": segment, "waveform_offset": offset, "waveform_length": length}
+    return {"ecg_blob": encode_waveform(signal, WAVEFORM_CODEC)}
+
+def reading_waveform(reading):
+    """ Ambil sinyal ECGReading sebagai array float32 (segmen, blob, atau JSON format lama) """
+    if reading.waveform_segment is not None:
+        return waveform_store.read(reading.waveform_segment, reading.waveform_offset, reading.waveform_length)
+    if reading.ecg_blob is not None:
+        return decode_waveform(reading.ecg_blob)
+    return np.asarray(reading.processed_ecg_data or [], dtype=np.float32)
+
+def upsert_dialect():
+    """ Modul dialect buat INSERT ... ON CONFLICT (SQLite & PostgreSQL sama-sama punya) """
+    return postgresql_dialect if db.session.get_bind().dialect.name == 'postgresql' else sqlite_dialect
+
+def upsert_latest_reading(device_id, reading_id, timestamp, prediction, heart_rate):
+    """
+    Update DeviceLatestReading (transaksi yang sama, commit di pemanggil).
+    Cuma ditimpa kalo timestamp-nya lebih baru (data offline yang telat masuk gak nimpa).
+    Pake satu upsert (INSERT ... ON CONFLICT DO UPDATE WHERE), jadi gak perlu SELECT dulu.
+    """
+    table = DeviceLatestReading.__table__
+    stmt = upsert_dialect().insert(table).values(
+        device_id=device_id,
+        reading_id=reading_id,
+        timestamp=timestamp,
+        prediction=prediction,
+        heart_rate=heart_rate
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.device_id],
+        set_={
+            "reading_id": stmt.excluded.reading_id,
+            "timestamp": stmt.excluded.timestamp,
+            "prediction": stmt.excluded.prediction,
+            "heart_rate": stmt.excluded.heart_rate
+        },
+        where=db.tuple_(table.c.timestamp, table.c.reading_id) <= db.tuple_(stmt.excluded.timestamp, stmt.excluded.reading_id)
+    )
+    db.session.execute(stmt)
+
+def record_latest_reading(device, readings):
+    """ Update DeviceLatestReading dari reading (ORM) yang baru di-add """
+    if not readings:
+        return
+    db.session.flush() # Biar reading.id keisi
+    newest = max(readings, key=lambda r: (r.timestamp, r.id))
+    upsert_latest_reading(device.id, newest.id, newest.timestamp, newest.prediction, newest.heart_rate)
+
+def bucket_floor(timestamp, bucket):
+    if bucket == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def rollup_deltas(rows):
+    """ Kelompokin row reading (dict kolom ECGReading) jadi delta agregat per (scope, id, bucket, awal bucket) """
+    deltas = {}
+    for row in rows:
+        prediction = row['prediction'] or ''
+        heart_rate = row['heart_rate']
+        is_pvc = prediction.startswith('PVC')
+        is_afib = 'AFib' in prediction
+        for scope, scope_id in (('user', row['user_id']), ('device', row['device_id'])):
+            if scope_id is None:
+                continue
+            for bucket in ROLLUP_BUCKETS:
+                key = (scope, scope_id, bucket, bucket_floor(row['timestamp'], bucket))
+                delta = deltas.get(key)
+                if delta is None:
+                    delta = deltas[key] = {
+                        "scope": scope, "scope_id": scope_id, "bucket": bucket, "bucket_start": key[3],
+                        "reading_count": 0, "hr_count": 0, "hr_sum": 0.0, "hr_min": None, "hr_max": None,
+                        "pvc_count": 0, "afib_count": 0
+                    }
+                delta["reading_count"] += 1
+                delta["pvc_count"] += int(is_pvc)
+                delta["afib_count"] += int(is_afib)
+                if heart_rate is not None:
+                    delta["hr_count"] += 1
+                    delta["hr_sum"] += heart_rate
+                    delta["hr_min"] = heart_rate if delta["hr_min"] is None else min(delta["hr_min"], heart_rate)
+                    delta["hr_max"] = heart_rate if delta["hr_max"] is None else max(delta["hr_max"], heart_rate)
+    return list(deltas.values())
+
+def update_rollups(rows):
+    """ Tambahin row reading baru ke ReadingRollup (transaksi pemanggil), satu upsert executemany """
+    deltas = rollup_deltas(rows)
+    if not deltas:
+        return
+    table = ReadingRollup.__table__
+    stmt = upsert_dialect().insert(table)
+    new = stmt.excluded
+    # min()/max() 2 argumen di SQLite = LEAST()/GREATEST() di PostgreSQL; NULL di-coalesce dulu
+    is_postgres = db.session.get_bind().dialect.name == 'postgresql'
+    least = db.func.least if is_postgres else db.func.min
+    greatest = db.func.greatest if is_postgres else db.func.max
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.scope_id, table.c.bucket, table.c.bucket_start],
+        set_={
+            "reading_count": table.c.reading_count + new.reading_count,
+            "hr_count": table.c.hr_count + new.hr_count,
+            "hr_sum": table.c.hr_sum + new.hr_sum,
+            "hr_min": least(db.func.coalesce(table.c.hr_min, new.hr_min), db.func.coalesce(new.hr_min, table.c.hr_min)),
+            "hr_max": greatest(db.func.coalesce(table.c.hr_max, new.hr_max), db.func.coalesce(new.hr_max, table.c.hr_max)),
+            "pvc_count": table.c.pvc_count + new.pvc_count,
+            "afib_count": table.c.afib_count + new.afib_count
+        }
+    )
+    db.session.execute(stmt, deltas)
+
+def publish_reading_event(device, reading_row, reading_id=None):
+    """
+    Kirim ringkasan reading baru ke live feed. Topic = user pemilik data & owner device
+    (sama kayak yang bakal keliatan di dashboard). Gagal publish gak boleh gagalin ingest.
+    """
+    topics = {topic for topic in (reading_row['user_id'], device.user_id) if topic}
+    if not topics:
+        return
+    event = {
+        "id": reading_id, # None di mode write-behind (belum ke-insert)
+        "user_id": reading_row['user_id'],
+        "device_id": device.device_id_str,
+        "timestamp": reading_row['timestamp'].isoformat() + "Z",
+        "prediction": reading_row['prediction'],
+        "heartRate": reading_row['heart_rate'],
+        "signalQuality": reading_row.get('signal_quality')
+    }
+    try:
+        live_broker.publish(topics, event)
+    except Exception as e:
+        app.logger.warning(f"Live feed: gagal publish reading dari {device.device_id_str}: {e}")
+
+def persist_readings(device, reading_rows):
+    """
+    Simpen row reading hasil ingest: langsung (satu transaksi bareng ringkasan & rollup) atau
+    dititipin ke writer write-behind, lalu publish ke live feed. Return jumlah row yang kesimpen
+    (bisa kurang dari total kalo antrian write-behind penuh).
+    """
+    if write_queue is not None:
+        for k, row in enumerate(reading_rows):
+            try:
+                write_queue.submit(row)
+            except WriteBehindFull as e:
+                app.logger.error(f"❌ {e}, {len(reading_rows) - k} reading dari {device.device_id_str} ditolak.")
+                return k
+            publish_reading_event(device, row)
+        return len(reading_rows)
+
+    new_readings = [ECGReading(**row) for row in reading_rows]
+    db.session.add_all(new_readings)
+    record_latest_reading(device, new_readings)
+    update_rollups(reading_rows)
+    db.session.commit()
+    for row, reading in zip(reading_rows, new_readings):
+        publish_reading_event(device, row, reading.id)
+    return len(reading_rows)
+
+# Semua kolom yang diisi jalur ingest; row write-behind selalu punya key yang sama
+# (executemany butuh set kolom yang seragam)
+READING_ROW_KEYS = ('timestamp', 'prediction', 'heart_rate', 'ecg_blob', 'waveform_segment', 'waveform_offset',
+                    'waveform_length', 'signal_quality', 'device_id', 'user_id')
+
+def store_reading_rows(rows):
+    """
+    Tulis banyak row reading dalam SATU transaksi: INSERT executemany (insertmanyvalues + RETURNING id),
+    terus upsert reading terakhir per device. Dipake writer write-behind.
+    """
+    rows = [{key: row.get(key) for key in READING_ROW_KEYS} for row in rows]
+    with app.app_context(), metrics.timed('db_flush'):
+        try:
+            table = ECGReading.__table__
+            ids = db.session.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+
+            newest = {}
+            for row, reading_id in zip(rows, ids):
+                current = newest.get(row['device_id'])
+                if current is None or (row['timestamp'], reading_id) > (current[0]['timestamp'], current[1]):
+                    newest[row['device_id']] = (row, reading_id)
+            for device_id, (row, reading_id) in newest.items():
+                upsert_latest_reading(device_id, reading_id, row['timestamp'], row['prediction'], row['heart_rate'])
+            update_rollups(rows)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+def database_writable():
+    """
+    Health check writer write-behind: beneran nyoba nulis (UPDATE no-op yang di-rollback), bukan SELECT 1.
+    Di SQLite WAL baca tetep jalan walaupun tulis gagal (lock dipegang penulis lain lewat busy_timeout,
+    disk penuh, file read-only); di Postgres UPDATE ditolak kalo transaksinya read-only / standby
+    """
+    with app.app_context():
+        try:
+            db.session.execute(db.update(ECGReading).where(db.false()).values(id=ECGReading.id))
+            return True
+        except Exception:
+            return False
+        finally:
+            db.session.rollback()
+            db.session.remove()
+
+def is_row_write_error(error):
+    """
+    Error flush gara-gara isi row (constraint, data gak valid, tipe salah) -> batch di-bisect.
+    Error DBAPI lain (OperationalError: locked / disk I/O / read-only, koneksi putus) itu DB-nya
+    yang bermasalah, row-nya di-spill & di-replay nanti
+    """
+    return isinstance(error, (IntegrityError, DataError)) or not isinstance(error, DBAPIError)
+
+if INGEST_WRITE_MODE == 'behind':
+    write_queue = WriteBehindQueue(
+        store_reading_rows,
+        max_rows=WRITE_BEHIND_MAX_ROWS,
+        max_wait_ms=WRITE_BEHIND_MAX_WAIT_MS,
+        max_queue=WRITE_BEHIND_MAX_QUEUE,
+        logger=app.logger,
+        health_fn=database_writable,
+        spill_dir=WRITE_BEHIND_SPILL_DIR,
+        max_retries=WRITE_BEHIND_MAX_RETRIES,
+        is_row_error=is_row_write_error
+    )
+    # Pas worker shutdown, kuras dulu antrian ke DB
+    atexit.register(write_queue.stop)
+
+def encode_history_cursor(reading):
+    """ Cursor keyset (timestamp, id) reading terakhir di halaman -> string opaque buat client """
+    raw = f"{reading.timestamp.isoformat()}|{reading.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_history_cursor(cursor):
+    """ Kebalikan encode_history_cursor. ValueError kalo cursor rusak """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, reading_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(reading_id)
+    except Exception:
+        raise ValueError("Cursor tidak valid")
+
+# Role + ID pasien yang dipantau, dibangun sekali per user terus disimpen di auth_cache
+AuthContext = namedtuple('AuthContext', ['role', 'monitored_patient_ids'])
+
+def _load_auth_context(user_id):
+    is_pasien = db.session.query(Device.id).filter(Device.user_id == user_id).first() is not None
+    monitored_patient_ids = frozenset(
+        patient_id for (patient_id,) in
+        db.session.query(MonitoringRelationship.patient_id).filter(MonitoringRelationship.monitor_id == user_id)
+    )
+    return AuthContext(resolve_role(is_pasien, bool(monitored_patient_ids)), monitored_patient_ids)
+
+def get_auth_context(user_id):
+    return auth_cache.get_or_load(user_id, _load_auth_context)
+
+def can_view_user(viewer_id, patient_id):
+    """ Boleh liat data patient_id kalo itu diri sendiri atau pasien yang dia pantau (O(1)) """
+    if patient_id is None:
+        return False
+    return viewer_id == patient_id or patient_id in get_auth_context(viewer_id).monitored_patient_ids
+
+def invalidate_auth_cache():
+    """ Dipanggil SETELAH commit perubahan relasi kerabat / kepemilikan device """
+    auth_cache.invalidate()
+
 def get_dynamic_role(user):
-    is_pasien = db.session.query(Device.id).filter(Device.user_id == user.id).first() is not None
-    is_kerabat = db.session.query(MonitoringRelationship.id).filter(MonitoringRelationship.monitor_id == user.id).first() is not None
-    
+    return get_auth_context(user.id).role
+
+def resolve_role(is_pasien, is_kerabat):
     if is_pasien and is_kerabat:
         return 'pasien_kerabat'
     elif is_pasien:
@@ -227,7 +796,41 @@ def get_dynamic_role(user):
 
 @app.route("/api/v1")
 def index():
-    return jsonify({"message": "Server Analisis ECG berjalan!", "model_loaded": (classification_interpreter is not None)})
+    return jsonify({"message": "Server Analisis ECG berjalan!", "model_loaded": (inference_engine is not None)})
+
+@app.route("/api/v1/ingest/queue")
+def ingest_queue_stats():
+    """ Lag & kedalaman antrian write-behind di worker yang kebetulan ngelayanin request ini """
+    if write_queue is None:
+        return jsonify({"mode": INGEST_WRITE_MODE})
+    return jsonify({"mode": INGEST_WRITE_MODE, "pid": os.getpid(), **write_queue.stats()})
+
+@app.route("/api/v1/ready")
+def readiness():
+    """ Readiness probe: 200 kalo model beat udah dimuat & di-warm-up, 503 kalo belum / gagal """
+    ready = inference_engine is not None
+    payload = {
+        "beatModel": ready,
+        "rhythmModel": rhythm_classifier is not None,
+        "inferenceMode": INFERENCE_MODE,
+        "startup": startup_report
+    }
+    if ready and INFERENCE_MODE == 'remote':
+        # Model-nya di proses lain: ready kalo service-nya nyaut
+        try:
+            payload["service"] = inference_engine.info()
+        except InferenceServiceError as e:
+            ready = False
+            payload["serviceError"] = str(e)
+    payload["status"] = "ready" if ready else "not_ready"
+    return jsonify(payload), 200 if ready else 503
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """ Scrape Prometheus: histogram per tahap ingest, counter prediksi & penolakan, status model (gabungan semua worker) """
+    if not metrics.available():
+        return jsonify({"error": "prometheus_client tidak terinstall di server ini"}), 503
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE_LATEST)
 
 @app.route('/api/v1/auth/register', methods=['POST'])
 def register_user():
@@ -314,6 +917,7 @@ def register_device():
     try:
         db.session.add(new_device)
         db.session.commit()
+        invalidate_device_cache() # Bisa aja ID ini sebelumnya ke-cache sebagai 'belum terdaftar'
         app.logger.info(f"Device baru {mac} didaftarkan dengan ID {new_device_id_str}.")
         return jsonify({"device_id": new_device_id_str}), 201
     except Exception as e:
@@ -337,6 +941,8 @@ def claim_device():
         else: return jsonify({"error": "Device ini sudah dimiliki oleh akun lain."}), 409
     device.user_id = current_user_id
     db.session.commit()
+    invalidate_device_cache()
+    invalidate_auth_cache() # Role bisa berubah jadi 'pasien'
     app.logger.info(f"User {current_user_id} berhasil mengklaim device {device_id_str}.")
     return jsonify({"message": f"Device {device_id_str} berhasil diklaim."}), 200
 
@@ -351,6 +957,8 @@ def unclaim_device():
     if not device: return jsonify({"error": "Device tidak ditemukan atau bukan milik Anda."}), 404
     device.user_id = None
     db.session.commit()
+    invalidate_device_cache()
+    invalidate_auth_cache()
     app.logger.info(f"User {current_user_id} melepaskan kepemilikan device {device_id_str}.")
     return jsonify({"message": f"Kepemilikan device {device_id_str} berhasil dilepaskan."}), 200
 
@@ -375,6 +983,7 @@ def set_device_patient():
     # Simpan status: Alat ini lagi dipake sama target_patient_id
     device.active_patient_id = target_patient_id
     db.session.commit()
+    invalidate_device_cache()
     
     return jsonify({"message": f"Mode alat diubah. Sekarang merekam data untuk User ID: {target_patient_id}"}), 200
 
@@ -396,27 +1005,22 @@ def reset_device_patient():
     # Balikin ke mode default (Merekam buat owner)
     device.active_patient_id = None
     db.session.commit()
+    invalidate_device_cache()
     
     return jsonify({"message": "Mode alat kembali ke Pemilik (Owner)."}), 200
 
-def extract_afib_features(signal_data):
+def extract_afib_features(beats):
     """
-    Mengubah sinyal mentah (1024 points) menjadi 6 Fitur Statistik (HRV).
+    Mengubah hasil deteksi beat (detect_r_peaks) menjadi 6 Fitur Statistik (HRV).
     Sesuai dengan script training model baru.
     Output: Numpy array shape (1, 6)
     """
     try:
-        peaks, _ = find_peaks(
-            signal_data, 
-            height=0.6,
-            distance=0.4 * SAMPLING_RATE 
-        )
-        
-        if len(peaks) < 2:
+        if len(beats["peaks"]) < 2:
             return np.zeros((1, 6), dtype=np.float32)
 
-        # 2. Hitung Jarak Antar Puncak (RR Intervals) dalam detik
-        rr_intervals = np.diff(peaks) / SAMPLING_RATE
+        # 2. Jarak Antar Puncak (RR Intervals) dalam detik
+        rr_intervals = beats["rr_seconds"]
         
         # 3. Hitung 6 Fitur Statistik (HRV) - WAJIB SAMA URUTANNYA DENGAN TRAINING
         f1_mean = np.mean(rr_intervals) * 1000 # Convert ke ms biar sama kayak training
@@ -426,13 +1030,10 @@ def extract_afib_features(signal_data):
         diff_rr = np.diff(rr_intervals)
         f3_rmssd = np.sqrt(np.mean(diff_rr**2)) * 1000 if len(diff_rr) > 0 else 0
         
-        # Non-Linear & Others (SD1, SD2, Sampen kita skip/simplify kalo library nolds berat di server)
-        # TAPI biar index ga error 'Input 6', kita isi dummy stat dulu kalo library nolds ga ada
-        # (Idealnya server install 'nolds', tapi kalo takut berat, pake logic sederhana ini)
-        
+        # Non-Linear: SD1, SD2 (Poincare) & Sample Entropy (versi numpy, tanpa nolds)
         f4_sd1 = np.sqrt(0.5 * np.var(diff_rr)) * 1000 if len(diff_rr) > 0 else 0
         f5_sd2 = np.sqrt(2 * f2_std**2 - f4_sd1**2) 
-        f6_sampen = 0 # SampEn berat dihitung, kasih dummy 0 aman buat random forest
+        f6_sampen = sample_entropy(rr_intervals) # 0 kalo RR-nya kurang (< m + 2)
         
         # Gabung jadi satu array 2D shape (1, 6)
         features = np.array([[f1_mean, f2_std, f3_rmssd, f4_sd1, f5_sd2, f6_sampen]], dtype=np.float32)
@@ -443,12 +1044,130 @@ def extract_afib_features(signal_data):
         app.logger.error(f"Gagal ekstrak fitur AFib: {e}")
         return np.zeros((1, 6), dtype=np.float32)
 
+def parse_device_timestamp(timestamp_str):
+    try:
+        if timestamp_str and "+" in timestamp_str: timestamp_str = timestamp_str.split("+")[0]
+        return datetime.fromisoformat(timestamp_str)
+    except (ValueError, TypeError, AttributeError):
+        return datetime.utcnow()
+
+def resolve_reading_owner(device):
+    """ Data disimpen buat active patient (kalo diset), kalo nggak buat owner device """
+    if device.active_patient_id:
+        app.logger.info(f"Menyimpan data untuk ACTIVE PATIENT: {device.active_patient_id}")
+        return device.active_patient_id
+    app.logger.info(f"Menyimpan data untuk OWNER: {device.user_id}")
+    return device.user_id
+
+def rhythm_features(beats, rr_buffer=None, window_end_time=None, window_length=1024):
+    """
+    6 fitur HRV buat rhythm classifier, shape (1, 6).
+    Kalo ada rr_buffer (per device), beat window ini dimasukin dulu & fiturnya diambil dari
+    seluruh horizon buffer (lebih stabil dari ~3 beat per window). Kalo nggak, dari window ini aja.
+    """
+    if rr_buffer is None:
+        return extract_afib_features(beats)
+    with rr_buffer.lock:
+        rr_buffer.add_window(beats, window_end_time, window_length, SAMPLING_RATE)
+        hrv = rr_buffer.features()
+        if hrv is None:
+            return np.zeros((1, 6), dtype=np.float32)
+        f6_sampen = sample_entropy(rr_buffer.rr_intervals())
+    return np.array([hrv + [f6_sampen]], dtype=np.float32)
+
+def classify_rhythm(afib_features_array):
+    """
+    Inferensi AFib / Rhythm (Random Forest versi compile) dari fitur HRV (N, 6), semua window sekaligus.
+    Return list (label_str, list_probabilitas) per window.
+    """
+    n = len(afib_features_array)
+    if rhythm_classifier is None:
+        return [("Unknown", [])] * n
+
+    try:
+        # A. Fitur HRV (Numpy Array) udah dihitung di rhythm_features(), urutan kolom = RHYTHM_FEATURE_NAMES
+        # B. Kelas + Probabilitas (Confidence) dalam satu kali jalan, output 4 angka float per window
+        afib_preds, afib_probs = rhythm_classifier.predict(np.asarray(afib_features_array, dtype=np.float32).reshape(n, -1))
+    except Exception as e:
+        app.logger.error(f"❌ Gagal inferensi Rhythm: {e}")
+        return [("Error", [])] * n
+
+    results = []
+    for raw_afib, probs in zip(afib_preds, afib_probs):
+        # C. Mapping Label (Sesuai Training Baru)
+        afib_result_str = RHYTHM_LABELS.get(str(raw_afib), f"Unknown ({raw_afib})")
+        app.logger.info(f"✅ Prediksi Rhythm: {afib_result_str} (Class {raw_afib})")
+        results.append((afib_result_str, probs.tolist()))
+    return results
+
+def format_prediction_text(beat_result, afib_result_str):
+    # Format: "PVC | AFib Detected"
+    final_prediction_text = f"{beat_result}"
+    
+    # Hanya tambahkan status Rhythm jika BUKAN Normal dan BUKAN Unknown
+    if afib_result_str not in ["Unknown", "Normal Rhythm", "Error"]:
+         final_prediction_text += f" | {afib_result_str}"
+    elif afib_result_str == "Error":
+         final_prediction_text += " | Rhythm Error"
+    return final_prediction_text
+
+def analyze_windows(processed_windows, prediction_probabilities, rr_buffer=None, timestamps=None):
+    """
+    Post-processing window yang udah lewat TFLite: label beat, rhythm (RF), & heart rate.
+    processed_windows: (N, 1024, 1) hasil preprocess, prediction_probabilities: (N, n_kelas).
+    rr_buffer + timestamps (waktu sampel terakhir tiap window): fitur rhythm dari buffer RR device.
+    Fitur dihitung urut per window (buffer RR-nya nyambung), RF-nya sekali buat semua window. Return list dict hasil.
+    """
+    signals = [np.asarray(window).flatten() for window in processed_windows]
+    timestamps = timestamps if timestamps is not None else [None] * len(signals)
+
+    # Deteksi R-peak SEKALI per window, dipake bareng buat rhythm classifier & heart rate
+    beats_list, features = [], []
+    for signal_1d, timestamp in zip(signals, timestamps):
+        with metrics.timed('beat_detection'):
+            beats = detect_r_peaks(signal_1d, SAMPLING_RATE)
+        window_end_time = timestamp.timestamp() if timestamp else time.time()
+        with metrics.timed('rhythm_features'):
+            features.append(rhythm_features(beats, rr_buffer, window_end_time, signal_1d.size)[0])
+        beats_list.append(beats)
+    with metrics.timed('rhythm_classifier'):
+        rhythms = classify_rhythm(np.asarray(features, dtype=np.float32))
+
+    results = []
+    for signal_1d, beats, probabilities, (afib_result_str, afib_probs_list) in zip(signals, beats_list, prediction_probabilities, rhythms):
+        beat_result = BEAT_LABELS[np.argmax(probabilities)] # Label: Normal/PVC/Other
+        with metrics.timed('heart_rate'):
+            heart_rate = calculate_heart_rate(beats)
+        metrics.count_prediction(beat_result, afib_result_str)
+        results.append({
+            "prediction": format_prediction_text(beat_result, afib_result_str),
+            "heartRate": heart_rate,
+            "probabilities": np.asarray(probabilities).tolist(),
+            "afib_probabilities": afib_probs_list,
+            "afib_status": afib_result_str,
+            "signal": signal_1d
+        })
+    return results
+
+def analyze_window(processed_window, prediction_probabilities, rr_buffer=None, timestamp=None):
+    """ analyze_windows buat satu window (1024, 1) / (1, 1024, 1). Return dict hasil """
+    return analyze_windows([processed_window], [prediction_probabilities], rr_buffer, [timestamp])[0]
+
 @app.route('/api/v1/analyze-ecg', methods=['POST'])
+@metrics.timed_endpoint('single')
 def analyze_ecg():
-    data = request.get_json()
+    # JSON (firmware lama), msgpack, atau int16 mentah; boleh di-gzip
+    try:
+        with metrics.timed('json_decode'):
+            data = decode_ecg_request(request, MAX_DECOMPRESSED_BYTES)
+    except PayloadError as e:
+        app.logger.warning(f"Payload /analyze-ecg ditolak: {e}")
+        metrics.count_rejection('single', 'payload')
+        return jsonify({"error": str(e)}), e.status_code
     
     # --- 1. Validasi Input ---
     if not data or 'ecg_beat_data' not in data or 'device_id' not in data:
+        metrics.count_rejection('single', 'invalid_request')
         return jsonify({"error": "Request body harus berisi 'ecg_beat_data' dan 'device_id'"}), 400
 
     device_id_str = data['device_id']
@@ -456,144 +1175,391 @@ def analyze_ecg():
     timestamp_str = data.get('timestamp')
     app.logger.info(f"Menerima data dari device: {device_id_str} ({len(ecg_beat)} points).")
 
-    # --- 2. Cek Kualitas Sinyal (Flatline Check) ---
-    flatline_count = 0
-    for point in ecg_beat:
-        if point <= 10 or point >= 4090: flatline_count += 1
-    if (flatline_count / len(ecg_beat)) > 0.8:
-        app.logger.warning(f"Data from {device_id_str} ditolak: Sinyal flatline.")
-        return jsonify({"error": "Data EKG tidak valid (sinyal flatline/elektroda terlepas)"}), 400
+    # --- 2. Cek Kualitas Sinyal (sebelum query device & TFLite) ---
+    with metrics.timed('quality_check'):
+        quality = assess_signal_quality(ecg_beat, SAMPLING_RATE)
+    if quality["reason"]:
+        app.logger.warning(f"Data from {device_id_str} ditolak: kualitas sinyal '{quality['reason']}' (skor {quality['score']}).")
+        metrics.count_rejection('single', quality["reason"])
+        return jsonify({"error": QUALITY_REJECT_MESSAGES[quality["reason"]], "reason": quality["reason"]}), 400
 
     # --- 3. Cek Device Terdaftar ---
-    device = Device.query.filter_by(device_id_str=device_id_str).first()
-    if not device: return jsonify({"error": f"Device ID '{device_id_str}' belum terdaftar."}), 404
+    with metrics.timed('device_lookup'):
+        device = get_device_record(device_id_str)
+    if not device:
+        metrics.count_rejection('single', 'unknown_device')
+        return jsonify({"error": f"Device ID '{device_id_str}' belum terdaftar."}), 404
 
     # --- 4. Cek Model Ready ---
-    if classification_interpreter is None:
+    if inference_engine is None:
         app.logger.error("Model TFLite (Beat) belum dimuat!")
+        metrics.count_rejection('single', 'model_unavailable')
         return jsonify({"error": "Model inferensi sedang tidak tersedia."}), 503
 
     try:
         # --- 5. Preprocessing Data ---
         # Standarisasi data menjadi mean=0, std=1, panjang=1024
-        processed_input = preprocess_input(ecg_beat, target_length=1024)
+        with metrics.timed('preprocess'):
+            processed_input = preprocess_input(ecg_beat, target_length=1024)
 
         # --- 6. INFERENSI TFLITE (Beat Morphology: Normal/PVC) ---
-        start_time = time.time()
-        classification_interpreter.set_tensor(input_details[0]['index'], processed_input)
-        classification_interpreter.invoke()
-        
-        # Ambil probabilitas TFLite
-        prediction_probabilities = classification_interpreter.get_tensor(output_details[0]['index'])[0]
-        
-        predicted_index = np.argmax(prediction_probabilities)
-        beat_result = BEAT_LABELS[predicted_index] # Label: Normal/PVC/Other
+        # Gak langsung invoke() di sini: window dititipin ke batcher, digabung sama
+        # request lain yang dateng barengan, terus kita dapet potongan hasil kita sendiri
+        # (waktu nunggu batch-nya ikut keukur)
+        with metrics.timed('tflite_invoke'):
+            prediction_probabilities = inference_engine.predict(processed_input)
 
-        # --- 7. INFERENSI AFIB / RHYTHM (Random Forest) ---
-        afib_result_str = "Unknown"
-        afib_probs_list = [] 
-        
-        if afib_classifier:
-            try:
-                # A. Ekstrak 6 Fitur HRV (Numpy Array)
-                # Input: Flatten array 1D
-                afib_features_array = extract_afib_features(processed_input.flatten())
-                
-                # [FIX WARNING] Ubah jadi DataFrame & Kasih Nama Kolom Sesuai Training
-                feature_names = ['mean_rr', 'sdnn', 'rmssd', 'sd1', 'sd2', 'sampen']
-                afib_features_df = pd.DataFrame(afib_features_array, columns=feature_names)
-                
-                # B. Prediksi Kelas
-                afib_pred = afib_classifier.predict(afib_features_df)
-                raw_afib = afib_pred[0] 
-                
-                # C. Prediksi Probabilitas (Confidence)
-                # Output: List 4 angka float
-                afib_probs_list = afib_classifier.predict_proba(afib_features_df)[0].tolist()
-
-                # D. Mapping Label (Sesuai Training Baru)
-                # 0: AFIB, 1: Brady, 2: Tachy, 3: Normal
-                if str(raw_afib) == "0": 
-                    afib_result_str = "AFib Detected"
-                elif str(raw_afib) == "1":
-                    afib_result_str = "Bradycardia"
-                elif str(raw_afib) == "2":
-                    afib_result_str = "Tachycardia"
-                elif str(raw_afib) == "3":
-                    afib_result_str = "Normal Rhythm"
-                else:
-                    afib_result_str = f"Unknown ({raw_afib})"
-                
-                app.logger.info(f"✅ Prediksi Rhythm: {afib_result_str} (Class {raw_afib})")
-                
-            except Exception as e:
-                app.logger.error(f"❌ Gagal inferensi Rhythm: {e}")
-                afib_result_str = "Error"
-                afib_probs_list = [] 
+        # --- 7. Parse Timestamp ---
+        parsed_timestamp = parse_device_timestamp(timestamp_str)
 
-        # --- 8. Hitung Heart Rate (BPM) ---
-        heart_rate = calculate_heart_rate(processed_input.flatten()) 
-        
-        # --- 9. Parse Timestamp ---
-        try:
-            if timestamp_str and "+" in timestamp_str: timestamp_str = timestamp_str.split("+")[0]
-            parsed_timestamp = datetime.fromisoformat(timestamp_str)
-        except (ValueError, TypeError, AttributeError):
-            parsed_timestamp = datetime.utcnow()
+        # --- 8 & 9. Rhythm (Random Forest, fitur dari buffer RR device) + Heart Rate (BPM) ---
+        result = analyze_window(processed_input, prediction_probabilities, rr_buffers.get(device.id), parsed_timestamp)
 
         # --- 10. Tentukan Pemilik Data (Owner vs Patient) ---
-        final_user_id = None
-        if device.active_patient_id:
-            final_user_id = device.active_patient_id
-            app.logger.info(f"Menyimpan data untuk ACTIVE PATIENT: {final_user_id}")
-        else:
-            final_user_id = device.user_id
-            app.logger.info(f"Menyimpan data untuk OWNER: {final_user_id}")
-        
-        # --- 11. Format Teks Gabungan untuk DB ---
-        # Format: "PVC | AFib Detected"
-        final_prediction_text = f"{beat_result}"
+        final_user_id = resolve_reading_owner(device)
         
-        # Hanya tambahkan status Rhythm jika BUKAN Normal dan BUKAN Unknown
-        if afib_result_str not in ["Unknown", "Normal Rhythm", "Error"]:
-             final_prediction_text += f" | {afib_result_str}"
-        elif afib_result_str == "Error":
-             final_prediction_text += " | Rhythm Error"
-
-        # --- 12. Simpan ke Database ---
-        new_reading = ECGReading(
+        # --- 11. Simpan ke Database (langsung, atau dititipin ke writer write-behind) ---
+        reading_row = dict(
             timestamp=parsed_timestamp,
-            prediction=final_prediction_text,
-            heart_rate=heart_rate,
-            processed_ecg_data=processed_input.flatten().tolist(), 
+            prediction=result["prediction"],
+            heart_rate=result["heartRate"],
+            **waveform_columns(device, result["signal"]), 
+            signal_quality=quality["score"],
             device_id=device.id,
             user_id=final_user_id
         )
-        db.session.add(new_reading)
-        db.session.commit()
-
-        app.logger.info(f"💾 Data tersimpan. Prediksi: {final_prediction_text}, HR: {heart_rate}")
+        with metrics.timed('db_commit'):
+            stored = persist_readings(device, [reading_row])
+        if stored == 0:
+            metrics.count_rejection('single', 'queue_full')
+            return jsonify({"error": "Server sedang sibuk, coba kirim ulang."}), 503
+        app.logger.info(f"{'📥 Data diantrikan' if write_queue else '💾 Data tersimpan'}. Prediksi: {result['prediction']}, HR: {result['heartRate']}")
         
-        # --- 13. Return JSON Response ---
+        # --- 12. Return JSON Response ---
         return jsonify({
             "status": "success",
-            "prediction": final_prediction_text,
-            "heartRate": heart_rate,
+            "prediction": result["prediction"],
+            "heartRate": result["heartRate"],
             
             # Probabilitas TFLite (Beat)
-            "probabilities": prediction_probabilities.tolist(),
+            "probabilities": result["probabilities"],
             
             # Probabilitas Random Forest (Rhythm) - [AFib, Brady, Tachy, Normal]
-            "afib_probabilities": afib_probs_list,
+            "afib_probabilities": result["afib_probabilities"],
             
-            "afib_status": afib_result_str
+            "afib_status": result["afib_status"],
+            "signalQuality": quality["score"]
         })
 
+    except (TimeoutError, InferenceServiceError) as e:
+        # Batcher macet / service inferensi gak jawab dalam INFERENCE_TIMEOUT_S
+        db.session.rollback()
+        app.logger.error(f"❌ Inferensi gak selesai: {e}")
+        metrics.count_rejection('single', 'model_unavailable')
+        return jsonify({"error": "Model inferensi sedang tidak tersedia."}), 503
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"🔥 ERROR SYSTEM: {e}", exc_info=True)
+        metrics.count_rejection('single', 'internal_error')
         return jsonify({"error": f"Kesalahan internal: {str(e)}"}), 500
 
+@app.route('/api/v1/analyze-ecg/batch', methods=['POST'])
+@metrics.timed_endpoint('batch')
+def analyze_ecg_batch():
+    """
+    Bulk ingestion: banyak window sekaligus dalam satu request (misal buffer device pas offline).
+    Body: {"device_id": "...", "windows": [{"ecg_beat_data": [...], "timestamp": "..."}, ...]}
+    (JSON atau msgpack; di msgpack 'ecg_beat_data' boleh berupa bin int16/float32)
+    """
+    try:
+        with metrics.timed('json_decode'):
+            data = decode_ecg_request(request, MAX_DECOMPRESSED_BYTES)
+    except PayloadError as e:
+        app.logger.warning(f"Payload /analyze-ecg/batch ditolak: {e}")
+        metrics.count_rejection('batch', 'payload')
+        return jsonify({"error": str(e)}), e.status_code
+
+    # --- 1. Validasi Input (semua window dicek duluan) ---
+    if not data or 'windows' not in data or 'device_id' not in data:
+        return jsonify({"error": "Request body harus berisi 'windows' dan 'device_id'"}), 400
+
+    device_id_str = data['device_id']
+    windows = data['windows']
+    if not isinstance(windows, list) or len(windows) == 0:
+        return jsonify({"error": "'windows' harus berupa list yang tidak kosong"}), 400
+    if len(windows) > MAX_WINDOWS_PER_BATCH:
+        return jsonify({"error": f"Maksimal {MAX_WINDOWS_PER_BATCH} window per request"}), 413
+
+    for i, window in enumerate(windows):
+        if not isinstance(window, dict) or not isinstance(window.get('ecg_beat_data'), (list, np.ndarray)) or len(window['ecg_beat_data']) == 0:
+            return jsonify({"error": f"Window ke-{i} harus berisi 'ecg_beat_data' (list angka)"}), 400
+
+    app.logger.info(f"Menerima batch dari device: {device_id_str} ({len(windows)} window).")
+
+    # --- 2. Cek Kualitas Sinyal per Window (yang jelek gak ikut diproses) ---
+    results = [None] * len(windows)
+    qualities = [None] * len(windows)
+    valid_indexes = []
+    for i, window in enumerate(windows):
+        with metrics.timed('quality_check'):
+            qualities[i] = assess_signal_quality(window['ecg_beat_data'], SAMPLING_RATE)
+        reason = qualities[i]["reason"]
+        if reason:
+            metrics.count_rejection('batch', reason)
+            results[i] = {"index": i, "status": "rejected", "reason": reason, "error": QUALITY_REJECT_MESSAGES[reason]}
+        else:
+            valid_indexes.append(i)
+
+    if len(valid_indexes) < len(windows):
+        app.logger.warning(f"Batch {device_id_str}: {len(windows) - len(valid_indexes)} window ditolak (kualitas sinyal).")
+
+    # --- 3. Cek Device Terdaftar (sekali aja buat semua window) ---
+    with metrics.timed('device_lookup'):
+        device = get_device_record(device_id_str)
+    if not device:
+        metrics.count_rejection('batch', 'unknown_device')
+        return jsonify({"error": f"Device ID '{device_id_str}' belum terdaftar."}), 404
+
+    # --- 4. Cek Model Ready ---
+    if inference_engine is None:
+        app.logger.error("Model TFLite (Beat) belum dimuat!")
+        metrics.count_rejection('batch', 'model_unavailable')
+        return jsonify({"error": "Model inferensi sedang tidak tersedia."}), 503
+
+    try:
+        if valid_indexes:
+            # --- 5. Preprocessing + Inferensi TFLite sekali jalan buat semua window ---
+            with metrics.timed('preprocess'):
+                processed_batch = preprocess_batch([windows[i]['ecg_beat_data'] for i in valid_indexes], target_length=1024)
+            with metrics.timed('tflite_invoke'):
+                batch_probabilities = inference_engine.predict_batch(processed_batch)
+
+            # --- 6. Post-processing per window & simpan dalam SATU transaksi ---
+            final_user_id = resolve_reading_owner(device)
+            timestamps = [parse_device_timestamp(windows[i].get('timestamp')) for i in valid_indexes]
+            analyzed = analyze_windows(processed_batch, batch_probabilities, rr_buffers.get(device.id), timestamps)
+            reading_rows = []
+            for k, i in enumerate(valid_indexes):
+                parsed_timestamp, result = timestamps[k], analyzed[k]
+                reading_rows.append(dict(
+                    timestamp=parsed_timestamp,
+                    prediction=result["prediction"],
+                    heart_rate=result["heartRate"],
+                    **waveform_columns(device, result["signal"]),
+                    signal_quality=qualities[i]["score"],
+                    device_id=device.id,
+                    user_id=final_user_id
+                ))
+                results[i] = {
+                    "index": i,
+                    "status": "success",
+                    "timestamp": parsed_timestamp.isoformat(),
+                    "prediction": result["prediction"],
+                    "heartRate": result["heartRate"],
+                    "probabilities": result["probabilities"],
+                    "afib_probabilities": result["afib_probabilities"],
+                    "afib_status": result["afib_status"],
+                    "signalQuality": qualities[i]["score"]
+                }
+
+            with metrics.timed('db_commit'):
+                stored = persist_readings(device, reading_rows)
+            metrics.count_rejection('batch', 'queue_full', len(reading_rows) - stored)
+            # Antrian write-behind penuh: sisa window gak kesimpen, device bisa kirim ulang yang statusnya 'error'
+            for j in valid_indexes[stored:]:
+                results[j] = {"index": j, "status": "error", "reason": "queue_full", "error": "Server sedang sibuk, coba kirim ulang."}
+            valid_indexes = valid_indexes[:stored]
+
+        app.logger.info(f"💾 Batch tersimpan: {len(valid_indexes)}/{len(windows)} window dari {device_id_str}.")
+        return jsonify({
+            "status": "success",
+            "stored": len(valid_indexes),
+            "rejected": len(windows) - len(valid_indexes),
+            "results": results
+        })
+
+    except (TimeoutError, InferenceServiceError) as e:
+        # Batcher macet / service inferensi gak jawab dalam INFERENCE_TIMEOUT_S
+        db.session.rollback()
+        app.logger.error(f"❌ Inferensi (batch) gak selesai: {e}")
+        metrics.count_rejection('batch', 'model_unavailable')
+        return jsonify({"error": "Model inferensi sedang tidak tersedia."}), 503
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"🔥 ERROR SYSTEM (batch): {e}", exc_info=True)
+        metrics.count_rejection('batch', 'internal_error')
+        return jsonify({"error": f"Kesalahan internal: {str(e)}"}), 500
+
+def process_stream_windows(device, buffer, ready, counters):
+    """ Cek kualitas, inferensi batch, post-processing & simpan window hasil ring buffer. Return hasil terakhir """
+    counters["windows"] += len(ready)
+    valid = []
+    for end, window in ready:
+        with metrics.timed('quality_check'):
+            quality = assess_signal_quality(window, SAMPLING_RATE)
+        if quality["reason"]:
+            counters["rejected"] += 1
+            metrics.count_rejection('stream', quality["reason"])
+        else:
+            valid.append((end, window, quality))
+    if not valid:
+        return None
+
+    with metrics.timed('preprocess'):
+        processed_batch = preprocess_batch([window for _, window, _ in valid], target_length=1024)
+    with metrics.timed('tflite_invoke'):
+        batch_probabilities = inference_engine.predict_batch(processed_batch)
+
+    final_user_id = resolve_reading_owner(device)
+    reading_rows = []
+    latest = None
+    # Timestamp reading = waktu sampel terakhir di window
+    timestamps = [buffer.time_at(end) for end, _, _ in valid]
+    analyzed = analyze_windows(processed_batch, batch_probabilities, rr_buffers.get(device.id), timestamps)
+    for k, (_, _, quality) in enumerate(valid):
+        timestamp, result = timestamps[k], analyzed[k]
+        reading_rows.append(dict(
+            timestamp=timestamp,
+            prediction=result["prediction"],
+            heart_rate=result["heartRate"],
+            **waveform_columns(device, result["signal"]),
+            signal_quality=quality["score"],
+            device_id=device.id,
+            user_id=final_user_id
+        ))
+        latest = {
+            "timestamp": timestamp.isoformat(),
+            "prediction": result["prediction"],
+            "heartRate": result["heartRate"],
+            "afib_status": result["afib_status"],
+            "signalQuality": quality["score"]
+        }
+
+    with metrics.timed('db_commit'):
+        stored = persist_readings(device, reading_rows)
+    metrics.count_rejection('stream', 'queue_full', len(reading_rows) - stored)
+    counters["stored"] += stored
+    counters["rejected"] += len(reading_rows) - stored
+    return latest
+
+def stop_reading(client_socket):
+    """
+    Sisa body stream gak dibaca lagi. gunicorn ngebuang header Connection: close dari app & bakal nguras
+    sisa body sebelum request berikutnya (thread-nya ketahan sampe device berhenti ngirim), jadi sisi baca
+    socket-nya ditutup: pengurasan langsung EOF & koneksinya ditutup abis response dikirim
+    """
+    if client_socket is None:
+        return
+    try:
+        client_socket.shutdown(socket.SHUT_RD)
+    except OSError:
+        pass
+
+@app.route('/api/v1/analyze-ecg/stream', methods=['POST'])
+@metrics.timed_endpoint('stream')
+def analyze_ecg_stream():
+    """
+    Ingest streaming: body = sampel biner (int16/float32 LE) yang dikirim terus-terusan,
+    lewat Transfer-Encoding: chunked atau beberapa POST berurutan (satu per satu, gak barengan).
+    Header: X-Device-Id, X-Sample-Dtype, X-Sample-Scale, X-Timestamp (waktu sampel pertama body ini, opsional).
+    Server nyimpen ring buffer per device & nginferensi window 1024 sampel tiap STREAM_HOP_SAMPLES sampel baru,
+    hasilnya disimpen per window kayak /analyze-ecg. X-Timestamp yang gak nyambung sama sampel sebelumnya
+    = rekaman baru, sisa sampel lama dibuang.
+    Satu POST paling lama STREAM_MAX_DURATION_S: abis itu response-nya "truncated": true & "samples" = jumlah
+    sampel yang udah dibaca, sisanya dikirim di POST baru (X-Timestamp = waktu sampel berikutnya).
+    Slot stream penuh -> 503 + Retry-After.
+    """
+    device_id_str = request.headers.get('X-Device-Id')
+    if not device_id_str:
+        return jsonify({"error": "Header 'X-Device-Id' dibutuhkan"}), 400
+    if (request.headers.get('Content-Encoding') or 'identity').lower().strip() not in ('identity', ''):
+        return jsonify({"error": "Stream tidak boleh dikompresi"}), 415
+    try:
+        decoder = SampleStreamDecoder(request.headers.get('X-Sample-Dtype', 'int16'), request.headers.get('X-Sample-Scale'))
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    with metrics.timed('device_lookup'):
+        device = get_device_record(device_id_str)
+    if not device:
+        metrics.count_rejection('stream', 'unknown_device')
+        return jsonify({"error": f"Device ID '{device_id_str}' belum terdaftar."}), 404
+    if inference_engine is None:
+        app.logger.error("Model TFLite (Beat) belum dimuat!")
+        metrics.count_rejection('stream', 'model_unavailable')
+        return jsonify({"error": "Model inferensi sedang tidak tersedia."}), 503
+
+    slot = stream_slots.acquire()
+    if slot is None:
+        metrics.count_rejection('stream', 'too_many_streams')
+        return jsonify({"error": "Terlalu banyak stream aktif, coba lagi nanti."}), 503, {"Retry-After": str(STREAM_RETRY_AFTER_S)}
+    # Satu device = satu stream aktif di semua worker (urutan sampel di ring buffer harus nyambung)
+    buffer = stream_buffers.claim(device.id)
+    if buffer is None:
+        stream_slots.release(slot)
+        return jsonify({"error": "Device ini sudah punya stream yang aktif"}), 409
+
+    # Socket client (gunicorn / werkzeug) dikasih timeout baca, biar device yang diem gak nahan thread selamanya
+    client_socket = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    socket_timeout = client_socket.gettimeout() if client_socket is not None else None
+    if client_socket is not None:
+        client_socket.settimeout(STREAM_READ_TIMEOUT_S)
+    counters = {"samples": 0, "windows": 0, "stored": 0, "rejected": 0}
+    latest = None
+    truncated = False
+    deadline = time.monotonic() + STREAM_MAX_DURATION_S
+    try:
+        timestamp_str = request.headers.get('X-Timestamp')
+        if timestamp_str or buffer.anchor_time is None:
+            if buffer.set_anchor(parse_device_timestamp(timestamp_str), STREAM_ANCHOR_TOLERANCE_MS / 1000.0):
+                app.logger.info(f"Stream {device_id_str}: X-Timestamp gak nyambung sama sampel sebelumnya, buffer di-reset.")
+        app.logger.info(f"Stream dari device: {device_id_str} (hop {buffer.hop} sampel, buffer {buffer.total} sampel).")
+
+        while True:
+            if time.monotonic() > deadline:
+                truncated = True
+                break
+            try:
+                chunk = request.stream.read(STREAM_READ_BYTES)
+            except TimeoutError:
+                app.logger.warning(f"Stream {device_id_str} diem lebih dari {STREAM_READ_TIMEOUT_S} detik, diputus.")
+                metrics.count_rejection('stream', 'read_timeout')
+                stop_reading(client_socket)
+                return jsonify({"error": "Stream berhenti ngirim data, koneksi diputus.", **counters}), 408
+            if not chunk:
+                break
+            samples = decoder.feed(chunk)
+            counters["samples"] += samples.size
+            ready = buffer.extend(samples)
+            if ready:
+                latest = process_stream_windows(device, buffer, ready, counters) or latest
+
+        if decoder.pending_bytes and not truncated:
+            app.logger.warning(f"Stream {device_id_str} berakhir dengan {decoder.pending_bytes} byte sisa (sampel kepotong).")
+    except (TimeoutError, InferenceServiceError) as e:
+        # Batcher macet / service inferensi gak jawab dalam INFERENCE_TIMEOUT_S
+        db.session.rollback()
+        app.logger.error(f"❌ Inferensi (stream) gak selesai: {e}")
+        metrics.count_rejection('stream', 'model_unavailable')
+        return jsonify({"error": "Model inferensi sedang tidak tersedia.", **counters}), 503
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"🔥 ERROR SYSTEM (stream): {e}", exc_info=True)
+        metrics.count_rejection('stream', 'internal_error')
+        return jsonify({"error": f"Kesalahan internal: {str(e)}", **counters}), 500
+    finally:
+        stream_buffers.release(device.id, buffer)
+        stream_slots.release(slot)
+        if client_socket is not None:
+            client_socket.settimeout(socket_timeout)
+
+    app.logger.info(f"💾 Stream {device_id_str}: {counters['samples']} sampel, {counters['stored']}/{counters['windows']} window tersimpan.")
+    response = jsonify({"status": "success", **counters, "latest": latest, "truncated": truncated})
+    if truncated:
+        app.logger.info(f"Stream {device_id_str} lewat {STREAM_MAX_DURATION_S:.0f} detik, dipotong (lanjut di POST baru).")
+        stop_reading(client_socket)
+    return response
+
 @app.route('/api/v1/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
@@ -631,44 +1597,88 @@ def get_dashboard():
     user = User.query.get(current_user_id)
     if not user: return jsonify({"error": "User tidak ditemukan"}), 404
 
-    response_data = []
+    # Device sendiri + device semua pasien yang dipantau, sekalian reading terakhirnya,
+    # dalam SATU query (DeviceLatestReading di-update pas ingest)
+    monitored_patient_ids = get_auth_context(user.id).monitored_patient_ids
+    rows = (db.session.query(Device, User, DeviceLatestReading, MonitoringRelationship.id)
+            .join(User, Device.user_id == User.id)
+            .outerjoin(DeviceLatestReading, DeviceLatestReading.device_id == Device.id)
+            .outerjoin(MonitoringRelationship, db.and_(MonitoringRelationship.monitor_id == user.id,
+                                                       MonitoringRelationship.patient_id == Device.user_id))
+            .filter(db.or_(Device.user_id == user.id, Device.user_id.in_(list(monitored_patient_ids))))
+            .order_by(Device.created_at)
+            .all())
+
+    # Urutan sama kayak dulu: device sendiri duluan, baru pasien sesuai urutan relasi
+    rows.sort(key=lambda row: (row[1].id != user.id, row[3] or 0))
 
-    # 1. AMBIL DEVICE SENDIRI
-    my_devices = user.devices
-    for device in my_devices:
-        # Ambil data terakhir (bisa None kalo device baru)
-        latest_reading = ECGReading.query.filter_by(device_id=device.id).order_by(ECGReading.timestamp.desc()).first()
-        
+    response_data = []
+    for device, owner, latest_reading, _ in rows:
         # [FIX] Tetep masukin ke list walau data kosong
         response_data.append({
-            "type": "self",
-            "user_id": user.id,
-            "user_email": user.email,
+            "type": "self" if owner.id == user.id else "correlative",
+            "user_id": owner.id,
+            "user_email": owner.email,
             "device_name": device.device_name,
             "heartRate": latest_reading.heart_rate if latest_reading else 0,
             "prediction": latest_reading.prediction if latest_reading else "Belum ada data",
             "timestamp": latest_reading.timestamp.isoformat() + "Z" if latest_reading else None
         })
-
-    monitoring_list = user.monitoring.all()
-    for relationship in monitoring_list:
-        patient = relationship.patient
-        patient_devices = patient.devices
-        for device in patient_devices:
-            latest_reading = ECGReading.query.filter_by(device_id=device.id).order_by(ECGReading.timestamp.desc()).first()
-            
-            response_data.append({
-                "type": "correlative",
-                "user_id": patient.id,
-                "user_email": patient.email,
-                "device_name": device.device_name,
-                "heartRate": latest_reading.heart_rate if latest_reading else 0,
-                "prediction": latest_reading.prediction if latest_reading else "Belum ada data",
-                "timestamp": latest_reading.timestamp.isoformat() + "Z" if latest_reading else None
-            })
             
     return jsonify({"data": response_data})
 
+@app.route('/api/v1/live', methods=['GET'])
+@jwt_required()
+def live_feed():
+    """
+    Server-Sent Events: tiap reading baru dari diri sendiri / pasien yang dipantau
+    langsung dikirim sebagai event 'reading' (pengganti polling /dashboard).
+    Opsional ?userId= buat dengerin satu pasien aja.
+    """
+    current_user_id = get_jwt_identity()
+    allowed = {current_user_id} | set(get_auth_context(current_user_id).monitored_patient_ids)
+
+    user_id_filter = request.args.get('userId')
+    if user_id_filter:
+        if user_id_filter not in allowed:
+            return jsonify({"error": "Anda tidak punya izin untuk memantau user ini"}), 403
+        allowed = {user_id_filter}
+
+    slot = live_stream_slots.acquire()
+    if slot is None:
+        return jsonify({"error": "Terlalu banyak koneksi live, coba lagi nanti."}), 503
+
+    try:
+        subscription = live_broker.subscribe(allowed)
+    except Exception as e:
+        live_stream_slots.release(slot)
+        app.logger.error(f"❌ Live feed: gagal subscribe buat user {current_user_id}: {e}", exc_info=True)
+        return jsonify({"error": "Live feed sedang tidak tersedia."}), 503
+    app.logger.info(f"User {current_user_id} mulai live feed ({len(allowed)} topic).")
+
+    def stream():
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + LIVE_FEED_MAX_DURATION_S
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=LIVE_FEED_KEEPALIVE_S)
+            if event is None:
+                yield ": keepalive\n\n" # Biar proxy gak nutup koneksi yang diem
+                continue
+            yield f"event: reading\ndata: {json.dumps(event)}\n\n"
+
+    def cleanup():
+        subscription.close()
+        live_stream_slots.release(slot)
+
+    # Generator-nya gak butuh DB / app context: session dilepas sekarang biar gak ada transaksi baca
+    # yang kebuka selama stream (nahan checkpoint WAL SQLite / idle in transaction di Postgres)
+    db.session.remove()
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Jalan pas response ditutup, termasuk kalo client putus sebelum/ditengah stream
+    response.call_on_close(cleanup)
+    return response
+
 @app.route('/api/v1/history', methods=['GET'])
 @jwt_required()
 def get_history():
@@ -679,14 +1689,7 @@ def get_history():
     user_to_check = User.query.get(user_id_to_check)
     if not user_to_check: return jsonify({"error": "User yang diminta tidak ditemukan"}), 404
 
-    can_view = False
-    if current_user_id == user_id_to_check:
-        can_view = True
-    else: 
-        relationship = MonitoringRelationship.query.filter_by(monitor_id=current_user_id, patient_id=user_id_to_check).first()
-        if relationship: can_view = True
-            
-    if not can_view:
+    if not can_view_user(current_user_id, user_id_to_check):
         return jsonify({"error": "Anda tidak punya izin untuk melihat data histori ini"}), 403
 
     query = db.session.query(ECGReading).filter(ECGReading.user_id == user_id_to_check)
@@ -705,24 +1708,58 @@ def get_history():
         query = query.filter(ECGReading.prediction == filter_class)
         
     sort_order = request.args.get('sort', 'desc')
+    # id jadi tie-breaker biar urutan stabil walau timestamp kembar
     if sort_order == 'asc':
-        query = query.order_by(ECGReading.timestamp.asc())
+        ordered = query.order_by(ECGReading.timestamp.asc(), ECGReading.id.asc())
     else:
-        query = query.order_by(ECGReading.timestamp.desc())
+        ordered = query.order_by(ECGReading.timestamp.desc(), ECGReading.id.desc())
 
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    readings = pagination.items
-    
-    return jsonify({
-        "data": [
-            {"id": r.id, "timestamp": r.timestamp.isoformat() + "Z", "classification": r.prediction, "heartRate": r.heart_rate} 
+    def serialize(readings):
+        return [
+            {"id": r.id, "timestamp": r.timestamp.isoformat() + "Z", "classification": r.prediction, "heartRate": r.heart_rate}
             for r in readings
-        ],
-        "pagination": {"currentPage": pagination.page, "totalPages": pagination.pages, "totalItems": pagination.total}
-    })
+        ]
+
+    # Mode lama (?page=N) tetep ada buat client yang masih pake nomor halaman.
+    # Ini yang jalanin COUNT(*) + OFFSET tiap halaman, jadi makin dalem makin lambat
+    if 'page' in request.args and 'cursor' not in request.args:
+        page = request.args.get('page', 1, type=int)
+        pagination = ordered.paginate(page=page, per_page=HISTORY_PAGE_SIZE, error_out=False)
+        return jsonify({
+            "data": serialize(pagination.items),
+            "pagination": {"currentPage": pagination.page, "totalPages": pagination.pages, "totalItems": pagination.total}
+        })
+
+    # Mode cursor (keyset): lanjut dari (timestamp, id) terakhir halaman sebelumnya,
+    # langsung lewat index (user_id, timestamp) tanpa OFFSET & tanpa COUNT
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    page_query = ordered
+    if cursor:
+        try:
+            cursor_ts, cursor_id = decode_history_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if sort_order == 'asc':
+            page_query = page_query.filter(db.tuple_(ECGReading.timestamp, ECGReading.id) > (cursor_ts, cursor_id))
+        else:
+            page_query = page_query.filter(db.tuple_(ECGReading.timestamp, ECGReading.id) < (cursor_ts, cursor_id))
+
+    # Ambil 1 lebih buat tau masih ada halaman berikutnya atau nggak
+    readings = page_query.limit(limit + 1).all()
+    has_more = len(readings) > limit
+    readings = readings[:limit]
+
+    pagination = {
+        "limit": limit,
+        "hasMore": has_more,
+        "nextCursor": encode_history_cursor(readings[-1]) if has_more else None
+    }
+    # Total cuma dihitung kalo diminta (COUNT(*) mahal buat pasien yang datanya udah berbulan-bulan)
+    if request.args.get('includeTotal', 'false').lower() in ('1', 'true', 'yes'):
+        pagination["totalItems"] = query.order_by(None).count()
+
+    return jsonify({"data": serialize(readings), "pagination": pagination})
 
 @app.route('/api/v1/reading/<int:reading_id>', methods=['GET'])
 @jwt_required()
@@ -749,20 +1786,11 @@ def get_reading_detail(reading_id):
              
         patient_id = device.user_id
         
-        # 1. Cek apakah user adalah si pasien sendiri
-        if current_user_id == patient_id:
-            pass # Boleh liat
-        else:
-            # 2. Cek apakah user adalah kerabat yang memantau
-            relationship = MonitoringRelationship.query.filter_by(
-                monitor_id=current_user_id, 
-                patient_id=patient_id
-            ).first()
-            
-            if not relationship:
-                # Kalo bukan pasien & bukan kerabat, usir!
-                app.logger.warning(f"User {current_user_id} mencoba akses {reading_id} milik {patient_id} secara ilegal.")
-                return jsonify({"error": "Anda tidak punya izin untuk melihat data ini"}), 403
+        # Boleh liat kalo user adalah si pasien sendiri, atau kerabat yang memantau (cek di auth_cache)
+        if not can_view_user(current_user_id, patient_id):
+            # Kalo bukan pasien & bukan kerabat, usir!
+            app.logger.warning(f"User {current_user_id} mencoba akses {reading_id} milik {patient_id} secara ilegal.")
+            return jsonify({"error": "Anda tidak punya izin untuk melihat data ini"}), 403
 
     except Exception as e:
         app.logger.error(f"Error saat cek otorisasi reading: {e}", exc_info=True)
@@ -775,7 +1803,85 @@ def get_reading_detail(reading_id):
         "timestamp": reading.timestamp.isoformat() + "Z",
         "classification": reading.prediction,
         "heartRate": reading.heart_rate,
-        "ecg_data": reading.processed_ecg_data # <-- INI DIA DATANYA
+        "ecg_data": reading_waveform(reading).tolist() # <-- INI DIA DATANYA
+    })
+
+@app.route('/api/v1/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    """
+    Tren per jam/hari dari ReadingRollup (gak nyentuh ECGReading).
+    Query: userId ATAU deviceId (default: diri sendiri), bucket=hour|day, start & end (ISO, opsional).
+    """
+    current_user_id = get_jwt_identity()
+
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ROLLUP_BUCKETS:
+        return jsonify({"error": f"Parameter 'bucket' harus salah satu dari: {', '.join(ROLLUP_BUCKETS)}"}), 400
+
+    device_id_str = request.args.get('deviceId')
+    if device_id_str:
+        device = get_device_record(device_id_str)
+        if not device: return jsonify({"error": f"Device ID '{device_id_str}' tidak ditemukan"}), 404
+        if not can_view_user(current_user_id, device.user_id):
+            return jsonify({"error": "Anda tidak punya izin untuk melihat statistik device ini"}), 403
+        scope, scope_id = 'device', device.id
+    else:
+        scope_id = request.args.get('userId', current_user_id)
+        if not can_view_user(current_user_id, scope_id):
+            return jsonify({"error": "Anda tidak punya izin untuk melihat statistik ini"}), 403
+        scope = 'user'
+
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - ROLLUP_DEFAULT_RANGE[bucket]
+    except ValueError:
+        return jsonify({"error": "Format 'start'/'end' harus ISO 8601"}), 400
+    # Timestamp reading disimpen naive (jam lokal device), jadi offset zona waktu dibuang
+    start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    if start >= end:
+        return jsonify({"error": "'start' harus sebelum 'end'"}), 400
+    if (end - start) / ROLLUP_BUCKETS[bucket] > ROLLUP_MAX_BUCKETS:
+        return jsonify({"error": f"Range terlalu panjang (maksimal {ROLLUP_MAX_BUCKETS} bucket {bucket})"}), 400
+
+    rollups = (ReadingRollup.query
+               .filter(ReadingRollup.scope == scope, ReadingRollup.scope_id == scope_id,
+                       ReadingRollup.bucket == bucket,
+                       ReadingRollup.bucket_start >= bucket_floor(start, bucket), ReadingRollup.bucket_start < end)
+               .order_by(ReadingRollup.bucket_start)
+               .all())
+
+    def summarize(reading_count, hr_count, hr_sum, hr_min, hr_max, pvc_count, afib_count):
+        return {
+            "count": reading_count,
+            "heartRate": {
+                "min": hr_min,
+                "mean": round(hr_sum / hr_count, 2) if hr_count else None,
+                "max": hr_max
+            },
+            "pvcCount": pvc_count,
+            "afibCount": afib_count,
+            # Beban AFib = porsi reading yang kedeteksi AFib di bucket ini
+            "afibBurden": round(afib_count / reading_count, 4) if reading_count else 0.0
+        }
+
+    hr_mins = [r.hr_min for r in rollups if r.hr_min is not None]
+    hr_maxs = [r.hr_max for r in rollups if r.hr_max is not None]
+    return jsonify({
+        "scope": scope,
+        "bucket": bucket,
+        "start": start.isoformat() + "Z",
+        "end": end.isoformat() + "Z",
+        "summary": summarize(
+            sum(r.reading_count for r in rollups), sum(r.hr_count for r in rollups), sum(r.hr_sum for r in rollups),
+            min(hr_mins) if hr_mins else None, max(hr_maxs) if hr_maxs else None,
+            sum(r.pvc_count for r in rollups), sum(r.afib_count for r in rollups)
+        ),
+        "data": [
+            {"start": r.bucket_start.isoformat() + "Z",
+             **summarize(r.reading_count, r.hr_count, r.hr_sum, r.hr_min, r.hr_max, r.pvc_count, r.afib_count)}
+            for r in rollups
+        ]
     })
 
 @app.route('/api/v1/correlatives/add', methods=['POST'])
@@ -806,6 +1912,7 @@ def add_correlative():
     new_relationship = MonitoringRelationship(monitor_id=current_user_id, patient_id=patient.id)
     db.session.add(new_relationship)
     db.session.commit()
+    invalidate_auth_cache()
     app.logger.info(f"Hubungan baru dibuat: User {current_user_id} memantau User {patient.id}")
     return jsonify({"status": "success", "message": f"Kerabat '{patient.name}' berhasil ditambahkan."}), 201
 
@@ -829,6 +1936,7 @@ def remove_correlative():
         action_type = "berhenti memantau"
 
     elif 'monitor_id' in data:    
+        monitor_id_to_remove = data['monitor_id']
         relationship_to_remove = MonitoringRelationship.query.filter_by(
             monitor_id=monitor_id_to_remove, 
             patient_id=current_user_id
@@ -841,6 +1949,7 @@ def remove_correlative():
     if relationship_to_remove:
         db.session.delete(relationship_to_remove)
         db.session.commit()
+        invalidate_auth_cache()
         app.logger.info(f"User {current_user_id} berhasil {action_type} user lain.")
         return jsonify({"status": "success", "message": "Hubungan kerabat berhasil dihapus."}), 200
     else:
@@ -849,13 +1958,173 @@ def remove_correlative():
 @app.cli.command("init-db")
 def init_db_command():
     with app.app_context():
-        _db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-        _db_dir = os.path.dirname(_db_path)
-        if not os.path.exists(_db_dir):
+        _db_path = sqlite_path(app.config['SQLALCHEMY_DATABASE_URI'])
+        _db_dir = os.path.dirname(_db_path) if _db_path else None
+        if _db_dir and not os.path.exists(_db_dir):
             os.makedirs(_db_dir)
         db.create_all()
     print(f"Database berhasil diinisialisasi di {app.config['SQLALCHEMY_DATABASE_URI']}")
 
+@app.cli.command("migrate-waveforms")
+@click.option("--batch-size", default=500, show_default=True, help="Jumlah baris per commit")
+@click.option("--target", type=click.Choice(['blob', 'segment']), default=None, help="Default: WAVEFORM_STORAGE")
+def migrate_waveforms_command(batch_size, target):
+    """ Konversi waveform baris lama ke ecg_blob biner / file segmen, per batch """
+    target = target or WAVEFORM_STORAGE
+    if target == 'segment':
+        pending = db.and_(ECGReading.waveform_segment.is_(None),
+                          db.or_(ECGReading.ecg_blob.isnot(None), ECGReading.processed_ecg_data.isnot(None)))
+    else:
+        pending = db.and_(ECGReading.waveform_segment.is_(None), ECGReading.ecg_blob.is_(None),
+                          ECGReading.processed_ecg_data.isnot(None))
+    total = 0
+    last_id = 0
+    while True:
+        rows = (ECGReading.query
+                .filter(ECGReading.id > last_id, pending)
+                .order_by(ECGReading.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        for row in rows:
+            signal = reading_waveform(row)
+            if target == 'segment':
+                row.waveform_segment, row.waveform_offset, row.waveform_length = waveform_store.append(row.device_id, signal)
+                row.ecg_blob = None
+            else:
+                row.ecg_blob = encode_waveform(signal, WAVEFORM_CODEC)
+            row.processed_ecg_data = None
+        last_id = rows[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+        total += len(rows)
+        print(f"  -> {total} baris dikonversi (sampai ID {last_id})")
+    print(f"Selesai: {total} baris dikonversi ke {target}. Jalankan VACUUM biar file DB menyusut.")
+
+@app.cli.command("waveform-gc")
+@click.option("--compact", is_flag=True, help="Tulis ulang segmen lama yang ada orphan-nya & hapus yang udah gak dirujuk")
+@click.option("--min-age-hours", default=24.0, show_default=True, help="Cuma segmen yang gak ditulisin selama ini")
+@click.option("--min-orphan-ratio", default=0.1, show_default=True, help="Compact kalo porsi orphan >= ini")
+def waveform_gc_command(compact, min_age_hours, min_orphan_ratio):
+    """
+    Laporan byte waveform di file segmen yang gak dirujuk ECGReading mana pun (sisa transaksi yang
+    rollback / reading yang dihapus), opsional compact segmen yang udah gak aktif.
+    """
+    references = defaultdict(list) # segment -> [(reading_id, offset, length)]
+    rows = (db.session.query(ECGReading.id, ECGReading.waveform_segment, ECGReading.waveform_offset, ECGReading.waveform_length)
+            .filter(ECGReading.waveform_segment.isnot(None))
+            .yield_per(5000))
+    for reading_id, segment, offset, length in rows:
+        references[segment].append((reading_id, offset, length))
+
+    if compact and os.path.isdir(WRITE_BEHIND_SPILL_DIR) and any(name.endswith('.jsonl') for name in os.listdir(WRITE_BEHIND_SPILL_DIR)):
+        # Row di file spill udah punya pointer ke segmen tapi belum masuk DB, jangan sampe ke-compact
+        print(f"Masih ada row write-behind di {WRITE_BEHIND_SPILL_DIR} yang belum di-replay, compact dibatalin.")
+        compact = False
+
+    total_bytes = orphan_bytes = reclaimed = 0
+    now = time.time()
+    for segment, size, mtime, active in waveform_store.segments():
+        refs = references.get(segment, [])
+        gaps = unreferenced_ranges(size, [(offset, length) for _, offset, length in refs])
+        orphaned = sum(end - start for start, end in gaps)
+        total_bytes += size
+        orphan_bytes += orphaned
+        if orphaned:
+            print(f"  {segment}: {orphaned / 1024:.1f} / {size / 1024:.1f} KB orphan di {len(gaps)} range"
+                  f"{' (aktif)' if active else ''}")
+
+        old_enough = now - mtime >= min_age_hours * 3600
+        if not compact or active or not old_enough or not size or orphaned / size < min_orphan_ratio:
+            continue
+        new_segment, new_offsets = waveform_store.compact(segment, [(offset, length) for _, offset, length in refs])
+        if new_segment is not None:
+            try:
+                db.session.execute(db.update(ECGReading), [
+                    {"id": reading_id, "waveform_segment": new_segment, "waveform_offset": new_offsets[offset]}
+                    for reading_id, offset, _ in refs
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                waveform_store.remove(new_segment)
+                raise
+        waveform_store.remove(segment)
+        reclaimed += orphaned
+        print(f"  -> {segment} di-compact{f' jadi {new_segment}' if new_segment else ' (dihapus, gak ada yang dirujuk)'}")
+
+    print(f"Total {total_bytes / 1048576:.1f} MB di segmen, {orphan_bytes / 1048576:.2f} MB orphan"
+          f"{f', {reclaimed / 1048576:.2f} MB dibalikin' if compact else ''}.")
+
+@app.cli.command("rebuild-rollups")
+@click.option("--batch-size", default=2000, show_default=True, help="Jumlah reading per commit")
+def rebuild_rollups_command(batch_size):
+    """ Hitung ulang ReadingRollup dari semua ECGReading (sekali jalan setelah migrasi / kalo curiga drift) """
+    ReadingRollup.query.delete()
+    db.session.commit()
+    columns = (ECGReading.id, ECGReading.timestamp, ECGReading.prediction, ECGReading.heart_rate,
+               ECGReading.device_id, ECGReading.user_id)
+    total = 0
+    last_id = 0
+    while True:
+        rows = (db.session.query(*columns)
+                .filter(ECGReading.id > last_id)
+                .order_by(ECGReading.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        update_rollups([row._asdict() for row in rows])
+        last_id = rows[-1].id
+        db.session.commit()
+        total += len(rows)
+        print(f"  -> {total} reading masuk rollup (sampai ID {last_id})")
+    print(f"Selesai: rollup dibangun ulang dari {total} reading.")
+
+def load_reading_windows(limit, holdout):
+    """ Window tersimpan (sinyal udah ternormalisasi) terbaru: holdout=True -> data uji, False -> data kalibrasi """
+    is_holdout = (ECGReading.id % HOLDOUT_EVERY) == 0
+    readings = (ECGReading.query
+                .filter(is_holdout if holdout else ~is_holdout)
+                .order_by(ECGReading.id.desc())
+                .limit(limit)
+                .all())
+    windows = [reading_waveform(reading) for reading in readings]
+    return [window for window in windows if window.size == 1024]
+
+@app.cli.command("quantize-model")
+@click.option("--source", required=True, help="Model hasil training (.keras / .h5 / folder SavedModel)")
+@click.option("--variants", default="float16,int8", show_default=True, help="Varian yang dibikin, dipisah koma")
+@click.option("--calibration", default=500, show_default=True, help="Jumlah window tersimpan buat kalibrasi int8")
+def quantize_model_command(source, variants, calibration):
+    """ Bikin varian model beat quantized (*_fp16 / *_int8.tflite) di sebelah MODEL_PATH """
+    variants = [v.strip() for v in variants.split(',') if v.strip()]
+    windows = load_reading_windows(calibration, holdout=False) if 'int8' in variants else []
+    print(f"Quantize {source} -> {', '.join(variants)} (kalibrasi int8: {len(windows)} window non-holdout)")
+    quantize_model(source, MODEL_PATH, variants, windows)
+    print("Selesai. Bandingin dulu: flask --app app compare-models")
+
+@app.cli.command("compare-models")
+@click.option("--limit", default=1000, show_default=True, help="Jumlah window holdout (reading dengan id kelipatan 10)")
+@click.option("--variants", default=",".join(MODEL_VARIANT_SUFFIXES), show_default=True, help="Varian yang dibandingin (yang file-nya ada)")
+@click.option("--xnnpack", type=click.Choice(['on', 'off', 'both']), default='both', show_default=True)
+@click.option("--threads", default=MODEL_NUM_THREADS or 1, show_default=True, help="Thread intra-op per interpreter")
+def compare_models_command(limit, variants, xnnpack, threads):
+    """ Banding varian model beat: kesepakatan label, drift probabilitas & latency p50/p99 di window holdout """
+    wanted = [v.strip() for v in variants.split(',') if v.strip()]
+    paths = {variant: path for variant, path in available_variants(MODEL_PATH).items() if variant in wanted}
+    if not paths:
+        print(f"Tidak ada file model buat varian {', '.join(wanted)} di sebelah {MODEL_PATH}")
+        return
+    windows = load_reading_windows(limit, holdout=True)
+    if not windows:
+        print("Belum ada window holdout tersimpan (ECGReading kosong?)")
+        return
+    xnnpack_options = {'on': (True,), 'off': (False,), 'both': (True, False)}[xnnpack]
+    rows = compare_variants(paths, windows, BEAT_LABELS, num_threads=threads, xnnpack_options=xnnpack_options, runtime=TFLITE_RUNTIME)
+    print(format_report(rows, len(windows)))
+
 with app.app_context():
     load_all_models()
 
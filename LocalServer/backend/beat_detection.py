@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import butter, sosfilt, find_peaks
+
+# Parameter Pan-Tompkins (versi vektor, tanpa threshold adaptif sekuensial)
+QRS_BAND_HZ = (5.0, 15.0)      # band energi QRS
+INTEGRATION_WINDOW_S = 0.150   # moving window integration
+REFRACTORY_S = 0.200           # jarak minimum antar beat (max ~300 BPM)
+SEARCHBACK_S = 0.075           # radius cari puncak R asli di sinyal (bukan di sinyal integrasi)
+THRESHOLD_RATIO = 0.3          # relatif ke puncak integrasi referensi
+MIN_R_HEIGHT = 0.0             # puncak R (sinyal ternormalisasi) minimal di atas mean
+
+
+@lru_cache(maxsize=8)
+def _qrs_bandpass(sampling_rate):
+    return butter(2, QRS_BAND_HZ, btype='bandpass', fs=sampling_rate, output='sos')
+
+
+def detect_r_peaks(signal_1d_normalized, sampling_rate=360):
+    """
+    Deteksi puncak R SEKALI per window, hasilnya dipake bareng sama HR, fitur HRV & rhythm classifier.
+    Alur: bandpass 5-15 Hz -> turunan -> kuadrat -> moving window integration -> puncak
+    (dengan refractory) -> geser ke maksimum sinyal asli di sekitar puncak.
+    Return dict: 'peaks' (index sampel), 'rr_samples', 'rr_seconds'.
+    """
+    x = np.asarray(signal_1d_normalized, dtype=np.float64).ravel()
+    n = x.size
+    empty = {"peaks": np.zeros(0, dtype=np.int64), "rr_samples": np.zeros(0), "rr_seconds": np.zeros(0)}
+
+    integration_len = max(1, int(round(INTEGRATION_WINDOW_S * sampling_rate)))
+    sos = _qrs_bandpass(sampling_rate)
+    if n < 2 * integration_len:
+        return empty
+
+    # Cukup filter satu arah (sosfilt ~5x lebih murah dari sosfiltfilt); delay fasenya
+    # cuma beberapa sampel & ketutup sama pencarian ulang puncak R di sinyal asli
+    filtered = sosfilt(sos, x)
+    derivative = np.gradient(filtered)
+    squared = derivative * derivative
+    integrated = np.convolve(squared, np.ones(integration_len) / integration_len, mode='same')
+
+    refractory = max(1, int(round(REFRACTORY_S * sampling_rate)))
+    candidates, props = find_peaks(integrated, distance=refractory, height=0)
+    if candidates.size == 0:
+        return empty
+
+    # Referensi = puncak terbesar ke-2, biar satu PVC gede gak "nenggelemin" beat normal
+    heights = np.sort(props['peak_heights'])
+    reference = heights[-2] if heights.size >= 2 else heights[-1]
+    candidates = candidates[props['peak_heights'] >= THRESHOLD_RATIO * reference]
+
+    # Geser tiap kandidat ke maksimum sinyal asli di radius SEARCHBACK (vektor, tanpa loop)
+    radius = max(1, int(round(SEARCHBACK_S * sampling_rate)))
+    offsets = np.arange(-radius, radius + 1)
+    window_idx = np.clip(candidates[:, None] + offsets[None, :], 0, n - 1)
+    peaks = window_idx[np.arange(candidates.size), np.argmax(x[window_idx], axis=1)]
+    peaks = peaks[x[peaks] > MIN_R_HEIGHT]
+
+    # Dua kandidat bisa jatuh ke puncak yang sama setelah digeser
+    peaks = np.unique(peaks)
+    if peaks.size > 1:
+        keep = np.concatenate(([True], np.diff(peaks) >= refractory))
+        peaks = peaks[keep]
+
+    rr_samples = np.diff(peaks).astype(np.float64)
+    return {"peaks": peaks, "rr_samples": rr_samples, "rr_seconds": rr_samples / sampling_rate}
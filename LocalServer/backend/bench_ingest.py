@@ -0,0 +1,309 @@
+"""
+Load generator + benchmark latency end-to-end buat /api/v1/analyze-ecg, full offline.
+Server dijalanin sendiri (gunicorn kayak di Dockerfile, atau werkzeug kalo gunicorn gak ada)
+di atas DB SQLite sementara, N device sintetis didaftarin lewat /api/v1/register-device,
+terus window 1024 sampel di-replay dengan rate yang naik bertahap sampe latency-nya jebol.
+
+    python bench_ingest.py                                   # default: 20 device, rate 2,4,8,16 req/s
+    python bench_ingest.py --devices 50 --rates 5,10,20,40 --duration 30 --concurrency 32
+    python bench_ingest.py --server werkzeug --json hasil.json
+
+Latency diukur dari waktu kirim yang DIJADWALKAN (open-loop), jadi antrian di sisi client
+(server udah gak kekejar) ikut keitung, gak ketutupan (coordinated omission).
+Satu device ngirim satu window tiap 1024/360 = 2.84 detik, jadi rate maksimum yang masih sehat
+x 2.84 = perkiraan jumlah device yang bisa dilayani satu box.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bench_pipeline import synthetic_ecg, SAMPLING_RATE, WINDOW
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+WINDOW_SECONDS = WINDOW / SAMPLING_RATE
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request_json(port, method, path, body=None, timeout=60):
+    """ Satu request (koneksi baru, kayak device) -> (status, json/None) """
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        conn.request(method, path, body=payload, headers={'Content-Type': 'application/json'} if payload else {})
+        response = conn.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+    finally:
+        conn.close()
+
+
+class ServerProcess:
+    """ App dijalanin di proses terpisah biar load generator gak rebutan GIL sama server """
+
+    def __init__(self, kind, port, workers, threads, env, log_path):
+        self.kind = kind
+        self.port = port
+        self.log = open(log_path, 'w')
+        if kind == 'gunicorn':
+            cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--worker-class', 'gthread',
+                   '--threads', str(threads), '--bind', f'127.0.0.1:{port}', '--timeout', '120', '--preload', 'app:app']
+        else:
+            cmd = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+        self.proc = subprocess.Popen(cmd, cwd=BASEDIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=180):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Server mati pas startup (exit {self.proc.returncode}), cek log: {self.log.name}")
+            try:
+                status, body = request_json(self.port, 'GET', '/api/v1/ready', timeout=5)
+                if status == 200:
+                    return body
+            except OSError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"Server gak ready dalam {timeout} detik, cek log: {self.log.name}")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+
+class SyntheticDevice:
+    """ Satu device: sinyal ECG sintetis sendiri (HR beda-beda) + timestamp yang maju per window """
+
+    def __init__(self, device_id, seed, start_time):
+        rng = np.random.default_rng(seed)
+        self.device_id = device_id
+        self.signal = synthetic_ecg(seconds=60, mean_rr=rng.uniform(0.6, 1.0), seed=seed)
+        self.offset = 0
+        self.timestamp = start_time
+        self.lock = threading.Lock()
+
+    def next_payload(self):
+        with self.lock:
+            if self.offset + WINDOW > self.signal.size:
+                self.offset = 0
+            window = self.signal[self.offset:self.offset + WINDOW]
+            self.offset += WINDOW
+            self.timestamp += timedelta(seconds=WINDOW_SECONDS)
+            timestamp = self.timestamp
+        return {
+            "device_id": self.device_id,
+            "ecg_beat_data": np.round(window).astype(int).tolist(),
+            "timestamp": timestamp.strftime('%Y-%m-%dT%H:%M:%S+07:00'),
+        }
+
+
+def run_step(port, devices, rate, duration, concurrency):
+    """
+    Kirim rate x duration request dengan jadwal tetap (open-loop), paling banyak `concurrency`
+    yang jalan barengan. Return dict statistik step ini.
+    """
+    total = max(1, int(round(rate * duration)))
+    jobs = queue.Queue()
+    results = []
+    results_lock = threading.Lock()
+    start = time.perf_counter() + 0.2
+
+    def worker():
+        while True:
+            item = jobs.get()
+            if item is None:
+                return
+            i, scheduled = item
+            wait = scheduled - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            payload = devices[i % len(devices)].next_payload()
+            try:
+                status, _ = request_json(port, 'POST', '/api/v1/analyze-ecg', payload)
+            except OSError as e:
+                status = type(e).__name__
+            finished = time.perf_counter()
+            with results_lock:
+                results.append((status, finished - scheduled, finished))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for i in range(total):
+        jobs.put((i, start + i / rate))
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+    latencies = np.array([latency for status, latency, _ in results if status == 200]) * 1000
+    errors = {}
+    for status, _, _ in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    elapsed = max(finished for _, _, finished in results) - start
+    ok = len(latencies)
+    return {
+        "offeredRate": rate,
+        "requests": total,
+        "ok": ok,
+        "throughput": ok / elapsed if elapsed > 0 else 0.0,
+        "errorRate": (total - ok) / total,
+        "errors": errors,
+        "p50Ms": float(np.percentile(latencies, 50)) if ok else None,
+        "p95Ms": float(np.percentile(latencies, 95)) if ok else None,
+        "p99Ms": float(np.percentile(latencies, 99)) if ok else None,
+        "maxMs": float(latencies.max()) if ok else None,
+    }
+
+
+def is_healthy(step, slo_ms, max_error_rate):
+    """ Step dianggap sehat kalo p99 di bawah SLO, error kecil, & server masih ngejar rate yang diminta """
+    return (step["p99Ms"] is not None and step["p99Ms"] <= slo_ms
+            and step["errorRate"] <= max_error_rate
+            and step["throughput"] >= 0.9 * step["offeredRate"])
+
+
+def format_report(steps, slo_ms, max_error_rate, server_info):
+    lines = [
+        f"Server: {server_info}",
+        f"{'rate':>7} {'req':>6} {'ok/s':>8} {'error':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  status",
+    ]
+    fmt = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+    last_healthy = None
+    for step in steps:
+        healthy = is_healthy(step, slo_ms, max_error_rate)
+        if healthy and (last_healthy is None or step["offeredRate"] > last_healthy["offeredRate"]):
+            last_healthy = step
+        errors = ", ".join(f"{k}x{v}" for k, v in step["errors"].items())
+        lines.append(
+            f"{step['offeredRate']:>7.1f} {step['requests']:>6} {step['throughput']:>8.2f} {step['errorRate'] * 100:>6.1f}% "
+            f"{fmt(step['p50Ms'])} {fmt(step['p95Ms'])} {fmt(step['p99Ms'])} {fmt(step['maxMs'])}  "
+            f"{'OK' if healthy else 'JEBOL'}{f' ({errors})' if errors else ''}"
+        )
+    broken = next((s for s in steps if not is_healthy(s, slo_ms, max_error_rate)), None)
+    lines.append(f"Kriteria sehat: p99 <= {slo_ms:.0f} ms, error <= {max_error_rate * 100:.1f}%, throughput >= 90% rate")
+    if last_healthy:
+        lines.append(f"Rate sehat tertinggi: {last_healthy['offeredRate']:.1f} req/s "
+                     f"(~{last_healthy['offeredRate'] * WINDOW_SECONDS:.0f} device kirim 1 window tiap {WINDOW_SECONDS:.2f} s)")
+    if broken:
+        lines.append(f"Latency/error mulai jebol di: {broken['offeredRate']:.1f} req/s")
+    else:
+        lines.append("Belum jebol di rate tertinggi yang dicoba, naikin --rates")
+    return "\n".join(lines)
+
+
+def serve(port):
+    """ Mode --serve (internal): app di werkzeug threaded, buat kalo gunicorn gak terinstall """
+    from werkzeug.serving import make_server
+    sys.path.insert(0, BASEDIR)
+    import app as server
+    make_server('127.0.0.1', port, server.app, threaded=True).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator & benchmark latency /api/v1/analyze-ecg (offline)")
+    parser.add_argument('--devices', type=int, default=20, help="Jumlah device sintetis yang didaftarin")
+    parser.add_argument('--rates', default="2,4,8,16", help="Rate (request/detik) per step, dipisah koma")
+    parser.add_argument('--duration', type=float, default=20, help="Durasi tiap step (detik)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Maksimum request yang jalan barengan")
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'werkzeug'], default='auto')
+    parser.add_argument('--workers', type=int, default=3, help="Worker gunicorn (sama kayak Dockerfile)")
+    parser.add_argument('--threads', type=int, default=4, help="Thread per worker gunicorn")
+    parser.add_argument('--slo-ms', type=float, default=1000, help="Batas p99 yang masih dianggap sehat")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--stop-on-break', action='store_true', help="Berhenti di step pertama yang jebol")
+    parser.add_argument('--json', help="Simpen hasil mentah ke file JSON")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    kind = args.server
+    if kind == 'auto':
+        try:
+            import gunicorn # noqa: F401
+            kind = 'gunicorn'
+        except ImportError:
+            kind = 'werkzeug'
+
+    workdir = tempfile.mkdtemp(prefix='ecg-bench-')
+    # SEMUA state server (DB, file generasi cache, buffer stream / RR, spill, socket, metrik, log) ditaro
+    # di workdir: bench ini harus aman dijalanin di box yang server produksinya lagi jalan
+    env = dict(os.environ,
+               DATABASE_BACKEND='sqlite',
+               DATABASE_PATH=os.path.join(workdir, 'bench.db'),
+               CACHE_GENERATION_DIR=workdir,
+               WAVEFORM_STORE_DIR=os.path.join(workdir, 'waveforms'),
+               LIVE_FEED_SOCKET_DIR=os.path.join(workdir, 'live'),
+               STREAM_STATE_DIR=os.path.join(workdir, 'stream_state'),
+               RR_BUFFER_STATE_DIR=os.path.join(workdir, 'rr_state'),
+               WRITE_BEHIND_SPILL_DIR=os.path.join(workdir, 'write_behind_spill'),
+               INFERENCE_SOCKET=os.path.join(workdir, 'inference.sock'),
+               # gunicorn.conf.py ngehapus *.db di folder ini pas start, jangan sampe kena punya server produksi
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+               LOG_DIR=os.path.join(workdir, 'logs'))
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=BASEDIR, env=env,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    port = free_port()
+    server = ServerProcess(kind, port, args.workers, args.threads, env, os.path.join(workdir, 'server.log'))
+    try:
+        ready = server.wait_ready()
+        startup = ready.get("startup", {})
+        server_info = (f"{kind}" + (f" {args.workers} worker x {args.threads} thread" if kind == 'gunicorn' else " threaded")
+                       + f", runtime {startup.get('runtime')}, DB {env['DATABASE_PATH']}")
+        print(f"Server ready: {server_info}")
+
+        start_time = datetime(2026, 1, 1, 8, 0, 0)
+        devices = []
+        for i in range(args.devices):
+            status, body = request_json(port, 'POST', '/api/v1/register-device', {"mac_address": f"BE:NC:00:00:{i // 256:02X}:{i % 256:02X}"})
+            if status not in (200, 201):
+                raise RuntimeError(f"Register device gagal ({status}): {body}")
+            devices.append(SyntheticDevice(body["device_id"], seed=i, start_time=start_time))
+        print(f"{len(devices)} device terdaftar")
+
+        steps = []
+        for rate in [float(r) for r in args.rates.split(',') if r.strip()]:
+            print(f"  -> {rate:.1f} req/s selama {args.duration:.0f} s ...", flush=True)
+            step = run_step(port, devices, rate, args.duration, args.concurrency)
+            steps.append(step)
+            if args.stop_on_break and not is_healthy(step, args.slo_ms, args.max_error_rate):
+                break
+    finally:
+        server.stop()
+
+    print(format_report(steps, args.slo_ms, args.max_error_rate, server_info))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"server": server_info, "startup": startup, "steps": steps}, f, indent=2)
+    print(f"Log server & DB: {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark biaya per tahap pipeline inferensi satu window (tanpa HTTP & DB):
+quality check, preprocess, TFLite, deteksi beat, fitur HRV (termasuk SampEn), random forest.
+
+    python bench_pipeline.py              # 500 ulangan per tahap
+    python bench_pipeline.py --repeat 2000
+
+Sinyal ECG-nya sintetis (pulsa QRS + RR acak), DB-nya file sementara.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+SAMPLING_RATE = 360
+WINDOW = 1024
+
+
+def synthetic_ecg(seconds, mean_rr=0.8, rr_jitter=0.05, seed=0):
+    """ ECG mainan: pulsa gaussian sempit (QRS) + gelombang T, skala ADC 12-bit kayak dari device """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLING_RATE)
+    t = np.arange(n) / SAMPLING_RATE
+    signal = np.zeros(n)
+    beat_time = 0.3
+    while beat_time < seconds:
+        signal += np.exp(-((t - beat_time) / 0.012) ** 2)
+        signal += 0.25 * np.exp(-((t - beat_time - 0.25) / 0.05) ** 2)
+        beat_time += max(0.3, rng.normal(mean_rr, rr_jitter))
+    signal += 0.02 * rng.standard_normal(n)
+    return 1800 + 600 * signal
+
+
+def timeit(fn, repeat):
+    fn() # Warm-up (cache filter, alokasi tensor, dll)
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    os.environ.setdefault('INFER_BATCH_MAX_SIZE', '1') # Invoke langsung, gak nunggu batcher
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as server
+    server.app.logger.setLevel(logging.WARNING) # Log per-prediksi bikin hasil timing ngaco
+    from signal_quality import assess_signal_quality
+    from beat_detection import detect_r_peaks
+    from sample_entropy import sample_entropy
+
+    raw = synthetic_ecg(seconds=120)
+    window = raw[:WINDOW].tolist()
+    processed = server.preprocess_input(window)
+    signal_1d = processed.ravel()
+    beats = detect_r_peaks(signal_1d, SAMPLING_RATE)
+    features = server.extract_afib_features(beats)
+
+    # RR sepanjang horizon buffer (RR_BUFFER_HORIZON_S) = input SampEn di jalur rr_buffer
+    long_beats = detect_r_peaks((raw - raw.mean()) / raw.std(), SAMPLING_RATE)
+    horizon_rr = long_beats["rr_seconds"][long_beats["rr_seconds"].cumsum() >= long_beats["rr_seconds"].sum() - server.RR_BUFFER_HORIZON_S]
+
+    stages = [
+        ("quality check", lambda: assess_signal_quality(window, SAMPLING_RATE)),
+        ("preprocess", lambda: server.preprocess_input(window)),
+        ("detect_r_peaks", lambda: detect_r_peaks(signal_1d, SAMPLING_RATE)),
+        (f"sample_entropy ({len(beats['rr_seconds'])} RR, 1 window)", lambda: sample_entropy(beats["rr_seconds"])),
+        (f"sample_entropy ({len(horizon_rr)} RR, {server.RR_BUFFER_HORIZON_S:.0f} s buffer)", lambda: sample_entropy(horizon_rr)),
+        ("extract_afib_features (total)", lambda: server.extract_afib_features(beats)),
+    ]
+    if server.rhythm_classifier is not None:
+        batch_features = np.repeat(features, 16, axis=0)
+        stages.append(("classify_rhythm (RF, 1 window)", lambda: server.classify_rhythm(features)))
+        stages.append(("classify_rhythm (RF, batch 16)", lambda: server.classify_rhythm(batch_features)))
+    if server.inference_engine is not None:
+        stages.append(("TFLite predict", lambda: server.inference_engine.predict(processed)))
+
+    print(f"{'tahap':<40} {'median us':>10} {'p95 us':>10} {'max us':>10}")
+    for name, fn in stages:
+        samples = timeit(fn, args.repeat)
+        print(f"{name:<40} {np.median(samples):>10.1f} {np.percentile(samples, 95):>10.1f} {samples.max():>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
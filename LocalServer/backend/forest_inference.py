@@ -0,0 +1,134 @@
+import warnings
+
+import numpy as np
+
+
+class FlatForest:
+    """
+    Random forest sklearn yang di-"compile" pas load: semua node dari semua pohon digabung jadi
+    array numpy kontigu (feature, threshold, kiri, kanan, probabilitas daun). Inferensinya
+    jalan vektor buat (N sampel x T pohon) sekaligus, satu langkah per level kedalaman,
+    dan ngeluarin kelas + probabilitas dalam satu kali jalan (gak ada predict + predict_proba dobel).
+    Hasilnya sama kayak predict_proba sklearn (rata-rata probabilitas daun tiap pohon).
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, max_depth, classes, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = int(feature.max()) + 1 if feature.size else 0
+        self.feature_names_in_ = feature_names
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """ RandomForestClassifier / ExtraTreesClassifier / DecisionTreeClassifier (1 output). ValueError kalo bukan """
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None and hasattr(model, 'tree_'):
+            estimators = [model]
+        if not estimators or not all(hasattr(e, 'tree_') for e in estimators):
+            raise ValueError(f"Model {type(model).__name__} bukan forest/tree sklearn")
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Model multi-output tidak didukung")
+
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            index = np.arange(offset, offset + n)
+            # Daun nunjuk ke dirinya sendiri, jadi semua sampel bisa jalan max_depth langkah tanpa masking
+            lefts.append(np.where(is_leaf, index, tree.children_left + offset))
+            rights.append(np.where(is_leaf, index, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            # value = jumlah sampel (sklearn lama) atau fraksi (sklearn >= 1.4) -> normalisasi per daun
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            probas.append(value / totals)
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            leaf_proba=np.concatenate(probas),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max(e.tree_.max_depth for e in estimators),
+            classes=np.asarray(model.classes_),
+            feature_names=getattr(model, 'feature_names_in_', None),
+        )
+
+    @property
+    def node_count(self):
+        return self.feature.size
+
+    def predict_proba(self, X):
+        """ X: (N, n_fitur) -> (N, n_kelas) """
+        # sklearn ngebandingin fitur dalam float32, jadi dibulatin dulu biar split-nya identik
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.size))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.leaf_proba[nodes].mean(axis=1)
+
+    def predict(self, X):
+        """ Return (label (N,), probabilitas (N, n_kelas)) dalam satu kali jalan """
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+    def max_abs_error(self, model, X):
+        """ Selisih maksimum probabilitas vs predict_proba sklearn asli (buat cek pas load) """
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            expected = model.predict_proba(np.asarray(X, dtype=np.float32))
+        return float(np.abs(self.predict_proba(X) - expected).max())
+
+    def sample_inputs(self, n=256, seed=0):
+        """ Input acak di sekitar threshold tiap fitur (biar cabang kiri-kanan kena semua) """
+        rng = np.random.default_rng(seed)
+        X = np.zeros((n, self.n_features_in_))
+        split = np.isfinite(self.threshold)
+        for f in range(self.n_features_in_):
+            values = self.threshold[split & (self.feature == f)]
+            if values.size:
+                X[:, f] = rng.choice(values, n) + rng.normal(0, 1e-3 + values.std() * 0.05, n)
+        return X
+
+
+class SklearnClassifier:
+    """ Fallback kalo model-nya bukan forest yang bisa di-flatten: predict_proba SEKALI, kelas dari argmax """
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+        self.n_features_in_ = getattr(model, 'n_features_in_', None)
+        self.feature_names_in_ = getattr(model, 'feature_names_in_', None)
+
+    def predict(self, X):
+        with warnings.catch_warnings():
+            # Urutan kolom udah dicek pas load, jadi warning nama fitur (input ndarray) aman diabaikan
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            proba = self.model.predict_proba(np.asarray(X, dtype=np.float32))
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+
+def compile_classifier(model, logger=None):
+    """ FlatForest kalo bisa, kalo nggak SklearnClassifier. Return (classifier, max_abs_error / None) """
+    try:
+        forest = FlatForest.from_sklearn(model)
+    except ValueError as e:
+        if logger:
+            logger.warning(f"⚠️  Classifier tidak di-compile ({e}), pake predict_proba sklearn")
+        return SklearnClassifier(model), None
+    return forest, forest.max_abs_error(model, forest.sample_inputs())
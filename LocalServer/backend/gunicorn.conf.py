@@ -0,0 +1,16 @@
+# Dibaca otomatis sama gunicorn (./gunicorn.conf.py); flag server tetep di CMD Dockerfile.
+# Isinya cuma urusan /metrics mode multiprocess (PROMETHEUS_MULTIPROC_DIR).
+import os
+
+metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if metrics_dir and os.path.isdir(metrics_dir):
+    # File mmap sisa run sebelumnya (container restart) dibuang sebelum app di-preload,
+    # kalo nggak counter lama & gauge pid yang udah gak ada ikut kegabung
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,230 @@
+import os
+import json
+import math
+import time
+import fcntl
+import threading
+from collections import deque, OrderedDict
+
+MIN_HORIZON_S = 30.0
+MAX_HORIZON_S = 120.0
+BEAT_TOLERANCE_S = 0.2   # Beat yang jaraknya < ini dari beat terakhir dianggap beat yang sama (window overlap)
+CONTIGUOUS_TOLERANCE_S = 0.1
+RECOMPUTE_EVERY = 4096   # Sesekali hitung ulang jumlahan dari nol biar error floating point gak numpuk
+
+
+class RollingRRBuffer:
+    """
+    Buffer RR interval per device yang nyambung antar request, dibatesin horizon waktu (30-120 detik).
+    Statistik HRV di-update inkremental pake jumlahan berjalan (sum & sum kuadrat RR dan selisih RR),
+    jadi nambah/buang satu beat O(1). Beat dari window yang overlap gak kehitung dua kali.
+    """
+
+    def __init__(self, horizon_s=60.0):
+        self.horizon_s = min(max(float(horizon_s), MIN_HORIZON_S), MAX_HORIZON_S)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        self._rr = deque()    # (waktu beat akhir, rr detik)
+        self._diff = deque()  # (waktu beat akhir, selisih rr berurutan)
+        self._rr_sum = self._rr_sq = 0.0
+        self._diff_sum = self._diff_sq = 0.0
+        self._last_beat_time = None
+        self._last_rr = None
+        self._updates = 0
+
+    def __len__(self):
+        return len(self._rr)
+
+    def add_window(self, beats, window_end_time, window_length, sampling_rate):
+        """
+        Masukin hasil detect_r_peaks satu window. window_end_time = waktu (detik epoch) sampel terakhir window,
+        dipake buat naro tiap beat di garis waktu absolut.
+        """
+        self.last_used = time.monotonic()
+        peaks = beats["peaks"]
+        if len(peaks) < 2:
+            return
+        beat_times = window_end_time - (window_length - peaks) / sampling_rate
+
+        # Data mundur (upload offline telat) atau bolong lebih dari horizon -> mulai dari kosong
+        if self._last_beat_time is not None and (
+                beat_times[-1] < self._last_beat_time - self.horizon_s or
+                beat_times[0] > self._last_beat_time + self.horizon_s):
+            self.reset()
+
+        for i, rr in enumerate(beats["rr_seconds"]):
+            end_time = float(beat_times[i + 1])
+            if self._last_beat_time is not None and end_time <= self._last_beat_time + BEAT_TOLERANCE_S:
+                continue # Udah masuk dari window sebelumnya
+            start_time = end_time - rr
+            contiguous = self._last_beat_time is not None and abs(start_time - self._last_beat_time) <= CONTIGUOUS_TOLERANCE_S
+            self._push(end_time, float(rr), contiguous)
+
+        self._expire()
+
+    def features(self):
+        """ [mean_rr, sdnn, rmssd, sd1, sd2] dalam ms (urutan & rumus sama kayak extract_afib_features), None kalo kosong """
+        n = len(self._rr)
+        if n == 0:
+            return None
+        mean_rr = self._rr_sum / n
+        sdnn = math.sqrt(max(self._rr_sq / n - mean_rr * mean_rr, 0.0))
+        m = len(self._diff)
+        if m > 0:
+            rmssd = math.sqrt(max(self._diff_sq / m, 0.0))
+            mean_diff = self._diff_sum / m
+            sd1 = math.sqrt(0.5 * max(self._diff_sq / m - mean_diff * mean_diff, 0.0))
+        else:
+            rmssd = sd1 = 0.0
+        sd2 = math.sqrt(max(2 * sdnn * sdnn - sd1 * sd1, 0.0))
+        return [mean_rr * 1000, sdnn * 1000, rmssd * 1000, sd1 * 1000, sd2 * 1000]
+
+    def rr_intervals(self):
+        """ RR interval (detik) yang lagi di buffer, urut waktu """
+        return [rr for _, rr in self._rr]
+
+    def to_state(self):
+        return {"rr": list(self._rr), "diff": list(self._diff), "last_beat_time": self._last_beat_time, "last_rr": self._last_rr}
+
+    def load_state(self, state):
+        """ Kebalikan to_state(); jumlahan berjalan dihitung ulang dari isi buffer """
+        self.reset()
+        self._rr = deque((t, v) for t, v in state["rr"])
+        self._diff = deque((t, v) for t, v in state["diff"])
+        self._rr_sum = sum(v for _, v in self._rr)
+        self._rr_sq = sum(v * v for _, v in self._rr)
+        self._diff_sum = sum(v for _, v in self._diff)
+        self._diff_sq = sum(v * v for _, v in self._diff)
+        self._last_beat_time = state["last_beat_time"]
+        self._last_rr = state["last_rr"]
+
+    def _push(self, end_time, rr, contiguous):
+        if contiguous and self._last_rr is not None:
+            d = rr - self._last_rr
+            self._diff.append((end_time, d))
+            self._diff_sum += d
+            self._diff_sq += d * d
+        self._rr.append((end_time, rr))
+        self._rr_sum += rr
+        self._rr_sq += rr * rr
+        self._last_beat_time = end_time
+        self._last_rr = rr
+
+        self._updates += 1
+        if self._updates % RECOMPUTE_EVERY == 0:
+            self._rr_sum = sum(v for _, v in self._rr)
+            self._rr_sq = sum(v * v for _, v in self._rr)
+            self._diff_sum = sum(v for _, v in self._diff)
+            self._diff_sq = sum(v * v for _, v in self._diff)
+
+    def _expire(self):
+        cutoff = self._last_beat_time - self.horizon_s
+        while self._rr and self._rr[0][0] < cutoff:
+            _, rr = self._rr.popleft()
+            self._rr_sum -= rr
+            self._rr_sq -= rr * rr
+        while self._diff and self._diff[0][0] < cutoff:
+            _, d = self._diff.popleft()
+            self._diff_sum -= d
+            self._diff_sq -= d * d
+
+
+class SharedBufferLock:
+    """
+    Pengganti buffer.lock kalo state-nya dibagi lintas worker: masuk = kunci thread + flock file device,
+    terus load state terbaru dari file (kalo ditulis proses lain); keluar = simpen state, lepas kunci.
+    """
+
+    def __init__(self, buffer, state_path, idle_timeout_s):
+        self.buffer = buffer
+        self.state_path = state_path
+        self.idle_timeout_s = idle_timeout_s
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+        self._seen = None # (inode, mtime_ns, size) file state pas terakhir kita tulis/baca
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._lock_file = open(self.state_path + '.lock', 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._load()
+        except BaseException:
+            self._unlock()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._save()
+        finally:
+            self._unlock()
+
+    def _load(self):
+        try:
+            stat = os.stat(self.state_path)
+        except FileNotFoundError:
+            self.buffer.reset()
+            return
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._seen:
+            return # Gak ada yang nulis sejak kita, buffer di memori udah paling baru
+        if time.time() - stat.st_mtime > self.idle_timeout_s:
+            self.buffer.reset()
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.buffer.load_state(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            self.buffer.reset() # File rusak: mulai dari kosong
+        self._seen = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _save(self):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.buffer.to_state(), f)
+        os.replace(tmp_path, self.state_path)
+        stat = os.stat(self.state_path)
+        self._seen = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _unlock(self):
+        if self._lock_file is not None:
+            self._lock_file.close() # Nutup fd = lepas flock
+            self._lock_file = None
+        self._thread_lock.release()
+
+
+class RRBufferRegistry:
+    """
+    RollingRRBuffer per device, yang lama nganggur dibuang.
+    Kalo `state_dir` diset (wajib buat gunicorn multi-worker), state buffer disimpen per device di situ
+    & `with buffer.lock:` ngunci lintas proses, jadi semua worker ngeliat horizon RR yang sama
+    (gak kepecah per worker tergantung request-nya nyampe di mana). Tanpa state_dir buffer-nya per worker.
+    """
+
+    def __init__(self, horizon_s=60.0, idle_timeout_s=300, max_devices=1024, state_dir=None):
+        self.horizon_s = horizon_s
+        self.idle_timeout_s = idle_timeout_s
+        self.max_devices = max_devices
+        self.state_dir = state_dir
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def get(self, device_key):
+        now = time.monotonic()
+        with self._lock:
+            buffer = self._buffers.get(device_key)
+            # Mode shared: umur state dicek dari file-nya (bisa aja diupdate worker lain)
+            if buffer is None or (not self.state_dir and now - buffer.last_used > self.idle_timeout_s):
+                buffer = RollingRRBuffer(self.horizon_s)
+                if self.state_dir:
+                    buffer.lock = SharedBufferLock(buffer, os.path.join(self.state_dir, f"{device_key}.json"), self.idle_timeout_s)
+                self._buffers[device_key] = buffer
+            self._buffers.move_to_end(device_key)
+            while len(self._buffers) > self.max_devices:
+                self._buffers.popitem(last=False)
+            return buffer
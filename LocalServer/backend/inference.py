@@ -0,0 +1,345 @@
+import os
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+
+# Urutan coba runtime buat TFLITE_RUNTIME=auto: yang enteng dulu (tanpa import tensorflow), TF full terakhir
+RUNTIME_ORDER = ('litert', 'tflite_runtime', 'tensorflow')
+# Varian model beat hasil quantize (quantize-model) -> akhiran nama file di sebelah model float aslinya
+MODEL_VARIANT_SUFFIXES = {'float32': '', 'float16': '_fp16', 'int8': '_int8'}
+
+
+def variant_model_path(base_path, variant):
+    """ model/x.tflite + 'int8' -> model/x_int8.tflite """
+    if variant not in MODEL_VARIANT_SUFFIXES:
+        raise ValueError(f"Varian model '{variant}' tidak dikenal (pilih: {', '.join(MODEL_VARIANT_SUFFIXES)})")
+    root, ext = os.path.splitext(base_path)
+    return f"{root}{MODEL_VARIANT_SUFFIXES[variant]}{ext}"
+
+
+def resolve_model_path(base_path, variant, logger=None):
+    """
+    Path model buat varian yang diminta. Kalo file varian quantized belum ada, balik ke model
+    float32 (yang udah tervalidasi) daripada server gak bisa inferensi. Return (path, varian_kepake).
+    """
+    path = variant_model_path(base_path, variant)
+    if variant != 'float32' and not os.path.exists(path):
+        (logger or logging.getLogger(__name__)).warning(
+            f"⚠️  Model varian '{variant}' ({path}) tidak ada, pake float32. Bikin dulu: flask --app app quantize-model")
+        return base_path, 'float32'
+    return path, variant
+
+
+def _interpreter_class(runtime):
+    """
+    Import malas: tensorflow (ratusan MB, beberapa detik) cuma di-import kalo bener-bener dipake.
+    Return (Interpreter, OpResolverType) dari runtime itu.
+    """
+    if runtime == 'litert':
+        from ai_edge_litert.interpreter import Interpreter, OpResolverType
+        return Interpreter, OpResolverType
+    if runtime == 'tflite_runtime':
+        from tflite_runtime.interpreter import Interpreter, OpResolverType
+        return Interpreter, OpResolverType
+    if runtime == 'tensorflow':
+        import tensorflow as tf
+        return tf.lite.Interpreter, tf.lite.experimental.OpResolverType
+    raise ValueError(f"Runtime TFLite '{runtime}' tidak dikenal (pilih: auto, {', '.join(RUNTIME_ORDER)})")
+
+
+class InterpreterFactory:
+    """
+    Bikin interpreter TFLite dari runtime paling enteng yang bisa jalanin modelnya.
+    Runtime standalone (LiteRT / tflite-runtime) gak punya Flex delegate, jadi model yang
+    pake SELECT_TF_OPS baru gagal pas allocate_tensors() -> lanjut ke runtime berikutnya.
+    Runtime yang berhasil diinget, interpreter berikutnya (pool) langsung pake itu.
+    """
+
+    def __init__(self, model_path, num_threads=None, runtime='auto', use_xnnpack=True, logger=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        # XNNPACK = delegate default TFLite di CPU; dimatiin = kernel builtin biasa (buat banding / kalo ada op yang ngaco)
+        self.use_xnnpack = use_xnnpack
+        self.candidates = RUNTIME_ORDER if runtime == 'auto' else (runtime,)
+        self.logger = logger or logging.getLogger(__name__)
+        self.runtime = None
+
+    def __call__(self):
+        if self.runtime is not None:
+            return self._create(self.runtime)
+        errors = []
+        for runtime in self.candidates:
+            try:
+                interpreter = self._create(runtime)
+                interpreter.allocate_tensors()
+            except ImportError:
+                errors.append(f"{runtime}: tidak terinstall")
+                continue
+            except (RuntimeError, ValueError) as e:
+                errors.append(f"{runtime}: {str(e).splitlines()[0]}")
+                self.logger.warning(f"⚠️  Runtime '{runtime}' gagal jalanin model, coba runtime berikutnya ({errors[-1]})")
+                continue
+            self.runtime = runtime
+            return interpreter
+        raise RuntimeError(f"Tidak ada runtime TFLite yang bisa jalanin model: {'; '.join(errors)}")
+
+    def _create(self, runtime):
+        interpreter_class, op_resolver_type = _interpreter_class(runtime)
+        resolver = op_resolver_type.AUTO if self.use_xnnpack else op_resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        return interpreter_class(model_path=self.model_path, num_threads=self.num_threads,
+                                 experimental_op_resolver_type=resolver)
+
+
+class TFLiteRunner:
+    """
+    Bungkus satu tf.lite.Interpreter + state resize batch-nya.
+    Interpreter TFLite TIDAK thread-safe, jadi satu runner cuma boleh dipake satu thread
+    dalam satu waktu (diatur sama InterpreterPool).
+    """
+
+    def __init__(self, interpreter, logger=None):
+        self.interpreter = interpreter
+        self.logger = logger or logging.getLogger(__name__)
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.input_index = input_details['index']
+        self.output_index = output_details['index']
+        # Model int8 full-integer: input di-quantize & output di-dequantize di sini, pemanggil tetep float32
+        self.input_dtype = input_details['dtype']
+        self.input_quantization = input_details['quantization']
+        self.output_quantization = output_details['quantization'] if output_details['dtype'] != np.float32 else None
+
+        # Batch size yang lagi ke-allocate (awalnya dari allocate_tensors() pertama)
+        self._allocated_batch = int(interpreter.get_input_details()[0]['shape'][0])
+        self._dynamic_batch = True
+
+    def run(self, windows, max_batch_size=1):
+        """ windows: (N, L, 1) float32 -> probabilitas (N, n_kelas) """
+        n = windows.shape[0]
+        if not self._dynamic_batch:
+            return np.concatenate([self._invoke(windows[i:i + 1]) for i in range(n)], axis=0)
+
+        # Bulatin ke pangkat 2 biar gak resize/allocate ulang tiap ukuran batch beda
+        bucket = max(n, min(max_batch_size, 1 << (n - 1).bit_length()))
+        if bucket != n:
+            padding = np.zeros((bucket - n,) + windows.shape[1:], dtype=np.float32)
+            windows = np.concatenate([windows, padding], axis=0)
+
+        if bucket != self._allocated_batch:
+            try:
+                self._resize(bucket, windows.shape[1:])
+            except Exception as e:
+                # Model gak support batch dinamis -> balik ke 1 window per invoke()
+                self.logger.warning(f"⚠️  Model tidak bisa di-resize ke batch {bucket} ({e}). Batching dimatikan.")
+                self._dynamic_batch = False
+                self._resize(1, windows.shape[1:])
+                return np.concatenate([self._invoke(windows[i:i + 1]) for i in range(n)], axis=0)
+
+        return self._invoke(windows)[:n]
+
+    def _resize(self, batch_size, sample_shape):
+        self.interpreter.resize_tensor_input(self.input_index, [batch_size] + list(sample_shape))
+        self.interpreter.allocate_tensors()
+        self._allocated_batch = batch_size
+
+    def _invoke(self, windows):
+        if self.input_dtype != np.float32:
+            scale, zero_point = self.input_quantization
+            info = np.iinfo(self.input_dtype)
+            windows = np.clip(np.round(windows / scale + zero_point), info.min, info.max).astype(self.input_dtype)
+        self.interpreter.set_tensor(self.input_index, windows)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output_index)
+        if self.output_quantization is not None:
+            scale, zero_point = self.output_quantization
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class InterpreterPool:
+    """
+    Pool isi beberapa TFLiteRunner. Tiap request/thread checkout satu runner,
+    jadi gunicorn --threads (gthread) aman & satu worker bisa make semua core.
+    """
+
+    def __init__(self, interpreter_factory, size=1, logger=None):
+        self.size = max(1, int(size))
+        self.logger = logger or logging.getLogger(__name__)
+        self._available = queue.LifoQueue()
+        self.runners = []
+        for _ in range(self.size):
+            interpreter = interpreter_factory()
+            interpreter.allocate_tensors()
+            runner = TFLiteRunner(interpreter, logger=self.logger)
+            self.runners.append(runner)
+            self._available.put(runner)
+
+    @property
+    def input_details(self):
+        return self.runners[0].interpreter.get_input_details()
+
+    @property
+    def output_details(self):
+        return self.runners[0].interpreter.get_output_details()
+
+    def warm_up(self):
+        """
+        Satu invoke() dummy per interpreter biar alokasi & inisialisasi kernel (XNNPACK dll)
+        gak kena ke request pertama. Return durasi (detik).
+        """
+        start = time.perf_counter()
+        for runner in self.runners:
+            shape = runner.interpreter.get_input_details()[0]['shape']
+            runner.run(np.zeros((1,) + tuple(shape[1:]), dtype=np.float32))
+        return time.perf_counter() - start
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        try:
+            runner = self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Tidak ada interpreter yang bebas dalam {timeout} detik")
+        try:
+            yield runner
+        finally:
+            self._available.put(runner)
+
+
+class BatchInferenceEngine:
+    """
+    Micro-batching buat inferensi TFLite.
+    Window dari beberapa request yang datang dalam rentang `max_wait_ms` digabung jadi
+    satu tensor (N, 1024, 1), di-invoke SEKALI, lalu probabilitasnya dibagi lagi ke
+    masing-masing pemanggil. Ada satu thread batcher per interpreter di pool.
+    Nunggu hasil / interpreter bebas dibatesin `timeout` detik (TimeoutError), biar batcher
+    yang macet gak nahan semua thread gthread selamanya.
+    """
+
+    def __init__(self, pool, max_batch_size=16, max_wait_ms=5.0, timeout=30.0, logger=None):
+        self.pool = pool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._owner_pid = None
+
+    def predict(self, window, timeout=None):
+        """ Kirim satu window (1, L, 1) lalu tunggu probabilitas output-nya (1D). TimeoutError kalo kelamaan """
+        return self.result(self.submit(window), timeout)
+
+    def result(self, future, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"Hasil inferensi gak keluar dalam {timeout} detik ({self._queue.qsize()} window ngantri)")
+
+    def predict_batch(self, windows):
+        """
+        Inferensi banyak window sekaligus (N, L, 1) -> (N, n_kelas).
+        Gak lewat antrian batcher: udah jadi batch, langsung checkout interpreter & invoke per potongan max_batch_size.
+        """
+        windows = np.asarray(windows, dtype=np.float32)
+        step = self.max_batch_size
+        with self.pool.checkout(timeout=self.timeout) as runner:
+            outputs = [runner.run(windows[i:i + step], max_batch_size=step) for i in range(0, windows.shape[0], step)]
+        return np.concatenate(outputs, axis=0)
+
+    def submit(self, window):
+        arr = np.asarray(window, dtype=np.float32).reshape(1, -1, 1)
+        future = Future()
+
+        if self.max_batch_size == 1:
+            # Batching dimatiin: jalan langsung di thread pemanggil pake interpreter hasil checkout
+            with self.pool.checkout(timeout=self.timeout) as runner:
+                self._run_batch(runner, [(arr, future)])
+            return future
+
+        self._ensure_workers()
+        self._queue.put((arr, future))
+        return future
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _workers_alive(self):
+        return self._owner_pid == os.getpid() and len(self._threads) > 0 and all(t.is_alive() for t in self._threads)
+
+    def _ensure_workers(self):
+        if self._workers_alive():
+            return
+        with self._lock:
+            if self._workers_alive():
+                return
+            pid = os.getpid()
+            # Thread gak ikut ke-fork (gunicorn --preload), jadi bikin ulang di proses worker
+            if self._owner_pid != pid:
+                self._queue = queue.Queue()
+                self._threads = []
+            self._owner_pid = pid
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.pool.size:
+                thread = threading.Thread(target=self._worker_loop, name=f"tflite-batcher-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self.logger.info(f"Batcher TFLite aktif (pid {pid}, {self.pool.size} interpreter, max_batch={self.max_batch_size}, max_wait={self.max_wait * 1000:.1f} ms)")
+
+    def _worker_loop(self):
+        q = self._queue
+        running = True
+        while running:
+            item = q.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            try:
+                with self.pool.checkout() as runner:
+                    self._run_batch(runner, batch)
+            except Exception as e:
+                # Jangan sampe thread batcher mati diem-diem, pemanggilnya dikasih error
+                self.logger.error(f"❌ Batcher TFLite gagal ({len(batch)} window): {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(self, runner, batch):
+        windows = np.concatenate([w for w, _ in batch], axis=0)
+        try:
+            probs = runner.run(windows, max_batch_size=self.max_batch_size)
+        except Exception as e:
+            self.logger.error(f"❌ Inferensi batch ({len(batch)} window) gagal: {e}", exc_info=True)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for i, (_, future) in enumerate(batch):
+            future.set_result(probs[i])
@@ -0,0 +1,340 @@
+"""
+Service inferensi lokal: SATU proses yang megang model TFLite (beat) & random forest (rhythm),
+dipake bareng sama semua worker gunicorn lewat Unix domain socket.
+
+    python inference_service.py                       # socket default: data/inference.sock
+    INFERENCE_SOCKET=/run/ecg/inference.sock python inference_service.py
+
+Protokol (per pesan): 4 byte panjang (big-endian) + header JSON.
+Window TIDAK lewat socket: client nulis (N, L, 1) float32 ke shared memory miliknya sendiri,
+header cuma bawa nama segmen & ukurannya; probabilitas ditulis balik ke segmen yang sama
+(setelah area input). Fitur rhythm (N x 6 angka) cukup lewat header JSON.
+"""
+import os
+import json
+import atexit
+import time
+import socket
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from inference import BatchInferenceEngine, InterpreterPool, InterpreterFactory, resolve_model_path
+from forest_inference import compile_classifier
+
+HEADER = struct.Struct('>I')
+MAX_HEADER_BYTES = 1 << 20
+
+
+class InferenceServiceError(RuntimeError):
+    """ Service inferensi gak bisa dihubungi / balikin error """
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    """ Pesan berikutnya, atau None kalo koneksinya ditutup """
+    raw = _recv_exact(sock, HEADER.size)
+    if raw is None:
+        return None
+    (length,) = HEADER.unpack(raw)
+    if length > MAX_HEADER_BYTES:
+        raise InferenceServiceError(f"Header kegedean ({length} byte)")
+    payload = _recv_exact(sock, length)
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+
+def _recv_exact(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            return None
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def _attach_shared_memory(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Segmen punya client: jangan sampe resource tracker service nge-unlink pas service berhenti
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class InferenceServer:
+    """
+    Satu thread per koneksi client (worker x thread gunicorn). Window dari semua koneksi masuk
+    ke BatchInferenceEngine yang sama, jadi micro-batching-nya lintas worker.
+    """
+
+    def __init__(self, socket_path, engine, rhythm_classifier=None, info=None, logger=None):
+        self.socket_path = socket_path
+        self.engine = engine
+        self.rhythm_classifier = rhythm_classifier
+        self.info = info or {}
+        self.logger = logger or logging.getLogger(__name__)
+        self._sock = None
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        self._sock.listen(64)
+        self.logger.info(f"🚀 Service inferensi siap di {self.socket_path} (pid {os.getpid()})")
+        try:
+            while True:
+                conn, _ = self._sock.accept()
+                threading.Thread(target=self._handle, args=(conn,), name="inference-conn", daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def _handle(self, conn):
+        with self._lock:
+            self._connections += 1
+        shm = None
+        try:
+            while True:
+                request = recv_message(conn)
+                if request is None:
+                    break
+                try:
+                    if request.get('shm') and (shm is None or shm.name != request['shm']):
+                        if shm is not None:
+                            shm.close()
+                        shm = _attach_shared_memory(request['shm'])
+                    response = self._dispatch(request, shm)
+                except Exception as e:
+                    self.logger.error(f"❌ Request inferensi gagal ({request.get('op')}): {e}", exc_info=True)
+                    response = {"ok": False, "error": str(e)}
+                send_message(conn, response)
+        except (OSError, InferenceServiceError) as e:
+            self.logger.warning(f"⚠️  Koneksi client inferensi putus: {e}")
+        finally:
+            if shm is not None:
+                shm.close()
+            conn.close()
+            with self._lock:
+                self._connections -= 1
+
+    def _dispatch(self, request, shm):
+        op = request.get('op')
+        if op == 'beat':
+            n, length, n_classes = request['n'], request['length'], request['classes']
+            windows = np.ndarray((n, length, 1), dtype=np.float32, buffer=shm.buf)
+            if request.get('batch'):
+                probs = self.engine.predict_batch(windows)
+            else:
+                # Lewat antrian batcher: window dari worker lain yang dateng barengan digabung 1x invoke()
+                futures = [self.engine.submit(windows[i]) for i in range(n)]
+                deadline = time.monotonic() + self.engine.timeout
+                probs = np.stack([self.engine.result(f, max(0.0, deadline - time.monotonic())) for f in futures])
+            out = np.ndarray((n, n_classes), dtype=np.float32, buffer=shm.buf, offset=n * length * 4)
+            out[:] = probs
+            return {"ok": True}
+        if op == 'rhythm':
+            if self.rhythm_classifier is None:
+                return {"ok": False, "error": "Rhythm classifier tidak dimuat di service"}
+            labels, proba = self.rhythm_classifier.predict(np.asarray(request['features'], dtype=np.float32))
+            return {"ok": True, "labels": labels.tolist(), "proba": proba.tolist()}
+        if op == 'info':
+            return {"ok": True, "connections": self._connections, **self.info}
+        return {"ok": False, "error": f"Operasi '{op}' tidak dikenal"}
+
+
+class InferenceClient:
+    """
+    Pengganti BatchInferenceEngine di worker web (INFERENCE_MODE=remote): predict() / predict_batch()
+    dengan signature yang sama, tapi inferensinya di service. Tiap thread punya koneksi & segmen
+    shared memory sendiri (dibuat ulang kalo proses-nya hasil fork / ukurannya kurang).
+    """
+
+    def __init__(self, socket_path, n_classes, timeout=30.0, logger=None):
+        self.socket_path = socket_path
+        self.n_classes = n_classes
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.rhythm = RemoteRhythmClassifier(self)
+        self._local = threading.local()
+        self._segments = [] # (pid, SharedMemory) yang dibikin client ini, di-unlink pas proses keluar
+        self._segments_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def predict(self, window, timeout=None):
+        """ Satu window (1, L, 1) -> probabilitas (1D), ikut micro-batching lintas worker di service """
+        return self._run_beat(np.asarray(window, dtype=np.float32).reshape(1, -1, 1), batch=False)[0]
+
+    def predict_batch(self, windows):
+        """ (N, L, 1) -> (N, n_kelas), langsung satu batch di service """
+        return self._run_beat(np.asarray(windows, dtype=np.float32), batch=True)
+
+    def info(self):
+        return self.request({"op": "info"})
+
+    def request(self, message):
+        """ Kirim satu pesan, balikin respon; koneksi putus = reconnect sekali lalu coba lagi """
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                send_message(conn, message)
+                response = recv_message(conn)
+                if response is None:
+                    raise ConnectionError("Service inferensi nutup koneksi")
+                break
+            except OSError as e:
+                self._reset()
+                if attempt == 1:
+                    raise InferenceServiceError(f"Service inferensi tidak bisa dihubungi: {e}") from e
+        if not response.get('ok'):
+            raise InferenceServiceError(response.get('error', 'Error tidak dikenal'))
+        return response
+
+    def _run_beat(self, windows, batch):
+        n, length = windows.shape[0], windows.shape[1]
+        shm = self._shared_memory(n * (length + self.n_classes) * 4)
+        np.ndarray(windows.shape, dtype=np.float32, buffer=shm.buf)[:] = windows
+        self.request({"op": "beat", "shm": shm.name, "n": n, "length": length, "classes": self.n_classes, "batch": batch})
+        return np.ndarray((n, self.n_classes), dtype=np.float32, buffer=shm.buf, offset=n * length * 4).copy()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # Hasil fork (gunicorn --preload): socket & shm punya proses induk, jangan dipake
+            local.conn, local.shm, local.pid = None, None, os.getpid()
+        if local.conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            try:
+                conn.connect(self.socket_path)
+            except OSError as e:
+                conn.close()
+                raise InferenceServiceError(f"Service inferensi tidak bisa dihubungi di {self.socket_path}: {e}") from e
+            local.conn = conn
+        return local.conn
+
+    def _shared_memory(self, size):
+        local = self._local
+        self._connection()
+        if local.shm is None or local.shm.size < size:
+            if local.shm is not None:
+                with self._segments_lock:
+                    self._segments = [(owner, shm) for owner, shm in self._segments if shm is not local.shm]
+                self._release(local.shm)
+            # Dibulatin ke pangkat 2 biar gak bikin segmen baru tiap ukuran batch beda
+            local.shm = shared_memory.SharedMemory(create=True, size=1 << (max(size, 4096) - 1).bit_length())
+            with self._segments_lock:
+                self._segments.append((os.getpid(), local.shm))
+        return local.shm
+
+    def close(self):
+        """ Unlink semua segmen shared memory yang dibikin proses ini """
+        pid = os.getpid()
+        with self._segments_lock:
+            mine = [shm for owner, shm in self._segments if owner == pid]
+            self._segments = [(owner, shm) for owner, shm in self._segments if owner != pid]
+        for shm in mine:
+            self._release(shm)
+
+    def _reset(self):
+        local = self._local
+        if getattr(local, 'conn', None) is not None:
+            local.conn.close()
+            local.conn = None
+
+    @staticmethod
+    def _release(shm):
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class RemoteRhythmClassifier:
+    """ Pengganti FlatForest di worker web: predict(X) -> (label, probabilitas) dari service """
+
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, X):
+        response = self.client.request({"op": "rhythm", "features": np.asarray(X, dtype=np.float32).tolist()})
+        return np.asarray(response['labels']), np.asarray(response['proba'], dtype=np.float64)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    logger = logging.getLogger('inference_service')
+    basedir = os.path.abspath(os.path.dirname(__file__))
+    socket_path = os.getenv('INFERENCE_SOCKET', os.path.join(basedir, 'data/inference.sock'))
+    model_path, variant = resolve_model_path(
+        os.getenv('MODEL_PATH', os.path.join(basedir, 'model/beat_classifier_model_SMOTE.tflite')),
+        os.getenv('MODEL_VARIANT', 'float32'), logger)
+    use_xnnpack = os.getenv('MODEL_XNNPACK', '1') != '0'
+    afib_model_path = os.getenv('AFIB_MODEL_PATH', os.path.join(basedir, 'model/afib_classifier.pkl'))
+    # Service ini yang megang semua core inferensi, jadi pool-nya boleh lebih gede dari mode local
+    pool_size = int(os.getenv('MODEL_POOL_SIZE', 2))
+    num_threads = min(int(os.getenv('MODEL_NUM_THREADS', 0)), os.cpu_count() or 1) or None
+
+    started_at = time.perf_counter()
+    factory = InterpreterFactory(model_path, num_threads=num_threads, runtime=os.getenv('TFLITE_RUNTIME', 'auto'),
+                                 use_xnnpack=use_xnnpack, logger=logger)
+    pool = InterpreterPool(factory, size=pool_size, logger=logger)
+    engine = BatchInferenceEngine(
+        pool,
+        max_batch_size=int(os.getenv('INFER_BATCH_MAX_SIZE', 16)),
+        max_wait_ms=float(os.getenv('INFER_BATCH_MAX_WAIT_MS', 5)),
+        timeout=float(os.getenv('INFERENCE_TIMEOUT_S', 30)),
+        logger=logger
+    )
+    pool.warm_up()
+
+    rhythm_classifier = None
+    if os.path.exists(afib_model_path):
+        import joblib
+        rhythm_classifier, max_error = compile_classifier(joblib.load(afib_model_path), logger)
+        logger.info(f"✅ Rhythm classifier dimuat (selisih vs sklearn: {max_error})")
+    else:
+        logger.warning(f"⚠️  File '{afib_model_path}' tidak ditemukan, rhythm classifier dimatikan.")
+
+    info = {
+        "pid": os.getpid(),
+        "runtime": factory.runtime,
+        "modelVariant": variant,
+        "xnnpack": use_xnnpack,
+        "inputShape": [int(x) for x in pool.input_details[0]['shape']],
+        "outputShape": [int(x) for x in pool.output_details[0]['shape']],
+        "poolSize": pool_size,
+        "rhythmModel": rhythm_classifier is not None,
+        "loadSeconds": round(time.perf_counter() - started_at, 3),
+    }
+    logger.info(f"✅ Model beat dimuat (runtime {factory.runtime}, varian {variant}, pool {pool_size}) dalam {info['loadSeconds']} s")
+    InferenceServer(socket_path, engine, rhythm_classifier, info=info, logger=logger).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
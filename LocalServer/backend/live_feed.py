@@ -0,0 +1,211 @@
+import os
+import json
+import fcntl
+import queue
+import socket
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+SOCKET_SUFFIX = '.sock'
+
+
+class Subscription:
+    """ Satu koneksi live feed: antrian event (bounded) buat topic-topic yang boleh dia liat """
+
+    def __init__(self, broker, topics, max_queue=100):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0 # Event yang kebuang karena client-nya lambat
+
+    def get(self, timeout=None):
+        """ Event berikutnya, atau None kalo sampe timeout gak ada apa-apa """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class StreamSlots:
+    """
+    Batas jumlah stream SSE buat SEMUA worker: tiap slot = satu file di slot_dir yang di-flock selama
+    stream-nya jalan (kunci ilang sendiri kalo worker mati). `per_process` = batas tambahan per worker,
+    biar gak semua slot numpuk di satu worker & ngabisin thread gthread-nya.
+    """
+
+    def __init__(self, slot_dir, size, per_process=None):
+        self.slot_dir = slot_dir
+        self.size = max(0, int(size))
+        os.makedirs(slot_dir, exist_ok=True)
+        self._local = threading.BoundedSemaphore(per_process) if per_process else None
+
+    def acquire(self):
+        """ Return handle slot, atau None kalo semua slot lagi kepake """
+        if self._local is not None and not self._local.acquire(blocking=False):
+            return None
+        for i in range(self.size):
+            slot = open(os.path.join(self.slot_dir, f"slot-{i}.lock"), 'a')
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except BlockingIOError:
+                slot.close()
+        if self._local is not None:
+            self._local.release()
+        return None
+
+    def release(self, slot):
+        slot.close() # Nutup fd = lepas flock
+        if self._local is not None:
+            self._local.release()
+
+
+class LocalBroker:
+    """
+    Broker pub/sub in-process (satu worker). Cukup buat dev/test;
+    buat banyak worker gunicorn pake UnixSocketBroker.
+    """
+
+    def __init__(self, max_queue=100, logger=None):
+        self.max_queue = max_queue
+        self.logger = logger or logging.getLogger(__name__)
+        self._subscribers = defaultdict(set) # topic -> {Subscription}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics):
+        sub = Subscription(self, topics, self.max_queue)
+        with self._lock:
+            for topic in sub.topics:
+                self._subscribers[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._subscribers.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[topic]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values())) if self._subscribers else 0
+
+    def publish(self, topics, event):
+        self._deliver(topics, event)
+
+    def _deliver(self, topics, event):
+        with self._lock:
+            # Set: subscriber yang dengerin beberapa topic sekaligus cuma dapet sekali
+            targets = set()
+            for topic in topics:
+                targets.update(self._subscribers.get(topic, ()))
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.dropped += 1
+
+
+class UnixSocketBroker(LocalBroker):
+    """
+    Fan-out antar worker gunicorn tanpa Redis: tiap worker yang punya subscriber
+    nge-bind socket datagram Unix `<pid>.sock` di socket_dir. Publish = kirim ke
+    subscriber lokal langsung + satu datagram ke socket tiap worker lain.
+    """
+
+    def __init__(self, socket_dir, max_queue=100, logger=None):
+        super().__init__(max_queue=max_queue, logger=logger)
+        self.socket_dir = socket_dir
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._owner_pid = None
+        self._listener = None
+        self._sender = None
+        self._sender_pid = None
+        self._socket_path = None
+        self._setup_lock = threading.Lock()
+
+    def subscribe(self, topics):
+        self._ensure_listener()
+        return super().subscribe(topics)
+
+    def publish(self, topics, event):
+        topics = list(topics)
+        self._deliver(topics, event)
+
+        payload = json.dumps({"topics": topics, "event": event}).encode('utf-8')
+        sender = self._ensure_sender()
+        for name in os.listdir(self.socket_dir):
+            if not name.endswith(SOCKET_SUFFIX):
+                continue
+            path = os.path.join(self.socket_dir, name)
+            if path == self._socket_path and self._owner_pid == os.getpid():
+                continue # Subscriber lokal udah dikirim langsung di atas
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker-nya udah mati (crash / di-recycle gunicorn) -> bersihin socket basi
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                self.logger.warning(f"Live feed: buffer worker {name} penuh, event dibuang")
+
+    def _ensure_sender(self):
+        pid = os.getpid()
+        if self._sender_pid != pid:
+            with self._setup_lock:
+                if self._sender_pid != pid:
+                    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    sender.setblocking(False)
+                    self._sender, self._sender_pid = sender, pid
+        return self._sender
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._owner_pid == pid and self._listener is not None and self._listener.is_alive():
+            return
+        with self._setup_lock:
+            if self._owner_pid == pid and self._listener is not None and self._listener.is_alive():
+                return
+            # Thread & socket gak ikut ke-fork (gunicorn --preload), jadi bikin per proses worker
+            path = os.path.join(self.socket_dir, f"{pid}{SOCKET_SUFFIX}")
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            self._socket_path = path
+            self._owner_pid = pid
+            self._listener = threading.Thread(target=self._listen_loop, args=(sock,), name="live-feed-listener", daemon=True)
+            self._listener.start()
+            atexit.register(self._cleanup_socket, path)
+            self.logger.info(f"Live feed listener aktif di {path}")
+
+    def _listen_loop(self, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError as e:
+                self.logger.error(f"❌ Live feed listener berhenti: {e}")
+                return
+            try:
+                message = json.loads(data.decode('utf-8'))
+                self._deliver(message["topics"], message["event"])
+            except Exception as e:
+                self.logger.error(f"❌ Live feed: gagal proses event dari worker lain: {e}")
+
+    @staticmethod
+    def _cleanup_socket(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,100 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import threading
+from collections import OrderedDict
+
+_COUNTER = struct.Struct('<Q')
+
+
+class SharedGeneration:
+    """
+    Counter generasi yang dishare semua worker gunicorn lewat file kecil yang di-mmap.
+    Worker yang ngubah data tinggal bump(); worker lain cukup baca value() (akses memori,
+    tanpa syscall/query) dan buang cache-nya kalo angkanya beda.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _COUNTER.size:
+                os.ftruncate(fd, _COUNTER.size)
+            self._map = mmap.mmap(fd, _COUNTER.size)
+        finally:
+            os.close(fd)
+
+    def value(self):
+        return _COUNTER.unpack_from(self._map, 0)[0]
+
+    def bump(self):
+        with open(self.path, 'rb') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                new_value = self.value() + 1
+                _COUNTER.pack_into(self._map, 0, new_value)
+                return new_value
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TTLCache:
+    """
+    Cache in-process (per worker) dengan TTL + eviksi LRU, thread-safe.
+    Kalo dikasih SharedGeneration, isi cache otomatis dibuang begitu ada worker lain
+    yang invalidate (data jarang berubah, jadi buang semua lebih simpel & aman).
+    """
+
+    def __init__(self, ttl_seconds=60, max_entries=1024, generation=None):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.generation = generation
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._seen_generation = generation.value() if generation else None
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """ Ambil dari cache, kalo gak ada/expired panggil loader(key) (hasil None juga di-cache) """
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            loaded_generation = self._seen_generation
+
+        # Loader (query DB) dijalanin di luar lock biar gak nahan thread lain
+        value = loader(key)
+
+        with self._lock:
+            self._sync_generation()
+            # Kalo ada invalidasi selagi loading, hasilnya udah basi -> jangan disimpen
+            if self._seen_generation == loaded_generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        """ Kosongin cache di worker ini, dan kasih tau worker lain lewat generasi """
+        with self._lock:
+            self._entries.clear()
+            if self.generation is not None:
+                self._seen_generation = self.generation.bump()
+
+    def _sync_generation(self):
+        if self.generation is None:
+            return
+        current = self.generation.value()
+        if current != self._seen_generation:
+            self._entries.clear()
+            self._seen_generation = current
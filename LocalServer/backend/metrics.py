@@ -0,0 +1,124 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+
+# Mode multiprocess (gunicorn): tiap worker nulis ke file mmap sendiri di folder ini, /metrics ngegabungin semuanya.
+# Env-nya harus udah ada SEBELUM prometheus_client di-import (dibaca pas import), jadi set di docker-compose.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+    from prometheus_client import multiprocess
+except ImportError: # prometheus_client opsional, tanpa itu semua metrik jadi no-op & /metrics 503
+    Counter = Gauge = Histogram = None
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Tahapan pipeline /analyze-ecg yang diukur (batch & stream pake tahapan yang sama, per panggilan)
+STAGES = (
+    'json_decode', 'quality_check', 'device_lookup', 'preprocess', 'tflite_invoke',
+    'beat_detection', 'rhythm_features', 'rhythm_classifier', 'heart_rate', 'db_commit',
+    'db_flush', # Tulis batch write-behind (INGEST_WRITE_MODE=behind), db_commit cuma waktu antri-nya
+)
+# Dari ~100 µs (RF compile, heart rate) sampe detik (TFLite pas antri / commit DB pas lock)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _NullMetric:
+    """ Pengganti metrik kalo prometheus_client gak terinstall """
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram('ecg_stage_duration_seconds', 'Durasi per tahap pipeline ingest', ['stage'], buckets=STAGE_BUCKETS)
+    REQUEST_SECONDS = Histogram('ecg_request_duration_seconds', 'Durasi total request ingest', ['endpoint'], buckets=STAGE_BUCKETS)
+    PREDICTIONS = Counter('ecg_predictions_total', 'Window yang diprediksi, per kelas beat & rhythm', ['beat', 'rhythm'])
+    REJECTIONS = Counter('ecg_rejections_total', 'Request / window yang ditolak, per alasan', ['endpoint', 'reason'])
+    # livemin: 0 kalo ADA worker hidup yang modelnya belum / gagal dimuat
+    MODEL_LOADED = Gauge('ecg_model_loaded', 'Model udah dimuat (1) atau belum (0)', ['model'], multiprocess_mode='livemin')
+    _stage_children = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+else:
+    STAGE_SECONDS = REQUEST_SECONDS = PREDICTIONS = REJECTIONS = MODEL_LOADED = _NullMetric()
+    _stage_children = {stage: STAGE_SECONDS for stage in STAGES}
+
+_model_state = {} # model -> 0/1, disetel ulang di child abis fork (gunicorn --preload muat model di master)
+
+
+@contextmanager
+def timed(stage):
+    """ with timed('preprocess'): ... -> durasinya masuk histogram ecg_stage_duration_seconds """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_children[stage].observe(time.perf_counter() - start)
+
+
+def timed_endpoint(endpoint):
+    """ Decorator route: durasi total request masuk ecg_request_duration_seconds """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count_prediction(beat, rhythm):
+    PREDICTIONS.labels(beat, rhythm).inc()
+
+
+def count_rejection(endpoint, reason, amount=1):
+    if amount:
+        REJECTIONS.labels(endpoint, reason).inc(amount)
+
+
+def set_model_loaded(model, loaded):
+    _model_state[model] = 1 if loaded else 0
+    MODEL_LOADED.labels(model).set(_model_state[model])
+
+
+def _reapply_model_state():
+    # File mmap gauge per pid: worker hasil fork belum punya, jadi status model dari master ditulis ulang
+    for model, value in _model_state.items():
+        MODEL_LOADED.labels(model).set(value)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reapply_model_state)
+
+
+def available():
+    return Histogram is not None
+
+
+def render():
+    """ Teks exposition Prometheus; mode multiprocess = gabungan semua worker (hidup & yang udah mati) """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid):
+    """ Dipanggil master gunicorn pas worker keluar (gunicorn.conf.py), biar gauge-nya gak ikut dihitung """
+    if MULTIPROC_DIR and Histogram is not None:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,124 @@
+import os
+import time
+
+import numpy as np
+
+from inference import InterpreterFactory, TFLiteRunner, MODEL_VARIANT_SUFFIXES, variant_model_path
+
+# Reading dengan id % HOLDOUT_EVERY == 0 = data uji (compare-models), sisanya boleh buat kalibrasi int8
+HOLDOUT_EVERY = 10
+CLINICAL_LABEL = 'PVC' # Label yang flip-nya dihitung terpisah di laporan
+
+
+def quantize_model(source, base_path, variants, calibration_windows, logger=print):
+    """
+    Convert model hasil training (Keras .keras/.h5 atau folder SavedModel) ke varian TFLite quantized.
+    float16: bobot fp16. int8: bobot & aktivasi int8, kalibrasi pake window tersimpan (I/O tetep float32
+    biar preprocess gak berubah). Op yang gak ada versi int8-nya (loop RNN, Flex) tetep jalan di float.
+    Return {varian: path}.
+    """
+    import tensorflow as tf
+
+    if os.path.isdir(source):
+        converter_factory = lambda: tf.lite.TFLiteConverter.from_saved_model(source)
+    else:
+        model = tf.keras.models.load_model(source, compile=False)
+        converter_factory = lambda: tf.lite.TFLiteConverter.from_keras_model(model)
+
+    def representative_dataset():
+        for window in calibration_windows:
+            yield [np.asarray(window, dtype=np.float32).reshape(1, -1, 1)]
+
+    written = {}
+    for variant in variants:
+        converter = converter_factory()
+        # Sama kayak model float aslinya: layer RNN butuh TensorList (Flex op)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        converter._experimental_lower_tensor_list_ops = False
+        if variant == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            if len(calibration_windows) == 0:
+                raise ValueError("Kalibrasi int8 butuh window tersimpan (ECGReading masih kosong?)")
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+        else:
+            # float32 = MODEL_PATH itu sendiri, jangan sampe model produksi ketimpa
+            raise ValueError(f"Varian '{variant}' tidak bisa dibikin (pilih: float16, int8)")
+        path = variant_model_path(base_path, variant)
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+        written[variant] = path
+        logger(f"  -> {variant}: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    return written
+
+
+def available_variants(base_path):
+    """ {varian: path} yang file-nya ada """
+    paths = {variant: variant_model_path(base_path, variant) for variant in MODEL_VARIANT_SUFFIXES}
+    return {variant: path for variant, path in paths.items() if os.path.exists(path)}
+
+
+def run_variant(path, windows, num_threads=None, use_xnnpack=True, runtime='auto'):
+    """ Inferensi window satu-satu (batch 1, kayak jalur request) -> (probabilitas (N, kelas), latency detik (N,)) """
+    factory = InterpreterFactory(path, num_threads=num_threads, runtime=runtime, use_xnnpack=use_xnnpack)
+    interpreter = factory()
+    interpreter.allocate_tensors()
+    runner = TFLiteRunner(interpreter)
+    windows = np.asarray(windows, dtype=np.float32).reshape(len(windows), -1, 1)
+    runner.run(windows[:1]) # Warm-up
+
+    probs, latencies = [], np.empty(len(windows))
+    for i in range(len(windows)):
+        start = time.perf_counter()
+        probs.append(runner.run(windows[i:i + 1])[0])
+        latencies[i] = time.perf_counter() - start
+    return np.asarray(probs), latencies, factory.runtime
+
+
+def compare_variants(variant_paths, windows, labels, num_threads=None, xnnpack_options=(True,), runtime='auto'):
+    """
+    Jalanin tiap varian x setting XNNPACK di window yang sama, bandingin sama baseline
+    (varian & setting pertama, biasanya float32 + XNNPACK). Return list dict per konfigurasi.
+    """
+    clinical = labels.index(CLINICAL_LABEL) if CLINICAL_LABEL in labels else None
+    rows, baseline = [], None
+    for variant, path in variant_paths.items():
+        for use_xnnpack in xnnpack_options:
+            probs, latencies, used_runtime = run_variant(path, windows, num_threads, use_xnnpack, runtime)
+            predicted = probs.argmax(axis=1)
+            if baseline is None:
+                baseline = (probs, predicted)
+            base_probs, base_predicted = baseline
+            drift = np.abs(probs - base_probs)
+            row = {
+                "variant": variant,
+                "xnnpack": use_xnnpack,
+                "runtime": used_runtime,
+                "sizeKb": os.path.getsize(path) / 1024,
+                "agreement": float(np.mean(predicted == base_predicted)),
+                "meanDrift": float(drift.mean()),
+                "maxDrift": float(drift.max()),
+                "p50Ms": float(np.percentile(latencies, 50) * 1000),
+                "p99Ms": float(np.percentile(latencies, 99) * 1000),
+            }
+            if clinical is not None:
+                # PVC yang ilang (baseline PVC, varian bukan) lebih bahaya dari yang nambah
+                row["clinicalMissed"] = int(np.sum((base_predicted == clinical) & (predicted != clinical)))
+                row["clinicalAdded"] = int(np.sum((base_predicted != clinical) & (predicted == clinical)))
+            rows.append(row)
+    return rows
+
+
+def format_report(rows, n_windows):
+    header = (f"{'varian':<8} {'xnnpack':<8} {'runtime':<15} {'KB':>7} {'setuju':>8} {'drift rata2':>11} "
+              f"{'drift max':>10} {f'{CLINICAL_LABEL} hilang':>11} {f'{CLINICAL_LABEL} nambah':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    lines = [f"Perbandingan varian model di {n_windows} window holdout (baseline = baris pertama)", header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['variant']:<8} {('ya' if row['xnnpack'] else 'tidak'):<8} {str(row['runtime']):<15} {row['sizeKb']:>7.1f} "
+            f"{row['agreement'] * 100:>7.2f}% {row['meanDrift']:>11.5f} {row['maxDrift']:>10.5f} "
+            f"{row.get('clinicalMissed', '-'):>11} {row.get('clinicalAdded', '-'):>11} {row['p50Ms']:>8.2f} {row['p99Ms']:>8.2f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+import json
+import zlib
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError: # msgpack opsional, firmware lama cuma kirim JSON
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+RAW_MIMETYPES = ('application/octet-stream',)
+
+# Format sampel yang boleh dikirim sebagai bytes (selalu little-endian)
+SAMPLE_DTYPES = {
+    'int16': np.dtype('<i2'),
+    'float32': np.dtype('<f4'),
+}
+
+
+class PayloadError(Exception):
+    """ Body request gak bisa di-decode. status_code langsung dipake buat response """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def decode_ecg_request(req, max_decompressed_bytes=8 * 1024 * 1024):
+    """
+    Decode body /analyze-ecg jadi dict yang sama kayak versi JSON.
+    - application/json          : jalur lama (firmware lama), gak diubah
+    - application/msgpack       : map yang sama; 'ecg_beat_data' boleh berupa bin (int16/float32 LE)
+    - application/octet-stream  : body = sampel int16 LE mentah, metadata di header
+                                  (X-Device-Id, X-Timestamp, X-Sample-Dtype, X-Sample-Scale)
+    Semua format boleh di-gzip (Content-Encoding: gzip).
+    Sampel dalam bentuk bytes di-decode pake np.frombuffer, tanpa bikin objek Python per titik.
+    """
+    mimetype = (req.mimetype or '').lower()
+    encoding = (req.headers.get('Content-Encoding') or 'identity').lower().strip()
+
+    if encoding == 'identity' and mimetype not in MSGPACK_MIMETYPES + RAW_MIMETYPES:
+        return req.get_json()
+
+    body = _decompress(req.get_data(cache=False), encoding, max_decompressed_bytes)
+
+    if mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise PayloadError("Format msgpack tidak didukung server ini", 415)
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise PayloadError(f"Body msgpack tidak valid: {e}")
+        if not isinstance(data, dict):
+            raise PayloadError("Body msgpack harus berupa map")
+        _decode_samples_in_place(data)
+        for window in data.get('windows') or []:
+            if isinstance(window, dict):
+                _decode_samples_in_place(window, data)
+        return data
+
+    if mimetype in RAW_MIMETYPES:
+        device_id = req.headers.get('X-Device-Id')
+        if not device_id:
+            raise PayloadError("Header 'X-Device-Id' dibutuhkan untuk body biner")
+        return {
+            "device_id": device_id,
+            "timestamp": req.headers.get('X-Timestamp'),
+            "ecg_beat_data": samples_from_buffer(
+                body,
+                req.headers.get('X-Sample-Dtype', 'int16'),
+                req.headers.get('X-Sample-Scale')
+            )
+        }
+
+    # JSON yang di-gzip
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise PayloadError(f"Body JSON tidak valid: {e}")
+
+
+def samples_from_buffer(buffer, dtype='int16', scale=None):
+    """ bytes -> array 1D tanpa copy (kecuali ada scale, itu sekali operasi vektor) """
+    dtype_key = (dtype or 'int16').lower()
+    if dtype_key not in SAMPLE_DTYPES:
+        raise PayloadError(f"Tipe sampel '{dtype}' tidak didukung (pilih: {', '.join(SAMPLE_DTYPES)})")
+    sample_dtype = SAMPLE_DTYPES[dtype_key]
+
+    if len(buffer) == 0 or len(buffer) % sample_dtype.itemsize != 0:
+        raise PayloadError(f"Panjang data biner ({len(buffer)} byte) bukan kelipatan {sample_dtype.itemsize}")
+    samples = np.frombuffer(buffer, dtype=sample_dtype)
+
+    if scale is not None:
+        try:
+            scale = float(scale)
+        except (TypeError, ValueError):
+            raise PayloadError(f"Scale '{scale}' tidak valid")
+        if scale <= 0:
+            raise PayloadError("Scale harus lebih dari 0")
+        if scale != 1.0:
+            samples = samples / np.float32(scale)
+    return samples
+
+
+class SampleStreamDecoder:
+    """
+    Decode body biner yang datengnya sepotong-sepotong (chunked/streaming).
+    Potongan bisa aja kebelah di tengah sampel, sisa byte-nya disimpen buat potongan berikutnya.
+    """
+
+    def __init__(self, dtype='int16', scale=None):
+        dtype_key = (dtype or 'int16').lower()
+        if dtype_key not in SAMPLE_DTYPES:
+            raise PayloadError(f"Tipe sampel '{dtype}' tidak didukung (pilih: {', '.join(SAMPLE_DTYPES)})")
+        self.dtype = dtype_key
+        self.scale = scale
+        self.itemsize = SAMPLE_DTYPES[dtype_key].itemsize
+        self._leftover = b''
+
+    def feed(self, chunk):
+        """ bytes -> array sampel yang udah lengkap (bisa kosong) """
+        data = self._leftover + bytes(chunk) if self._leftover else bytes(chunk)
+        usable = len(data) - len(data) % self.itemsize
+        self._leftover = data[usable:]
+        if usable == 0:
+            return np.zeros(0, dtype=np.float32)
+        return samples_from_buffer(data[:usable], self.dtype, self.scale)
+
+    @property
+    def pending_bytes(self):
+        return len(self._leftover)
+
+
+def _decode_samples_in_place(obj, defaults=None):
+    raw = obj.get('ecg_beat_data')
+    if not isinstance(raw, (bytes, bytearray, memoryview)):
+        return
+    defaults = defaults or {}
+    obj['ecg_beat_data'] = samples_from_buffer(
+        raw,
+        obj.get('dtype', defaults.get('dtype', 'int16')),
+        obj.get('scale', defaults.get('scale'))
+    )
+
+
+def _decompress(body, encoding, max_bytes):
+    if encoding in ('identity', ''):
+        return body
+    if encoding not in ('gzip', 'x-gzip'):
+        raise PayloadError(f"Content-Encoding '{encoding}' tidak didukung", 415)
+
+    # Dibatesin biar gak kena gzip bomb
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise PayloadError(f"Body gzip tidak valid: {e}")
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise PayloadError("Body terlalu besar setelah didekompresi", 413)
+    return data
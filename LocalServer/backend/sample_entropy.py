@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+EMBEDDING_DIM = 2        # m, sama kayak default nolds.sampen
+TOLERANCE_RATIO = 0.2    # r = 0.2 * std(RR)
+MAX_PAIRS_PER_CHUNK = 1 << 16  # Kandidat pasangan yang dicek sekaligus (batas memori deret panjang)
+
+
+def sample_entropy(series, emb_dim=EMBEDDING_DIM, tolerance=None):
+    """
+    Sample Entropy (Richman & Moorman) = -ln(A / B), jarak Chebyshev, tanpa self-match.
+    B = pasangan template panjang m yang mirip (jarak <= r), A = yang tetep mirip di panjang m+1.
+    Dua-duanya pake N-m template yang sama, jadi cukup SATU kali hitung jarak.
+    Return 0.0 kalo datanya kurang / gak ada pasangan sama sekali (B = 0), dan ln(B)
+    (batas atas, anggap A = 1) kalo B > 0 tapi A = 0, biar fiturnya tetep angka berhingga.
+    """
+    x = np.asarray(series, dtype=np.float64).ravel()
+    n_templates = x.size - emb_dim
+    if n_templates < 2:
+        return 0.0
+    if tolerance is None:
+        tolerance = TOLERANCE_RATIO * np.std(x)
+    if tolerance <= 0:
+        return 0.0 # Sinyal konstan: semua template sama, tidak ada informasi
+
+    # Template panjang m+1: kolom 0..m-1 buat B, kolom terakhir tambahan buat A
+    templates = np.lib.stride_tricks.sliding_window_view(x, emb_dim + 1)[:n_templates]
+    matches_m, matches_m1 = _count_similar_pairs(templates, emb_dim, tolerance)
+    if matches_m == 0:
+        return 0.0
+    return math.log(matches_m / max(matches_m1, 1))
+
+
+def _count_similar_pairs(templates, emb_dim, tolerance):
+    """
+    Hitung pasangan mirip tanpa matriks jarak N x N: template diurutin by elemen pertama,
+    kandidat pasangan template i cuma yang elemen pertamanya di [x_i, x_i + r] (searchsorted).
+    Kandidat-kandidat itu dicek semua kolomnya sekaligus secara vektor, per potongan biar memori
+    tetep kecil. Biayanya ~O(N log N + N * K), K = rata-rata tetangga dalam radius r.
+    """
+    ordered = templates[np.argsort(templates[:, 0], kind='stable')]
+    first = ordered[:, 0]
+    n = ordered.shape[0]
+    hi = np.searchsorted(first, first + tolerance, side='right')
+    counts = np.maximum(hi - np.arange(1, n + 1), 0)
+    # Batas potongan: kira-kira MAX_PAIRS_PER_CHUNK kandidat per potongan
+    bounds = np.searchsorted(np.cumsum(counts), np.arange(MAX_PAIRS_PER_CHUNK, counts.sum(), MAX_PAIRS_PER_CHUNK))
+    matches_m = matches_m1 = 0
+    for lo, up in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [n]))):
+        chunk_counts = counts[lo:up]
+        total = int(chunk_counts.sum())
+        if total == 0:
+            continue
+        left = np.repeat(np.arange(lo, up), chunk_counts)
+        # right = left + 1, left + 2, ... sebanyak counts[left]
+        offsets = np.arange(total) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+        right = left + 1 + offsets
+        diff = np.abs(ordered[right] - ordered[left])
+        similar = diff[:, :emb_dim].max(axis=1) <= tolerance
+        matches_m += int(np.count_nonzero(similar))
+        matches_m1 += int(np.count_nonzero(similar & (diff[:, emb_dim] <= tolerance)))
+    return matches_m, matches_m1
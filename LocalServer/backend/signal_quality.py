@@ -0,0 +1,82 @@
+import numpy as np
+
+# Batas nilai ADC yang dianggap "nempel rail" (kriteria flatline lama)
+RAIL_LOW = 10
+RAIL_HIGH = 4090
+
+# Ambang penolakan. Sengaja longgar: yang ditolak cuma window yang jelas rusak,
+# sisanya tetep diproses & skornya disimpen bareng reading
+MAX_RAIL_FRACTION = 0.8        # >80% titik di rail -> flatline (sama kayak cek lama)
+MAX_LEAD_OFF_FRACTION = 0.5    # run nilai konstan terpanjang >50% window -> elektroda lepas
+MAX_SATURATION_FRACTION = 0.25 # >25% titik nempel di min/max window -> clipping
+MAX_HF_NOISE_RATIO = 0.5       # >50% energi di atas 40 Hz -> noise (EMG/kabel)
+
+BASELINE_CUTOFF_HZ = 0.67
+HF_NOISE_CUTOFF_HZ = 40.0
+
+QUALITY_REJECT_MESSAGES = {
+    "flatline": "Data EKG tidak valid (sinyal flatline/elektroda terlepas)",
+    "lead_off": "Data EKG tidak valid (elektroda terlepas)",
+    "saturated": "Data EKG tidak valid (sinyal saturasi/clipping)",
+    "noisy": "Data EKG tidak valid (noise frekuensi tinggi terlalu besar)",
+}
+
+
+def assess_signal_quality(ecg_beat, sampling_rate=360):
+    """
+    Hitung indeks kualitas sinyal dalam satu window (semua pake operasi vektor NumPy).
+    Return dict: fraksi rail/lead-off/saturasi, rasio baseline wander & noise HF,
+    'score' (0..1, makin gede makin bagus) dan 'reason' (None kalo lolos).
+    """
+    x = np.asarray(ecg_beat, dtype=np.float64).ravel()
+    n = x.size
+    if n == 0:
+        return {"score": 0.0, "rail_fraction": 1.0, "lead_off_fraction": 1.0, "saturation_fraction": 0.0,
+                "baseline_wander": 0.0, "hf_noise": 0.0, "reason": "flatline"}
+
+    rail_fraction = np.count_nonzero((x <= RAIL_LOW) | (x >= RAIL_HIGH)) / n
+
+    # Run terpanjang nilai yang persis sama (elektroda lepas -> device ngirim 0 terus)
+    change_points = np.flatnonzero(np.diff(x) != 0)
+    run_bounds = np.concatenate(([-1], change_points, [n - 1]))
+    lead_off_fraction = np.max(np.diff(run_bounds)) / n
+
+    lo, hi = x.min(), x.max()
+    if hi > lo:
+        saturation_fraction = (np.count_nonzero(x == lo) + np.count_nonzero(x == hi)) / n
+    else:
+        saturation_fraction = 0.0
+
+    # Baseline wander & noise HF dari satu FFT
+    power = np.abs(np.fft.rfft(x - x.mean())) ** 2
+    freqs = np.fft.rfftfreq(n, d=1.0 / sampling_rate)
+    total_power = power[1:].sum()
+    if total_power > 1e-12:
+        baseline_wander = power[(freqs > 0) & (freqs < BASELINE_CUTOFF_HZ)].sum() / total_power
+        hf_noise = power[freqs > HF_NOISE_CUTOFF_HZ].sum() / total_power
+    else:
+        baseline_wander = 0.0
+        hf_noise = 0.0
+
+    score = (1 - rail_fraction) * (1 - lead_off_fraction) * (1 - min(saturation_fraction, 1.0)) \
+        * (1 - 0.5 * baseline_wander) * (1 - 0.5 * hf_noise)
+
+    reason = None
+    if rail_fraction > MAX_RAIL_FRACTION:
+        reason = "flatline"
+    elif lead_off_fraction > MAX_LEAD_OFF_FRACTION:
+        reason = "lead_off"
+    elif saturation_fraction > MAX_SATURATION_FRACTION:
+        reason = "saturated"
+    elif hf_noise > MAX_HF_NOISE_RATIO:
+        reason = "noisy"
+
+    return {
+        "score": round(float(score), 4),
+        "rail_fraction": float(rail_fraction),
+        "lead_off_fraction": float(lead_off_fraction),
+        "saturation_fraction": float(saturation_fraction),
+        "baseline_wander": float(baseline_wander),
+        "hf_noise": float(hf_noise),
+        "reason": reason
+    }
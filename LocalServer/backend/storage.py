@@ -0,0 +1,79 @@
+import os
+
+from sqlalchemy import event
+
+# Pragma SQLite yang dipasang tiap koneksi baru.
+# WAL: pembaca gak ke-block sama penulis; synchronous=NORMAL aman di WAL (paling banter
+# kehilangan transaksi terakhir pas listrik mati, DB gak korup); busy_timeout biar
+# worker lain nunggu lock dulu, bukan langsung "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    "cache_size": -int(os.getenv('SQLITE_CACHE_KB', 16384)),   # negatif = KiB
+    "temp_store": "MEMORY",
+    "mmap_size": int(os.getenv('SQLITE_MMAP_MB', 128)) * 1024 * 1024,
+    "wal_autocheckpoint": 1000,
+}
+
+BACKENDS = ('sqlite', 'postgresql')
+
+
+def database_config(basedir):
+    """
+    Pilih backend storage dari env DATABASE_BACKEND ('sqlite' default, atau 'postgresql').
+    Return (uri, engine_options) buat SQLALCHEMY_DATABASE_URI & SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    backend = os.getenv('DATABASE_BACKEND', 'sqlite').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"DATABASE_BACKEND '{backend}' tidak dikenal (pilih: {', '.join(BACKENDS)})")
+
+    if backend == 'postgresql':
+        uri = os.getenv('DATABASE_URL')
+        if not uri:
+            uri = "postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}".format(
+                user=os.getenv('POSTGRES_USER', 'ecg'),
+                password=os.getenv('POSTGRES_PASSWORD', 'ecg'),
+                host=os.getenv('POSTGRES_HOST', 'localhost'),
+                port=os.getenv('POSTGRES_PORT', 5432),
+                name=os.getenv('POSTGRES_DB', 'ecg'),
+            )
+        engine_options = {
+            "pool_size": int(os.getenv('DB_POOL_SIZE', 5)),
+            "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', 5)),
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+            # INSERT banyak row (write-behind / batch) dikirim sebagai multi-VALUES per halaman
+            "insertmanyvalues_page_size": int(os.getenv('DB_INSERT_PAGE_SIZE', 1000)),
+        }
+        return uri, engine_options
+
+    db_path = os.getenv('DATABASE_PATH', os.path.join(basedir, 'data/ecg_data.db'))
+    engine_options = {
+        # Koneksi SQLite murah, tapi pool tetep ngehindarin buka file + pasang pragma tiap request
+        "pool_size": int(os.getenv('DB_POOL_SIZE', 5)),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        "connect_args": {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000.0, "check_same_thread": False},
+        "insertmanyvalues_page_size": int(os.getenv('DB_INSERT_PAGE_SIZE', 500)),
+    }
+    return f'sqlite:///{db_path}', engine_options
+
+
+def install_sqlite_pragmas(engine):
+    """ Pasang SQLITE_PRAGMAS ke tiap koneksi baru engine (no-op buat backend lain) """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def sqlite_path(uri):
+    """ Path file DB dari URI sqlite:///..., None kalo bukan SQLite """
+    return uri[len('sqlite:///'):] if uri.startswith('sqlite:///') else None
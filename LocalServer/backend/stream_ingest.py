@@ -0,0 +1,192 @@
+import os
+import time
+import fcntl
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+class DeviceRingBuffer:
+    """
+    Ring buffer sampel per device buat ingest streaming.
+    Sampel masuk sepotong-sepotong; tiap kali udah ada `hop` sampel baru (dan buffer
+    minimal berisi satu window), keluar satu window `window_size` sampel terakhir.
+    Window-nya overlap (window_size - hop sampel), jadi beat di pinggir window gak kepotong terus.
+    """
+
+    def __init__(self, window_size=1024, hop=256, sampling_rate=360):
+        if hop <= 0 or hop > window_size:
+            raise ValueError(f"Hop harus di antara 1 dan {window_size}")
+        self.window_size = int(window_size)
+        self.hop = int(hop)
+        self.sampling_rate = sampling_rate
+        self.capacity = 2 * self.window_size
+        self._data = np.zeros(self.capacity, dtype=np.float32)
+        self.total = 0                      # Jumlah sampel yang pernah masuk (index absolut)
+        self.next_window_end = self.window_size
+        # Jangkar waktu: sampel index absolut `anchor_index` direkam pada `anchor_time`
+        self.anchor_index = 0
+        self.anchor_time = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def reset(self):
+        """ Buang sisa sampel (rekaman baru, gak nyambung sama yang lama) """
+        self.total = 0
+        self.next_window_end = self.window_size
+        self.anchor_index = 0
+        self.anchor_time = None
+
+    def set_anchor(self, timestamp, tolerance_s=None):
+        """
+        Timestamp (datetime) sampel berikutnya yang bakal masuk. Kalo beda lebih dari `tolerance_s`
+        (default satu periode sampel) dari waktu lanjutan buffer, berarti rekaman baru: sisa sampel lama
+        dibuang biar window berikutnya gak nyambungin dua rekaman. Return True kalo buffer di-reset.
+        """
+        tolerance_s = 1.0 / self.sampling_rate if tolerance_s is None else tolerance_s
+        was_reset = False
+        if self.anchor_time is not None and self.total > 0:
+            gap = abs((timestamp - self.time_at(self.total)).total_seconds())
+            if gap > tolerance_s:
+                self.reset()
+                was_reset = True
+        self.anchor_index = self.total
+        self.anchor_time = timestamp
+        return was_reset
+
+    def time_at(self, sample_index):
+        return self.anchor_time + timedelta(seconds=(sample_index - self.anchor_index) / self.sampling_rate)
+
+    def extend(self, samples):
+        """ Tambah sampel, return list (index_akhir_absolut, window float32) yang siap diinferensi """
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        self.last_used = time.monotonic()
+        ready = []
+        # Dipotong per (capacity - window_size) biar window yang keluar belum ketimpa data baru
+        step = self.capacity - self.window_size
+        for start in range(0, samples.size, step):
+            piece = samples[start:start + step]
+            pos = self.total % self.capacity
+            first = min(piece.size, self.capacity - pos)
+            self._data[pos:pos + first] = piece[:first]
+            self._data[:piece.size - first] = piece[first:]
+            self.total += piece.size
+
+            while self.next_window_end <= self.total:
+                end = self.next_window_end
+                idx = np.arange(end - self.window_size, end) % self.capacity
+                ready.append((end, self._data[idx]))
+                self.next_window_end += self.hop
+        return ready
+
+    def snapshot(self):
+        """ State minimal buat nerusin stream di proses lain: counter, jangkar waktu & window_size sampel terakhir """
+        kept = min(self.total, self.window_size)
+        idx = np.arange(self.total - kept, self.total) % self.capacity
+        return {
+            "total": np.int64(self.total),
+            "next_window_end": np.int64(self.next_window_end),
+            "anchor_index": np.int64(self.anchor_index),
+            "anchor_time": np.str_(self.anchor_time.isoformat() if self.anchor_time else ""),
+            "tail": self._data[idx].copy(),
+        }
+
+    def restore(self, state):
+        self.total = int(state["total"])
+        self.next_window_end = int(state["next_window_end"])
+        self.anchor_index = int(state["anchor_index"])
+        anchor = str(state["anchor_time"])
+        self.anchor_time = datetime.fromisoformat(anchor) if anchor else None
+        tail = np.asarray(state["tail"], dtype=np.float32)
+        self._data[np.arange(self.total - tail.size, self.total) % self.capacity] = tail
+
+
+class StreamBufferRegistry:
+    """
+    Kumpulan DeviceRingBuffer per device, buffer yang lama nganggur dibuang.
+    Kalo `state_dir` diset (wajib buat gunicorn multi-worker), stream satu device dikunci pake flock
+    (berlaku lintas worker) & state buffer-nya disimpen ke file abis tiap request, jadi POST berikutnya
+    boleh nyampe di worker mana aja. Tanpa state_dir buffer & kuncinya cuma per worker.
+    """
+
+    def __init__(self, window_size=1024, hop=256, sampling_rate=360, idle_timeout_s=120, max_devices=1024, state_dir=None):
+        self.window_size = window_size
+        self.hop = hop
+        self.sampling_rate = sampling_rate
+        self.idle_timeout_s = idle_timeout_s
+        self.max_devices = max_devices
+        self.state_dir = state_dir
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def get(self, device_key):
+        now = time.monotonic()
+        with self._lock:
+            buffer = self._buffers.get(device_key)
+            # Kelamaan nganggur = sinyalnya udah gak nyambung sama yang baru, mulai dari kosong
+            if buffer is not None and now - buffer.last_used > self.idle_timeout_s and not buffer.lock.locked():
+                buffer = None
+            if buffer is None:
+                buffer = DeviceRingBuffer(self.window_size, self.hop, self.sampling_rate)
+                self._buffers[device_key] = buffer
+            self._buffers.move_to_end(device_key)
+            while len(self._buffers) > self.max_devices:
+                _, oldest = next(iter(self._buffers.items()))
+                if oldest.lock.locked():
+                    break
+                self._buffers.popitem(last=False)
+            return buffer
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def _state_path(self, device_key, suffix):
+        return os.path.join(self.state_dir, f"{device_key}{suffix}")
+
+    def claim(self, device_key):
+        """ Ambil buffer device buat satu request stream; None kalo device ini lagi di-stream (worker mana pun) """
+        buffer = self.get(device_key)
+        if not buffer.lock.acquire(blocking=False):
+            return None
+        if not self.state_dir:
+            return buffer
+        lock_file = open(self._state_path(device_key, '.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            buffer.lock.release()
+            return None
+        buffer._lock_file = lock_file
+        # State terakhir bisa aja ditulis worker lain, jadi file-nya yang dipake (kecuali udah basi)
+        path = self._state_path(device_key, '.npz')
+        try:
+            if time.time() - os.path.getmtime(path) <= self.idle_timeout_s:
+                with np.load(path) as state:
+                    buffer.restore(state)
+            else:
+                buffer.reset()
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            buffer.reset() # File rusak: mulai dari kosong aja
+        return buffer
+
+    def release(self, device_key, buffer):
+        """ Simpen state buffer (kalo pake state_dir) lalu lepas kunci stream device """
+        try:
+            if self.state_dir:
+                path = self._state_path(device_key, '.npz')
+                tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_path, **buffer.snapshot())
+                os.replace(tmp_path, path)
+        finally:
+            lock_file = getattr(buffer, '_lock_file', None)
+            if lock_file is not None:
+                buffer._lock_file = None
+                lock_file.close() # Nutup fd = lepas flock
+            buffer.lock.release()
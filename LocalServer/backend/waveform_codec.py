@@ -0,0 +1,52 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Header blob: magic, versi, codec, jumlah sampel, scale  (12 byte, little-endian)
+HEADER = struct.Struct('<2sBBIf')
+MAGIC = b'EW'
+VERSION = 1
+
+CODEC_INT16_DELTA = 1 # int16 ter-skala, disimpen sebagai selisih antar sampel -> zlib
+CODEC_FLOAT16 = 2     # float16 mentah -> zlib
+
+CODECS = {
+    'int16': CODEC_INT16_DELTA,
+    'float16': CODEC_FLOAT16,
+}
+
+
+def encode_waveform(signal, codec='int16', level=6):
+    """ Array 1D float -> blob biner terkompresi (header + payload) """
+    x = np.asarray(signal, dtype=np.float32).ravel()
+    codec_id = CODECS[codec]
+
+    if codec_id == CODEC_INT16_DELTA:
+        peak = float(np.max(np.abs(x))) if x.size else 0.0
+        scale = peak / 32767.0 if peak > 0 else 1.0
+        quantized = np.round(x / scale).astype(np.int16)
+        # Selisih antar sampel jauh lebih "rata" buat zlib. Overflow int16 sengaja dibiarin
+        # wrap-around, nanti cumsum int16 di decode balik persis ke nilai aslinya
+        deltas = np.diff(quantized, prepend=np.int16(0)).astype('<i2')
+        payload = deltas.tobytes()
+    else:
+        scale = 1.0
+        payload = x.astype('<f2').tobytes()
+
+    return HEADER.pack(MAGIC, VERSION, codec_id, x.size, scale) + zlib.compress(payload, level)
+
+
+def decode_waveform(blob):
+    """ Blob hasil encode_waveform -> array float32 1D """
+    magic, version, codec_id, n, scale = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Blob waveform tidak dikenal (magic={magic!r}, versi={version})")
+
+    payload = zlib.decompress(bytes(blob[HEADER.size:]))
+    if codec_id == CODEC_INT16_DELTA:
+        deltas = np.frombuffer(payload, dtype='<i2', count=n)
+        return np.cumsum(deltas, dtype=np.int16).astype(np.float32) * np.float32(scale)
+    if codec_id == CODEC_FLOAT16:
+        return np.frombuffer(payload, dtype='<f2', count=n).astype(np.float32)
+    raise ValueError(f"Codec waveform {codec_id} tidak dikenal")
@@ -0,0 +1,174 @@
+import os
+import re
+import mmap
+import fcntl
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype('<f4')
+SEGMENT_SUFFIX = '.seg'
+_SAFE_KEY = re.compile(r'^[A-Za-z0-9_-]+$')
+_SEGMENT_NAME = re.compile(r'^[A-Za-z0-9_-]+/\d{6}\.seg$')
+
+
+class SegmentWaveformStore:
+    """
+    Penyimpanan waveform di luar database: file segmen append-only per device,
+    isinya sampel float32 LE mentah yang disambung terus.
+    ECGReading cuma nyimpen pointer (segment, offset byte, panjang sampel).
+    Baca lewat mmap -> np.frombuffer, jadi hasilnya view tanpa copy, dan reading
+    berurutan dari device yang sama letaknya juga berurutan di disk.
+
+    Trade-off: sampel ditulis ke segmen SEBELUM transaksi DB-nya commit. Kalo transaksinya
+    rollback (atau reading-nya dihapus), byte-nya tetep ada di segmen tanpa pointer (orphan).
+    Gak ada yang corrupt, cuma makan disk: cek & beresin pake `flask --app app waveform-gc`
+    (unreferenced_ranges buat laporan, compact() buat nulis ulang segmen yang udah gak aktif).
+    """
+
+    def __init__(self, root_dir, max_segment_bytes=64 * 1024 * 1024, max_open_maps=64):
+        self.root_dir = root_dir
+        self.max_segment_bytes = int(max_segment_bytes)
+        self.max_open_maps = int(max_open_maps)
+        self._maps = OrderedDict()
+        self._maps_lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def append(self, device_key, samples):
+        """ Tambah satu waveform ke segmen aktif device. Return (segment, offset, length) """
+        if not _SAFE_KEY.match(str(device_key)):
+            raise ValueError(f"Key device '{device_key}' tidak valid untuk nama folder")
+        data = np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).ravel()
+        device_dir = os.path.join(self.root_dir, device_key)
+        os.makedirs(device_dir, exist_ok=True)
+
+        # Lock antar proses (worker gunicorn) per device, cuma dipegang selama append
+        with open(os.path.join(device_dir, '.lock'), 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                seq = self._current_seq(device_dir)
+                path = os.path.join(device_dir, f"{seq:06d}{SEGMENT_SUFFIX}")
+                offset = os.path.getsize(path) if os.path.exists(path) else 0
+                if offset > 0 and offset + data.nbytes > self.max_segment_bytes:
+                    seq += 1
+                    path = os.path.join(device_dir, f"{seq:06d}{SEGMENT_SUFFIX}")
+                    offset = 0
+                with open(path, 'ab') as f:
+                    f.write(data.tobytes())
+                    f.flush()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        return f"{device_key}/{seq:06d}{SEGMENT_SUFFIX}", offset, int(data.size)
+
+    def read(self, segment, offset, length):
+        """ View read-only (zero-copy) ke waveform yang disimpen di segmen """
+        end = int(offset) + int(length) * SAMPLE_DTYPE.itemsize
+        mapped = self._map(segment, end)
+        return np.frombuffer(mapped, dtype=SAMPLE_DTYPE, count=int(length), offset=int(offset))
+
+    def _current_seq(self, device_dir):
+        seqs = [int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(device_dir)
+                if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()]
+        return max(seqs) if seqs else 1
+
+    def _map(self, segment, min_size):
+        if not _SEGMENT_NAME.match(segment):
+            raise ValueError(f"Nama segmen '{segment}' tidak valid")
+
+        with self._maps_lock:
+            mapped = self._maps.get(segment)
+            if mapped is not None and len(mapped) >= min_size:
+                self._maps.move_to_end(segment)
+                return mapped
+
+            # Belum ke-map, atau file-nya udah nambah sejak di-map -> map ulang
+            with open(os.path.join(self.root_dir, segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(mapped) < min_size:
+                raise ValueError(f"Segmen '{segment}' lebih pendek dari pointer ({len(mapped)} < {min_size} byte)")
+
+            # Map lama gak di-close manual: bisa aja masih ada array yang nge-view ke situ,
+            # biar GC yang nutup pas referensinya habis
+            self._maps[segment] = mapped
+            self._maps.move_to_end(segment)
+            while len(self._maps) > self.max_open_maps:
+                self._maps.popitem(last=False)
+            return mapped
+
+    def segments(self):
+        """ List (segment, ukuran byte, mtime, aktif?) semua file segmen; aktif = segmen yang lagi ditambahin """
+        result = []
+        for device_key in sorted(os.listdir(self.root_dir)):
+            device_dir = os.path.join(self.root_dir, device_key)
+            if not os.path.isdir(device_dir) or not _SAFE_KEY.match(device_key):
+                continue
+            current = self._current_seq(device_dir)
+            for name in sorted(os.listdir(device_dir)):
+                seq = name[:-len(SEGMENT_SUFFIX)]
+                if not name.endswith(SEGMENT_SUFFIX) or not seq.isdigit():
+                    continue
+                stat = os.stat(os.path.join(device_dir, name))
+                result.append((f"{device_key}/{name}", stat.st_size, stat.st_mtime, int(seq) == current))
+        return result
+
+    def compact(self, segment, ranges):
+        """
+        Tulis ulang segmen yang udah gak aktif cuma berisi range yang masih dirujuk.
+        ranges: list (offset byte, jumlah sampel). Return (segmen baru / None kalo gak ada yang dirujuk,
+        {offset lama: offset baru}). Segmen lama gak dihapus di sini: hapus pake remove() SETELAH
+        pointer di DB udah diupdate.
+        """
+        if not _SEGMENT_NAME.match(segment):
+            raise ValueError(f"Nama segmen '{segment}' tidak valid")
+        device_key = segment.split('/')[0]
+        device_dir = os.path.join(self.root_dir, device_key)
+        unique = sorted(set((int(offset), int(length)) for offset, length in ranges))
+        if not unique:
+            return None, {}
+
+        with open(os.path.join(device_dir, '.lock'), 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if int(segment.split('/')[1][:-len(SEGMENT_SUFFIX)]) == self._current_seq(device_dir):
+                    raise ValueError(f"Segmen '{segment}' masih aktif, gak boleh di-compact")
+                # Segmen baru jadi segmen aktif device (seq paling gede), append berikutnya nyambung di situ
+                seq = self._current_seq(device_dir) + 1
+                new_segment = f"{device_key}/{seq:06d}{SEGMENT_SUFFIX}"
+                new_offsets = {}
+                position = 0
+                with open(os.path.join(self.root_dir, segment), 'rb') as src, \
+                        open(os.path.join(self.root_dir, new_segment), 'wb') as dst:
+                    for offset, length in unique:
+                        src.seek(offset)
+                        data = src.read(length * SAMPLE_DTYPE.itemsize)
+                        dst.write(data)
+                        new_offsets[offset] = position
+                        position += len(data)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return new_segment, new_offsets
+
+    def remove(self, segment):
+        """ Hapus file segmen (yang udah gak dirujuk). Map yang masih kebuka tetep valid sampe di-GC """
+        if not _SEGMENT_NAME.match(segment):
+            raise ValueError(f"Nama segmen '{segment}' tidak valid")
+        with self._maps_lock:
+            self._maps.pop(segment, None)
+        os.remove(os.path.join(self.root_dir, segment))
+
+
+def unreferenced_ranges(segment_size, ranges):
+    """ Range byte (awal, akhir) di segmen yang gak dirujuk pointer mana pun. ranges: list (offset, jumlah sampel) """
+    gaps = []
+    position = 0
+    for offset, length in sorted((int(o), int(n)) for o, n in ranges):
+        if offset > position:
+            gaps.append((position, offset))
+        position = max(position, offset + length * SAMPLE_DTYPE.itemsize)
+    if segment_size > position:
+        gaps.append((position, segment_size))
+    return gaps
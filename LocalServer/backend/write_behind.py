@@ -0,0 +1,414 @@
+import os
+import json
+import fcntl
+import time
+import queue
+import base64
+import logging
+import threading
+from datetime import datetime
+
+SPILL_SUFFIX = '.jsonl'
+PROGRESS_SUFFIX = '.progress' # Sidecar file replay: offset byte baris pertama yang belum ke-commit
+
+
+class WriteBehindFull(Exception):
+    """ Antrian tulis penuh (DB ketinggalan jauh), pemanggil harus nolak/nunda request """
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b64": base64.b64encode(bytes(value)).decode('ascii')}
+    if hasattr(value, 'item'): # Skalar numpy
+        return value.item()
+    raise TypeError(f"Tipe {type(value).__name__} gak bisa ditulis ke file spill")
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$b64" in value:
+            return base64.b64decode(value["$b64"])
+    return value
+
+
+def _spill_owner(name):
+    """ pid yang megang file spill-<pid>.jsonl / replay-<pid>-....jsonl, None kalo bukan file spill """
+    prefix, _, rest = name.partition('-')
+    if prefix not in ('spill', 'replay') or not name.endswith(SPILL_SUFFIX):
+        return None
+    try:
+        return int(rest.split('-')[0].removesuffix(SPILL_SUFFIX))
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_progress(path):
+    try:
+        with open(path + PROGRESS_SUFFIX, encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_progress(path, offset):
+    """ Catet offset abis chunk ke-commit (tmp + replace + fsync, biar gak kebaca setengah) """
+    tmp = f"{path}{PROGRESS_SUFFIX}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path + PROGRESS_SUFFIX)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class WriteBehindQueue:
+    """
+    Antrian write-behind buat hasil inferensi.
+    Request cuma naro row ke antrian (bounded) lalu langsung balikin response; satu thread
+    writer per proses ngumpulin row sampai `max_rows` atau `max_wait_ms`, terus manggil
+    flush_fn(rows) sekali (executemany dalam satu transaksi).
+
+    Client udah dapet 200 duluan, jadi batch yang gagal gak boleh dibuang gitu aja:
+    1. batch di-retry `max_retries` kali dengan backoff (DB lock / putus sebentar),
+    2. error-nya gara-gara isi row (is_row_error(e), misal IntegrityError) & health_fn() bilang
+       DB-nya bisa ditulis -> batch dibelah dua terus (bisect) sampe ketemu row yang bikin gagal;
+       cuma row itu yang dibuang (lost_rows),
+    3. selain itu (DB lock lewat busy_timeout, disk penuh, read-only, putus) -> semua row ditulis
+       ke file spill di `spill_dir` (JSON lines, satu file per pid) & di-replay otomatis pas DB
+       udah bisa ditulis lagi. Progress replay dicatet per chunk, jadi worker yang mati di tengah
+       replay paling banter bikin satu chunk (max_rows) ketulis dua kali, bukan satu file.
+    """
+
+    def __init__(self, flush_fn, max_rows=200, max_wait_ms=200.0, max_queue=10000, logger=None,
+                 health_fn=None, spill_dir=None, max_retries=3, retry_backoff_ms=200.0, replay_interval_s=5.0,
+                 is_row_error=None):
+        self.flush_fn = flush_fn
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self.logger = logger or logging.getLogger(__name__)
+        self.health_fn = health_fn
+        self.is_row_error = is_row_error # None = semua error dianggap bisa gara-gara row (dicek health_fn)
+        self.spill_dir = spill_dir
+        self.max_retries = max(0, int(max_retries))
+        self.retry_backoff = max(0.0, float(retry_backoff_ms)) / 1000.0
+        self.replay_interval = max(0.1, float(replay_interval_s))
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._owner_pid = None
+
+        # Statistik buat ngukur lag (dibaca lewat stats())
+        self.flushed_rows = 0
+        self.lost_rows = 0       # Row yang bener-bener ilang (row rusak / spill gagal)
+        self.spilled_rows = 0    # Row yang pernah ditulis ke file spill (DB mati)
+        self.replayed_rows = 0   # Row yang dibaca balik dari file spill & ditulis ulang
+        self.retried_batches = 0
+        self.batches = 0
+        self._last_replay_check = 0.0
+        self.last_flush_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def submit(self, row, timeout=0.5):
+        """ Titip satu row. WriteBehindFull kalo antrian tetep penuh setelah `timeout` detik """
+        self._ensure_writer()
+        try:
+            self._queue.put((time.monotonic(), row), timeout=timeout)
+        except queue.Full:
+            raise WriteBehindFull(f"Antrian tulis penuh ({self.max_queue} row)")
+
+    def stats(self):
+        with self._queue.mutex:
+            depth = len(self._queue.queue)
+            oldest = self._queue.queue[0][0] if depth and self._queue.queue[0] is not None else None
+        return {
+            "queued": depth,
+            "oldest_age_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "flushed_rows": self.flushed_rows,
+            "lost_rows": self.lost_rows,
+            "spilled_rows": self.spilled_rows,
+            "replayed_rows": self.replayed_rows,
+            "pending_spill_rows": self._pending_spill_rows(),
+            "retried_batches": self.retried_batches,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+    def stop(self, timeout=30):
+        """ Kuras semua row yang masih ngantri ke DB, lalu matiin writer (dipanggil pas shutdown) """
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._owner_pid != os.getpid() or not thread.is_alive():
+                return
+            self._queue.put(None) # Sentinel: writer flush sisa antrian lalu keluar
+            self._thread = None
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            self.logger.error(f"❌ Writer belum selesai nguras antrian setelah {timeout} detik ({self._queue.qsize()} row tersisa)")
+        else:
+            self.logger.info(f"Writer write-behind berhenti. Total {self.flushed_rows} row ditulis, {self.lost_rows} hilang, "
+                             f"{self._pending_spill_rows()} masih di file spill.")
+
+    def _ensure_writer(self):
+        if self._owner_pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            pid = os.getpid()
+            if self._owner_pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            # Thread gak ikut ke-fork (gunicorn --preload), jadi bikin ulang di proses worker
+            if self._owner_pid != pid:
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._owner_pid = pid
+            self._thread = threading.Thread(target=self._writer_loop, name="write-behind", daemon=True)
+            self._thread.start()
+            self.logger.info(f"Writer write-behind aktif (pid {pid}, max {self.max_rows} row / {self.max_wait * 1000:.0f} ms)")
+
+    def _writer_loop(self):
+        q = self._queue
+        running = True
+        while running:
+            try:
+                # Nunggu-nya dibatesin biar file spill tetep di-replay walaupun gak ada row baru
+                item = q.get(timeout=self.replay_interval if self.spill_dir else None)
+            except queue.Empty:
+                self._maybe_replay()
+                continue
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Lewat deadline tetep ambil yang udah ngantri (tanpa nunggu) biar batch-nya penuh
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            self._maybe_replay()
+
+        # Sisa antrian (kalo ada yang nyelip setelah sentinel) tetep ditulis
+        leftover = []
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        for i in range(0, len(leftover), self.max_rows):
+            self._flush(leftover[i:i + self.max_rows])
+
+    def _flush(self, batch):
+        rows = [row for _, row in batch]
+        start = time.monotonic()
+        if not self._write_with_retry(rows):
+            return
+        now = time.monotonic()
+        lag_ms = (now - batch[0][0]) * 1000 # Umur row tertua di batch pas udah ke-commit
+        self.flushed_rows += len(rows)
+        self.batches += 1
+        self.last_flush_ms = (now - start) * 1000
+        self.last_lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def _write_with_retry(self, rows):
+        """ Tulis rows (retry -> bisect / spill). True kalo semuanya langsung masuk DB """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.flush_fn(rows)
+                return True
+            except Exception as e:
+                error = e
+            if self._row_error(error):
+                break # Constraint / data jelek gak bakal beres di-retry
+            if attempt < self.max_retries:
+                self.retried_batches += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        self.logger.error(f"❌ Flush write-behind ({len(rows)} row) gagal setelah {attempt} retry: {error}", exc_info=error)
+
+        if self._row_error(error) and (self.health_fn is None or self._healthy()):
+            self._bisect(rows)
+        else:
+            self._spill(rows)
+        return False
+
+    def _row_error(self, error):
+        return self.is_row_error is None or bool(self.is_row_error(error))
+
+    def _healthy(self):
+        try:
+            return bool(self.health_fn())
+        except Exception:
+            return False
+
+    def _bisect(self, rows):
+        """ Belah batch sampe ketemu row yang gagal ditulis sendirian; sisanya tetep masuk """
+        middle = len(rows) // 2
+        pending = [rows[middle:], rows[:middle]] if len(rows) > 1 else [rows]
+        while pending:
+            chunk = pending.pop()
+            try:
+                self.flush_fn(chunk)
+                self.flushed_rows += len(chunk)
+                continue
+            except Exception as e:
+                error = e
+            if not self._row_error(error):
+                # DB-nya yang bermasalah di tengah bisect (lock / disk): sisa row langsung di-spill,
+                # gak nunggu busy_timeout lagi per potongan
+                self._spill(chunk + [row for part in reversed(pending) for row in part])
+                return
+            if len(chunk) == 1:
+                self._drop(chunk[0], error)
+                continue
+            middle = len(chunk) // 2
+            pending.append(chunk[middle:])
+            pending.append(chunk[:middle])
+
+    def _pending_spill_rows(self):
+        """ Row yang masih nunggu di file spill (semua worker); file-nya cuma ada pas DB sempet mati """
+        if not self.spill_dir:
+            return 0
+        total = 0
+        for name in os.listdir(self.spill_dir):
+            if name.endswith(SPILL_SUFFIX):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    with open(path, 'rb') as f:
+                        f.seek(_read_progress(path)) # Yang udah di-replay gak diitung
+                        total += sum(1 for _ in f)
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _drop(self, row, error):
+        self.lost_rows += 1
+        self.logger.error(f"❌ Row write-behind dibuang (device {row.get('device_id')}, {row.get('timestamp')}): {error}")
+
+    def _spill(self, rows):
+        """ DB gak bisa ditulis: simpen rows ke file lokal, nanti di-replay """
+        if not self.spill_dir:
+            self.lost_rows += len(rows)
+            self.logger.error(f"❌ DB gak bisa ditulis & spill_dir gak diset, {len(rows)} row hilang.")
+            return
+        path = os.path.join(self.spill_dir, f"spill-{os.getpid()}{SPILL_SUFFIX}")
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_encode_value) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except (OSError, TypeError) as e:
+            self.lost_rows += len(rows)
+            self.logger.error(f"❌ Gagal nulis file spill {path}, {len(rows)} row hilang: {e}")
+            return
+        self.spilled_rows += len(rows)
+        self.logger.warning(f"⚠️  DB gak bisa ditulis, {len(rows)} row disimpen ke {path} (di-replay pas DB balik).")
+
+    def _maybe_replay(self):
+        """ Replay file spill punya proses ini & punya worker yang udah mati, kalo DB-nya udah sehat """
+        if not self.spill_dir or time.monotonic() - self._last_replay_check < self.replay_interval:
+            return
+        self._last_replay_check = time.monotonic()
+        pid = os.getpid()
+        claims = []
+        for name in os.listdir(self.spill_dir):
+            owner = _spill_owner(name)
+            # File worker lain yang masih hidup bisa lagi ditulisin / di-replay, jangan diambil
+            if owner is not None and (owner == pid or not _pid_alive(owner)):
+                claims.append(name)
+        if not claims or (self.health_fn is not None and not self._healthy()):
+            return
+
+        for name in claims:
+            path = os.path.join(self.spill_dir, name)
+            if name.startswith('spill-'):
+                # File spill diklaim pake rename (atomic, worker lain yang ngeklaim file yang sama kalah);
+                # row yang gagal pas replay masuk spill-<pid> baru, bukan file yang lagi dibaca
+                claimed = os.path.join(self.spill_dir, f"replay-{pid}-{name}")
+                _remove_quietly(claimed + PROGRESS_SUFFIX)
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue
+                path = claimed
+            # File replay-<pid mati>-... (replayer-nya mati di tengah) dilanjutin dari progress-nya
+            self._replay_file(path)
+
+    def _replay_file(self, path):
+        name = os.path.basename(path)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                # Beberapa worker bisa barengan nemu file replayer yang mati, cuma satu yang dapet
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                    return # Udah selesai & dihapus worker lain pas kita nunggu
+            except (BlockingIOError, FileNotFoundError):
+                return
+            offset = _read_progress(path)
+            f.seek(offset)
+            if offset:
+                self.logger.info(f"🔁 Lanjut replay {name} dari byte {offset}")
+            else:
+                self.logger.info(f"🔁 Replay {name}")
+            chunk = []
+            for line in f:
+                offset += len(line)
+                try:
+                    chunk.append({k: _decode_value(v) for k, v in json.loads(line).items()})
+                except ValueError:
+                    if line.strip(): # Baris kepotong (proses mati pas nulis)
+                        self.lost_rows += 1
+                if len(chunk) >= self.max_rows:
+                    self._replay_chunk(chunk)
+                    _write_progress(path, offset)
+                    chunk = []
+            if chunk:
+                self._replay_chunk(chunk)
+            os.remove(path)
+            _remove_quietly(path + PROGRESS_SUFFIX)
+
+    def _replay_chunk(self, rows):
+        # Kalo gagal lagi, chunk-nya masuk file spill proses ini (dihitung spilled lagi)
+        if self._write_with_retry(rows):
+            self.flushed_rows += len(rows)
+        self.replayed_rows += len(rows)